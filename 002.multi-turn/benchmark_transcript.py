@@ -0,0 +1,155 @@
+"""
+대화 기록 메모리 / 직렬화 벤치마크 (list[types.Content] vs CompactTranscript)
+
+같은 대화(턴마다 사용자 질문 + 모델 답변)를 두 가지 방식으로 만들어 비교합니다.
+API 호출은 하지 않습니다.
+
+측정:
+    memory    - tracemalloc으로 잰 대화 기록 전체의 메모리 (텍스트 포함, 원문 UTF-8 크기와 비교)
+    prepare   - HistoryManager.prepare (요청에 보낼 최근 구간을 Content로 꺼냄) 시간
+    serialize - 저장 / 복원 시간과 크기
+                (list: json.dumps(model_dump) / Content.model_validate, pickle
+                 compact: to_bytes / from_bytes)
+
+사용법:
+    python 002.multi-turn/benchmark_transcript.py --turns 1000 10000
+"""
+
+import argparse
+import gc
+import json
+import pickle
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from google.genai import types
+
+sys.path.append(str(Path(__file__).parent.parent))
+from common.compact_transcript import CompactTranscript
+from common.history_manager import HistoryManager
+
+
+def make_rows(turns: int) -> List[Tuple[str, str]]:
+    """턴마다 사용자 질문 + 적당한 길이의 모델 답변"""
+    rows = []
+    for i in range(turns):
+        rows.append(("user", f"{i}번째 질문입니다. 청약 조건이 어떻게 되나요?"))
+        rows.append(("model", f"{i}번째 답변입니다. " + "상황을 단계별로 정리해 보면 다음과 같아요. 먼저 확인할 것은... " * 4))
+    return rows
+
+
+def build_list(rows: List[Tuple[str, str]]) -> List[types.Content]:
+    return [types.Content(role=role, parts=[types.Part(text=text)]) for role, text in rows]
+
+
+def build_compact(rows: List[Tuple[str, str]]) -> CompactTranscript:
+    return CompactTranscript(rows)
+
+
+def measure_memory(build: Callable, turns: int) -> Tuple[object, int]:
+    """대화 기록 하나가 차지하는 메모리 (바이트, 텍스트 문자열 포함)
+
+    텍스트를 만드는 것부터 측정하므로 list는 Content가 참조하는 str까지,
+    compact는 버퍼만 (만들 때 쓴 str은 해제됨) 포함됨
+    """
+    gc.collect()
+    tracemalloc.start()
+    history = build(make_rows(turns))
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return history, size
+
+
+def timed(fn: Callable, repeat: int = 3) -> Tuple[object, float]:
+    """repeat번 실행한 중 가장 빠른 시간"""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+
+def measure_prepare(history) -> float:
+    """대화 기록이 다 쌓인 상태에서 다음 요청 준비 시간 (요약 접기가 끝난 뒤의 평상시 비용)"""
+    manager = HistoryManager(max_tokens=4000, keep_turns=6)
+    manager.prepare(history, "시스템 지시어")  # 첫 호출은 앞부분을 요약으로 접음
+    _, elapsed = timed(lambda: manager.prepare(history, "시스템 지시어"), repeat=5)
+    return elapsed
+
+
+def run(turns: int) -> Dict[str, dict]:
+    rows = make_rows(turns)
+    text_bytes = sum(len(text.encode("utf-8")) for _, text in rows)
+
+    listed, list_mem = measure_memory(build_list, turns)
+    compact, compact_mem = measure_memory(build_compact, turns)
+
+    list_json, list_dump = timed(lambda: json.dumps([c.model_dump(exclude_none=True) for c in listed], ensure_ascii=False))
+    _, list_load = timed(lambda: [types.Content.model_validate(c) for c in json.loads(list_json)])
+    list_pickle, list_pdump = timed(lambda: pickle.dumps(listed))
+    _, list_pload = timed(lambda: pickle.loads(list_pickle))
+    payload, compact_dump = timed(compact.to_bytes)
+    restored, compact_load = timed(lambda: CompactTranscript.from_bytes(payload))
+    assert restored.to_bytes() == payload and restored.text(-1) == rows[-1][1]
+
+    def ms(seconds: float) -> float:
+        return round(seconds * 1000, 2)
+
+    return {
+        "turns": turns,
+        "messages": len(rows),
+        "text_mb": round(text_bytes / 1e6, 2),
+        "list": {
+            "memory_mb": round(list_mem / 1e6, 2),
+            "bytes_per_message": list_mem // len(rows),
+            "prepare_ms": ms(measure_prepare(listed)),
+            "json_mb": round(len(list_json.encode("utf-8")) / 1e6, 2),
+            "json_dump_ms": ms(list_dump),
+            "json_load_ms": ms(list_load),
+            "pickle_mb": round(len(list_pickle) / 1e6, 2),
+            "pickle_dump_ms": ms(list_pdump),
+            "pickle_load_ms": ms(list_pload),
+        },
+        "compact": {
+            "memory_mb": round(compact_mem / 1e6, 2),
+            "bytes_per_message": compact_mem // len(rows),
+            "prepare_ms": ms(measure_prepare(compact)),
+            "bytes_mb": round(len(payload) / 1e6, 2),
+            "dump_ms": ms(compact_dump),
+            "load_ms": ms(compact_load),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="대화 기록 메모리 / 직렬화 벤치마크")
+    parser.add_argument("--turns", type=int, nargs="+", default=[1000, 10000], help="대화 턴 수 목록")
+    parser.add_argument("--output", default=None, help="결과 JSON 경로")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'턴':>7}{'원문 MB':>9}{'list MB':>9}{'compact MB':>12}{'list 저장/복원 ms':>20}"
+          f"{'compact 저장/복원 ms':>22}{'prepare list/compact ms':>25}")
+    for turns in args.turns:
+        result = run(turns)
+        results.append(result)
+        listed, compact = result["list"], result["compact"]
+        print(f"{turns:>7}{result['text_mb']:>9}{listed['memory_mb']:>9}{compact['memory_mb']:>12}"
+              f"{listed['json_dump_ms']:>10}/{listed['json_load_ms']:<9}"
+              f"{compact['dump_ms']:>11}/{compact['load_ms']:<10}"
+              f"{listed['prepare_ms']:>12}/{compact['prepare_ms']:<12}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"results": results}, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
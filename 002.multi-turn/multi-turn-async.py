@@ -0,0 +1,309 @@
+"""
+multi-turn.py의 asyncio 버전 (google.genai 비동기 클라이언트 client.aio 사용)
+
+- 답변을 생성되는 대로 스트리밍 출력
+- 답변 생성 중 Ctrl+C → 그 답변만 취소하고 대화는 유지 (입력 대기 중 Ctrl+C → 종료)
+- 이름 붙은 세션 여러 개: /session <이름> 으로 전환(없으면 생성), /sessions 로 목록
+- --soak: 한 프로세스에서 여러 세션을 동시에 돌리는 스크립트 부하 테스트
+  (세션별 TTFT / 전체 지연, 취소 / 오류 수 출력, --cancel-prob로 생성 중 취소도 섞을 수 있음)
+
+사용법:
+    python 002.multi-turn/multi-turn-async.py
+    python 002.multi-turn/multi-turn-async.py --soak --sessions 8 --turns 5
+    python 002.multi-turn/multi-turn-async.py --soak --sessions 4 --script questions.txt --cancel-prob 0.2
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from google import genai
+from google.genai import types
+
+# 공용 모듈(common/) import를 위해 프로젝트 루트를 경로에 추가
+sys.path.append(str(Path(__file__).parent.parent))
+from common.rate_limiter import get_limiter, estimate_tokens
+from common.history_manager import HistoryManager, make_gemini_summarizer
+from common.compact_transcript import CompactTranscript
+from common.prefix_cache import PrefixCache, prefix_cache_enabled
+from common.usage_ledger import SessionBudgetExceeded, get_usage_ledger
+
+load_dotenv()
+MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite")
+SYSTEM_INSTRUCTION = (
+    "너는 사용자를 도와주는 상담사야. 공감적으로 답하고, "
+    "불명확하면 짧게 되물어봐. 필요하면 단계별로 안내해줘."
+)
+SOAK_QUESTIONS = [
+    "요즘 잠을 잘 못 자요.",
+    "회사 일이 너무 많아서 지쳐요.",
+    "운동을 시작하고 싶은데 어떻게 해야 할까요?",
+    "친구와 다퉜는데 먼저 연락해야 할까요?",
+    "주말에 할 만한 취미를 추천해 주세요.",
+]
+
+
+class ChatSession:
+    """이름 붙은 대화 하나 (히스토리 + 요약 관리자 + 선택적 접두부 캐시)"""
+
+    def __init__(self, name: str, client: genai.Client):
+        self.name = name
+        self.client = client
+        self.history = CompactTranscript()
+        self.manager = HistoryManager(make_gemini_summarizer(client))
+        self.prefix_cache = PrefixCache(client, MODEL) if prefix_cache_enabled() else None
+
+    def reset(self) -> None:
+        self.history.clear()
+        self.manager.reset()
+        self.close()
+
+    def close(self) -> None:
+        if self.prefix_cache:
+            self.prefix_cache.close()
+
+    async def reply(self, user_text: str, on_text: Optional[Callable[[str], None]] = None) -> Dict[str, float]:
+        """스트리밍으로 답변 생성 (취소되면 받은 부분까지 히스토리에 남기고 CancelledError를 다시 발생)"""
+        self.history.add("user", user_text)
+
+        ledger = get_usage_ledger()
+        try:
+            # 요약 호출이 있을 수 있으므로 스레드에서 (이벤트 루프를 막지 않도록)
+            contents, instruction = await asyncio.to_thread(self.manager.prepare, self.history, SYSTEM_INSTRUCTION)
+            config = types.GenerateContentConfig(
+                system_instruction=instruction,
+                temperature=0.9,
+                thinking_config=types.ThinkingConfig(thinking_budget=0),
+            )
+            contents = ledger.enforce(self.name, contents, config)
+            if self.prefix_cache:
+                contents = self.prefix_cache.apply(contents, config)
+
+            # 캐시를 쓰면 config.system_instruction이 비워지므로 실제로 보내는 부분만 추정
+            estimated = estimate_tokens((config.system_instruction or "") + "".join(
+                p.text or "" for c in contents for p in c.parts or []
+            ))
+            ticket = await get_limiter().acquire_async(estimated)
+        except BaseException:
+            self.history.pop()  # 요청을 보내기 전에 취소 / 거절되면 사용자 메시지도 되돌림
+            raise
+
+        # TTFT / 지연시간은 슬롯을 받은 뒤부터 (요약 / 대기열 대기는 queue_wait으로 따로 기록)
+        started = time.perf_counter()
+
+        chunks: List[str] = []
+        usage = None
+        ttft = None
+        error: Optional[BaseException] = None
+        try:
+            stream = await self.client.aio.models.generate_content_stream(model=MODEL, contents=contents, config=config)
+            try:
+                async for chunk in stream:
+                    if chunk.usage_metadata is not None:
+                        usage = chunk.usage_metadata
+                    if chunk.text:
+                        if ttft is None:
+                            ttft = time.perf_counter() - started
+                        chunks.append(chunk.text)
+                        if on_text:
+                            on_text(chunk.text)
+            finally:
+                await stream.aclose()  # 취소되면 연결을 끊어 서버 쪽 생성도 멈춤
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            latency = time.perf_counter() - started
+            get_limiter().release(ticket, usage.total_token_count if usage else None, error=error)
+            text = "".join(chunks)
+            cancelled = isinstance(error, asyncio.CancelledError)
+            if error is None or cancelled:
+                self.history.add("model", (text or "(빈 응답)") + (" …(중단됨)" if cancelled else ""))
+            else:
+                self.history.pop()  # 실패한 턴은 히스토리에서 제외
+            ledger.record(
+                self.name, "multi-turn-async", MODEL,
+                prompt_tokens=usage.prompt_token_count if usage else estimated,
+                output_tokens=(usage.candidates_token_count or 0) if usage else estimate_tokens(text),
+                cached_tokens=(usage.cached_content_token_count or 0) if usage else 0,
+                latency_s=latency,
+                ttft_s=ttft,
+                queue_wait_s=ticket.queue_wait,
+            )
+            if self.prefix_cache:
+                self.prefix_cache.record_usage(usage)
+        return {"ttft_s": ttft if ttft is not None else latency, "latency_s": latency}
+
+
+def start_stdin_reader(loop: asyncio.AbstractEventLoop, lines: "asyncio.Queue[Optional[str]]") -> None:
+    """input()을 데몬 스레드에서 읽어 큐로 전달 (None = 입력 끝)
+
+    데몬 스레드라서 입력을 기다리는 중에도 프로그램이 바로 종료될 수 있음
+    """
+    def read():
+        while True:
+            try:
+                line = input()
+            except (EOFError, KeyboardInterrupt):
+                line = None
+            loop.call_soon_threadsafe(lines.put_nowait, line)
+            if line is None:
+                return
+
+    threading.Thread(target=read, name="stdin-reader", daemon=True).start()
+
+
+async def repl(client: genai.Client) -> None:
+    loop = asyncio.get_running_loop()
+    lines: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+    start_stdin_reader(loop, lines)
+
+    sessions: Dict[str, ChatSession] = {"default": ChatSession("default", client)}
+    current = sessions["default"]
+    generating: Dict[str, Optional[asyncio.Task]] = {"task": None}
+
+    def on_sigint(signum, frame):
+        task = generating["task"]
+        if task is not None and not task.done():
+            loop.call_soon_threadsafe(task.cancel)  # 생성 중인 답변만 취소
+        else:
+            loop.call_soon_threadsafe(lines.put_nowait, None)  # 입력 대기 중이면 종료
+
+    signal.signal(signal.SIGINT, on_sigint)
+
+    print("대화를 시작합니다. 'exit' 종료, 'reset' 히스토리 초기화, "
+          "'/session <이름>' 세션 전환, '/sessions' 목록, 답변 중 Ctrl+C는 답변만 취소.")
+    while True:
+        print(f"[{current.name}] 사용자: ", end="", flush=True)
+        line = await lines.get()
+        if line is None:
+            print("\n종료합니다.")
+            break
+        user_input = line.strip()
+        if not user_input:
+            continue
+        if user_input.lower() == "exit":
+            print("종료합니다.")
+            break
+        if user_input.lower() == "reset":
+            current.reset()
+            print("히스토리를 초기화했어요.")
+            continue
+        if user_input == "/sessions":
+            for name, session in sessions.items():
+                mark = "*" if session is current else " "
+                print(f" {mark} {name}: 메시지 {len(session.history)}개, {get_usage_ledger().session_stats(name)['total_tokens']} 토큰")
+            continue
+        if user_input.startswith("/session"):
+            name = user_input[len("/session"):].strip() or "default"
+            if name not in sessions:  # 이미 있는 세션으로 전환할 때는 새로 만들지 않음
+                sessions[name] = ChatSession(name, client)
+            current = sessions[name]
+            print(f"세션 '{name}'로 전환했어요. (메시지 {len(current.history)}개)")
+            continue
+
+        print("AI: ", end="", flush=True)
+        generating["task"] = asyncio.create_task(
+            current.reply(user_input, on_text=lambda text: print(text, end="", flush=True))
+        )
+        try:
+            await generating["task"]
+            print()
+        except asyncio.CancelledError:
+            print("\n(답변을 취소했어요. 대화는 그대로 이어집니다.)")
+        except SessionBudgetExceeded as e:
+            print(f"⚠️ 토큰 예산을 모두 사용했어요: {e}")
+        except Exception as e:
+            print(f"\n오류가 발생했어요: {e}")
+        finally:
+            generating["task"] = None
+
+    for session in sessions.values():
+        session.close()
+
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+
+async def soak(client: genai.Client, args) -> None:
+    """세션 args.sessions개가 동시에 args.turns턴씩 대화"""
+    questions = SOAK_QUESTIONS
+    if args.script:
+        with open(args.script, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+    loop = asyncio.get_running_loop()
+    rng = random.Random(args.seed)
+    results: Dict[str, Dict[str, list]] = {}
+
+    async def drive(index: int) -> None:
+        name = f"soak-{index}"
+        session = ChatSession(name, client)
+        result = results[name] = {"ttft": [], "latency": [], "cancelled": [], "errors": []}
+        for turn in range(args.turns):
+            task = asyncio.create_task(session.reply(questions[(index + turn) % len(questions)]))
+            if rng.random() < args.cancel_prob:
+                loop.call_later(rng.uniform(0, args.cancel_after), task.cancel)
+            try:
+                timing = await task
+                result["ttft"].append(timing["ttft_s"])
+                result["latency"].append(timing["latency_s"])
+            except asyncio.CancelledError:
+                result["cancelled"].append(turn)
+            except Exception as e:
+                result["errors"].append(str(e)[:80])
+        session.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(drive(i) for i in range(args.sessions)))
+    wall = time.perf_counter() - started
+
+    print(f"{'세션':<10}{'완료':>6}{'취소':>6}{'오류':>6}{'TTFT p50':>10}{'지연 p50':>10}{'지연 p95':>10}")
+    for name, result in results.items():
+        print(f"{name:<10}{len(result['latency']):>6}{len(result['cancelled']):>6}{len(result['errors']):>6}"
+              f"{_pct(result['ttft'], 0.5):>10}{_pct(result['latency'], 0.5):>10}{_pct(result['latency'], 0.95):>10}")
+    ttfts = [v for r in results.values() for v in r["ttft"]]
+    latencies = [v for r in results.values() for v in r["latency"]]
+    completed = len(latencies)
+    print(f"\n전체: {completed}턴 완료 / {wall:.2f}초 ({completed / wall:.2f} 턴/s), "
+          f"TTFT p50 {_pct(ttfts, 0.5)} ms / p95 {_pct(ttfts, 0.95)} ms, "
+          f"지연 p50 {_pct(latencies, 0.5)} ms / p95 {_pct(latencies, 0.95)} ms")
+    print(f"사용량: {get_usage_ledger().stats()}")
+    print(f"제한기: {get_limiter().stats()}")
+    for name, result in results.items():
+        for error in result["errors"][:3]:
+            print(f"  {name} 오류: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="비동기 멀티턴 대화 (스트리밍 / 취소 / 동시 세션)")
+    parser.add_argument("--soak", action="store_true", help="여러 세션을 동시에 돌리는 부하 테스트")
+    parser.add_argument("--sessions", type=int, default=4, help="동시 세션 수 (--soak)")
+    parser.add_argument("--turns", type=int, default=5, help="세션별 턴 수 (--soak)")
+    parser.add_argument("--script", default=None, help="질문 목록 파일 (한 줄에 하나, --soak)")
+    parser.add_argument("--cancel-prob", type=float, default=0.0, help="턴마다 생성 중 취소할 확률 (--soak)")
+    parser.add_argument("--cancel-after", type=float, default=0.5, help="취소 시점 최대값(초) (--soak)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY가 설정되지 않았습니다.")
+    client = genai.Client(api_key=api_key)
+
+    asyncio.run(soak(client, args) if args.soak else repl(client))
+
+
+if __name__ == "__main__":
+    main()
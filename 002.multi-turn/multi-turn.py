@@ -1,8 +1,19 @@
 import os
+import sys
+import time
+from pathlib import Path
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 
+# 공용 모듈(common/) import를 위해 프로젝트 루트를 경로에 추가
+sys.path.append(str(Path(__file__).parent.parent))
+from common.rate_limiter import get_limiter, estimate_tokens
+from common.history_manager import HistoryManager, make_gemini_summarizer
+from common.compact_transcript import CompactTranscript
+from common.prefix_cache import PrefixCache, prefix_cache_enabled
+from common.usage_ledger import SessionBudgetExceeded, get_usage_ledger
+
 # -----------------------------
 # 1) API 키 로드
 # -----------------------------
@@ -18,6 +29,7 @@ if not api_key:
 # -----------------------------
 # Gemini API를 호출하기 위한 클라이언트 객체를 생성합니다.
 client = genai.Client(api_key=api_key)
+model = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite")
 
 # -----------------------------
 # 3) 시스템 지시어(역할 설정)
@@ -32,8 +44,23 @@ system_instruction = (
 # -----------------------------
 # 4) 대화 히스토리 초기화
 # -----------------------------
-# 멀티턴 대화를 위해 user / model 메시지를 순서대로 기록할 리스트입니다.
-history: list[types.Content] = []
+# 멀티턴 대화를 위해 user / model 메시지를 순서대로 기록합니다.
+# types.Content 리스트 대신 역할 / 텍스트를 연속 버퍼에 저장하는 CompactTranscript를 사용하고,
+# Content 객체는 요청을 만들 때 보낼 구간만 만들어집니다. (history[i], history[a:b], len, pop 사용 가능)
+history = CompactTranscript()
+
+# 요청에는 토큰 예산 안의 최근 턴만 그대로 보내고, 오래된 턴은 요약해서 시스템 지시어 뒤에 붙입니다.
+# (CHAT_HISTORY_MAX_TOKENS, CHAT_HISTORY_KEEP_TURNS 환경 변수로 조절)
+history_manager = HistoryManager(make_gemini_summarizer(client))
+
+# (선택) CHAT_PREFIX_CACHE=1이면 시스템 지시어 + 이전 턴을 Gemini 캐시로 만들어 두고 새 부분만 보냅니다.
+# 캐시는 대화가 길어지면 백그라운드에서 새로 만들어 교체합니다.
+prefix_cache = PrefixCache(client, model) if prefix_cache_enabled() else None
+
+# 호출마다 입력 / 출력 / 캐시 토큰과 지연시간을 기록하고, 세션 토큰 예산을 넘지 않게 합니다.
+# (CHAT_SESSION_TOKEN_BUDGET, CHAT_BUDGET_POLICY 환경 변수로 조절)
+usage_ledger = get_usage_ledger()
+session_id = "multi-turn"
 
 print("대화를 시작합니다. 'exit'으로 종료, 'reset'으로 히스토리 초기화.")
 
@@ -57,46 +84,76 @@ while True:
         break
 
     if user_input.lower() == "reset":  # 'reset' 입력 시 히스토리 초기화
-        history = []
+        history.clear()
+        history_manager.reset()
+        if prefix_cache:
+            prefix_cache.close()
         print("히스토리를 초기화했어요.")
         continue
 
     # -----------------------------
     # 6) 사용자 메시지를 히스토리에 추가
     # -----------------------------
-    history.append(
-        types.Content(role="user", parts=[types.Part(text=user_input)])
-    )
+    history.add("user", user_input)
 
     # -----------------------------
-    # 7) 모델 호출 (전체 히스토리 전달)
+    # 7) 모델 호출 (최근 턴 + 이전 대화 요약 전달)
     # -----------------------------
-    response = client.models.generate_content(
-        model=os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite"),
-        contents=history,  # 지금까지의 대화 기록 전체
-        config=types.GenerateContentConfig(
-            system_instruction=system_instruction,  # 시스템 지시어 반영
-            temperature=0.9,                        # 창의성/가변성 조절
-            thinking_config=types.ThinkingConfig(thinking_budget=0),  # Thinking 비활성화
-        ),
+    contents, effective_instruction = history_manager.prepare(history, system_instruction)
+    config = types.GenerateContentConfig(
+        system_instruction=effective_instruction,  # 시스템 지시어 (+ 이전 대화 요약) 반영
+        temperature=0.9,                        # 창의성/가변성 조절
+        thinking_config=types.ThinkingConfig(thinking_budget=0),  # Thinking 비활성화
+    )
+    try:
+        # 남은 예산에 맞춰 오래된 턴을 빼고 출력 길이를 제한 (정책이 refuse면 거절)
+        contents = usage_ledger.enforce(session_id, contents, config)
+    except SessionBudgetExceeded as e:
+        history.pop()  # 보내지 못한 사용자 메시지는 히스토리에서 제외
+        print(f"⚠️ 토큰 예산을 모두 사용했어요: {e}")
+        continue
+    if prefix_cache:
+        # 캐시된 앞부분은 config.cached_content로, 나머지만 contents로 보냄
+        contents = prefix_cache.apply(contents, config)
+
+    # 공용 제한기를 거쳐 호출 (RPM/TPM 초과 시 실패 대신 대기)
+    # 추정 토큰은 실제로 보내는 부분만 (캐시가 시스템 지시어를 가져가면 config에서 비워짐)
+    started = time.perf_counter()
+    response = get_limiter().call(
+        client.models.generate_content,
+        estimated_tokens=estimate_tokens((config.system_instruction or "") + "".join(
+            p.text or "" for c in contents for p in c.parts or []
+        )),
+        model=model,
+        contents=contents,  # 토큰 예산 안의 최근 대화 기록
+        config=config,
     )
+    usage_ledger.record_response(session_id, "multi-turn", model, response.usage_metadata,
+                                 latency_s=time.perf_counter() - started)
+    if prefix_cache:
+        prefix_cache.record_usage(response.usage_metadata)
 
     # -----------------------------
     # 8) 모델 응답 텍스트 추출
     # -----------------------------
-    assistant_text = response.text  # 대표 응답을 편리하게 가져옴
+    # 대표 응답을 편리하게 가져옴 (안전 차단 / 빈 후보 / MAX_TOKENS면 None)
+    assistant_text = response.text or "(빈 응답)"
 
     # -----------------------------
     # 9) 모델 응답을 히스토리에 추가
     # -----------------------------
-    history.append(
-        types.Content(role="model", parts=[types.Part(text=assistant_text)])
-    )
+    history.add("model", assistant_text)
 
     # -----------------------------
     # 10) 출력
     # -----------------------------
     print("AI:", assistant_text)
 
-    # (선택) 히스토리 길이 확인
-    # print(f"(history turns: {len(history)})")
\ No newline at end of file
+    # (선택) 히스토리 길이 / 절약한 토큰 확인
+    # print(f"(history turns: {len(history)}, {history_manager.stats()})")
+    # print(f"(prefix cache: {prefix_cache.stats() if prefix_cache else '사용 안 함'})")
+
+if prefix_cache:
+    prefix_cache.close()  # 캐시 저장 비용이 TTL 동안 계속 들지 않도록 삭제
+
+print(f"사용량: {usage_ledger.session_stats(session_id)}")
\ No newline at end of file
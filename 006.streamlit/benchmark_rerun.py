@@ -0,0 +1,86 @@
+"""
+streamlit-chat.py 재실행 시간 벤치마크 (대화 길이별)
+
+Streamlit 테스트 API(AppTest)로 앱 스크립트를 브라우저 없이 실행합니다.
+대화 기록을 N턴 미리 채워 두고 재실행(rerun)에 걸리는 시간을 측정합니다.
+API 호출은 하지 않습니다 (새 메시지를 보내지 않고 화면만 다시 그림).
+
+비교:
+    paged  - 최근 메시지만 말풍선 + 이전 대화는 페이지 단위 (CHAT_RECENT_MESSAGES 기본값)
+    full   - 모든 메시지를 말풍선으로 그림 (이전 방식)
+
+사용법:
+    python 006.streamlit/benchmark_rerun.py --turns 50 200 500 1000 --reruns 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+sys.path.append(str(Path(__file__).parent.parent))
+from common.compact_transcript import CompactTranscript
+
+APP_PATH = str(Path(__file__).parent / "streamlit-chat.py")
+
+
+def make_history(turns: int) -> CompactTranscript:
+    """턴마다 사용자 질문 + 적당한 길이의 모델 답변"""
+    history = CompactTranscript()
+    for i in range(turns):
+        history.add("user", f"{i}번째 질문입니다. 어떻게 하면 좋을까요?")
+        history.add("model", f"{i}번째 답변입니다. " + "상황을 단계별로 정리해 보면 다음과 같아요. **먼저** 확인할 것은... " * 6)
+    return history
+
+
+def measure(turns: int, reruns: int, recent: int) -> Dict[str, float]:
+    from streamlit.testing.v1 import AppTest
+
+    os.environ["CHAT_RECENT_MESSAGES"] = str(recent)
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+    at.session_state["history"] = make_history(turns)
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+
+    samples = []
+    for _ in range(reruns):
+        started = time.perf_counter()
+        at.run()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {"p50_ms": round(statistics.median(samples), 1), "max_ms": round(samples[-1], 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="streamlit-chat 재실행 시간 벤치마크")
+    parser.add_argument("--turns", type=int, nargs="+", default=[50, 200, 500, 1000], help="대화 턴 수 목록")
+    parser.add_argument("--reruns", type=int, default=10, help="길이별 재실행 횟수")
+    parser.add_argument("--output", default=None, help="결과 JSON 경로")
+    args = parser.parse_args()
+
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark-key")  # API 키 확인만 통과 (호출하지 않음)
+    # 세션 저장소는 임시 폴더에 (실행할 때마다 현재 폴더의 chat_sessions.sqlite3에 세션이 쌓이지 않도록)
+    os.environ.setdefault("CHAT_SESSION_DB", os.path.join(tempfile.mkdtemp(prefix="chat_rerun_"), "sessions.sqlite3"))
+    paged_recent = int(os.getenv("CHAT_RECENT_MESSAGES", "40"))
+
+    results = []
+    print(f"{'턴 수':>8}{'full p50(ms)':>16}{'paged p50(ms)':>16}")
+    for turns in args.turns:
+        full = measure(turns, args.reruns, recent=turns * 2)
+        paged = measure(turns, args.reruns, recent=paged_recent)
+        results.append({"turns": turns, "full": full, "paged": paged})
+        print(f"{turns:>8}{full['p50_ms']:>16}{paged['p50_ms']:>16}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+streamlit-chat.py 다중 사용자 부하 테스트 (가짜 Gemini 서버 사용)
+
+Streamlit 테스트 API(AppTest)로 앱 스크립트를 브라우저 없이 실행합니다.
+AppTest 인스턴스 하나가 사용자 세션 하나이고, 동시 사용자 수만큼 스레드에서 동시에 대화를 보냅니다.
+Streamlit 서버와 마찬가지로 모든 세션이 한 프로세스 안에서 스크립트를 실행하므로
+프로세스 하나가 감당할 수 있는 동시 사용자 수를 가늠할 수 있습니다.
+
+측정:
+    chat    - 메시지를 보낸 재실행 (스트리밍 응답 포함) 지연 p50/p95/p99
+    rerun   - 메시지 없이 화면만 다시 그리는 재실행 지연 p50/p95/p99
+    throughput - 초당 처리한 대화 턴 수
+    memory  - 세션을 만들기 전 대비 RSS 증가량 / 세션 수
+
+사용법:
+    python 006.streamlit/load_test.py --users 1 4 16 --turns 5 --latency 0.3 --tokens-per-sec 80
+    python 006.streamlit/load_test.py --users 1 8 32 --output load.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+try:
+    import resource  # 유닉스 계열에서만 사용 가능
+except ImportError:
+    resource = None
+
+BASE_DIR = Path(__file__).parent
+sys.path.append(str(BASE_DIR.parent))
+
+from common.fake_gemini_server import FakeGeminiConfig, start_fake_server
+
+APP_PATH = str(BASE_DIR / "streamlit-chat.py")
+
+QUESTIONS = [
+    "청약 1순위 조건이 궁금해요.",
+    "무주택 세대주 기준은 어떻게 되나요?",
+    "신혼부부 특별공급 소득 기준을 알려주세요.",
+    "청약통장 납입 횟수는 몇 번이어야 하나요?",
+    "가점제와 추첨제 차이가 뭔가요?",
+]
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """p50 / p95 / p99 (밀리초)"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+    return {"count": len(ordered), "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+
+def current_rss_mb() -> float:
+    """현재 RSS (MB) — /proc가 없으면 최대 RSS로 대신함"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError):
+        if resource is None:
+            return 0.0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def allow_concurrent_apptests() -> None:
+    """여러 AppTest를 동시에 실행할 수 있게 함 (실제 서버처럼 Runtime / 스크립트 바이트코드를 공유)
+
+    - AppTest는 실행할 때마다 전역 Runtime(모의 객체)을 만들고 끝나면 Runtime._instance = None 으로 지우므로,
+      세션 여러 개를 동시에 돌리면 다른 세션의 스크립트 실행 중에 Runtime이 사라짐
+      → 마지막으로 만들어진 Runtime을 계속 돌려줌
+    - 실행할 때마다 ScriptCache를 새로 만들어 스크립트를 다시 컴파일하는데,
+      Python 3.11의 ast.parse는 여러 스레드에서 동시에 부르면 SystemError가 날 수 있음
+      → 서버처럼 프로세스 전체에서 ScriptCache 하나를 공유
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    shared_cache = ScriptCache()
+    get_bytecode = ScriptCache.get_bytecode
+    ScriptCache.get_bytecode = lambda self, script_path: get_bytecode(shared_cache, script_path)
+
+    last = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            last["runtime"] = cls._instance
+            return cls._instance
+        if "runtime" in last:
+            return last["runtime"]
+        raise RuntimeError("Runtime hasn't been created!")
+
+    def exists(cls):
+        return cls._instance is not None or "runtime" in last
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(exists)
+
+
+def run_user(user: int, turns: int, idle_reruns: int, samples: Dict[str, List[float]], lock: threading.Lock):
+    """세션 하나: 첫 화면 → turns번 메시지 전송 (+ 매 턴 idle_reruns번 화면만 재실행)"""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=300)
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+
+    chat, rerun = [], []
+    for turn in range(turns):
+        started = time.perf_counter()
+        at.chat_input[0].set_value(f"[{user}] {QUESTIONS[turn % len(QUESTIONS)]}").run()
+        chat.append(time.perf_counter() - started)
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        for _ in range(idle_reruns):
+            started = time.perf_counter()
+            at.run()
+            rerun.append(time.perf_counter() - started)
+
+    with lock:
+        samples["chat"].extend(chat)
+        samples["rerun"].extend(rerun)
+    return at  # 메모리 측정이 끝날 때까지 세션을 살려 둠
+
+
+def run_level(users: int, args, server_config: FakeGeminiConfig) -> dict:
+    """동시 사용자 users명으로 한 번 실행"""
+    gc.collect()
+    rss_before = current_rss_mb()
+    requests_before = server_config.requests
+    samples: Dict[str, List[float]] = {"chat": [], "rerun": []}
+    lock = threading.Lock()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        sessions = list(pool.map(
+            lambda user: run_user(user, args.turns, args.idle_reruns, samples, lock), range(users)
+        ))
+    wall = time.perf_counter() - started
+
+    gc.collect()
+    rss_after = current_rss_mb()
+    history_messages = sum(len(at.session_state["history"]) for at in sessions)
+    del sessions
+
+    turns = users * args.turns
+    return {
+        "users": users,
+        "turns": turns,
+        "wall_s": round(wall, 2),
+        "turns_per_s": round(turns / wall, 2) if wall else 0.0,
+        "chat": percentiles(samples["chat"]),
+        "rerun": percentiles(samples["rerun"]),
+        "fake_server_requests": server_config.requests - requests_before,
+        "memory": {
+            "rss_before_mb": rss_before,
+            "rss_after_mb": rss_after,
+            "per_session_mb": round(max(0.0, rss_after - rss_before) / users, 2),
+            "history_messages_in_memory": history_messages,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="streamlit-chat 다중 사용자 부하 테스트")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 4, 16], help="동시 사용자 수 목록")
+    parser.add_argument("--turns", type=int, default=5, help="사용자별 대화 턴 수")
+    parser.add_argument("--idle-reruns", type=int, default=2, help="턴마다 메시지 없이 재실행할 횟수")
+    parser.add_argument("--latency", type=float, default=0.3, help="가짜 서버 첫 토큰 지연(초)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="가짜 서버 지연 편차(초)")
+    parser.add_argument("--tokens-per-sec", type=float, default=80.0, help="가짜 서버 토큰 생성 속도")
+    parser.add_argument("--output", default=None, help="결과 JSON 경로")
+    args = parser.parse_args()
+
+    # 가짜 Gemini 서버를 띄우고 앱이 그쪽으로 요청하도록 설정
+    server_config = FakeGeminiConfig(args.latency, args.jitter, args.tokens_per_sec)
+    server, base_url = start_fake_server(server_config)
+    os.environ["GEMINI_API_ENDPOINT"] = base_url
+    os.environ["GEMINI_API_KEY"] = "fake-key"
+    # 가짜 서버를 상대로 하므로 속도 제한기 한도를 충분히 크게
+    os.environ.setdefault("GEMINI_RPM", "1000000")
+    os.environ.setdefault("GEMINI_TPM", "1000000000")
+    os.environ.setdefault("GEMINI_MAX_CONCURRENCY", str(max(args.users)))
+    # 세션 저장소는 임시 폴더에 (저장소의 기존 대화와 섞이지 않도록)
+    os.environ.setdefault("CHAT_SESSION_DB", os.path.join(tempfile.mkdtemp(prefix="chat_load_"), "sessions.sqlite3"))
+
+    allow_concurrent_apptests()
+    # 모듈 import / 클라이언트 생성 등 1회성 비용이 첫 단계 측정에 섞이지 않도록 한 번 미리 실행
+    run_user(-1, 1, 0, {"chat": [], "rerun": []}, threading.Lock())
+
+    results = []
+    print(f"{'사용자':>6}{'턴/s':>8}{'chat p50':>10}{'chat p95':>10}{'chat p99':>10}"
+          f"{'rerun p50':>11}{'rerun p95':>11}{'MB/세션':>9}")
+    for users in args.users:
+        result = run_level(users, args, server_config)
+        results.append(result)
+        chat, rerun = result["chat"], result["rerun"]
+        print(f"{users:>6}{result['turns_per_s']:>8}{chat['p50_ms']:>10}{chat['p95_ms']:>10}{chat['p99_ms']:>10}"
+              f"{rerun.get('p50_ms', '-'):>11}{rerun.get('p95_ms', '-'):>11}"
+              f"{result['memory']['per_session_mb']:>9}")
+    server.shutdown()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,22 @@
 import os
+import sys
+import time
+from pathlib import Path
 from dotenv import load_dotenv
 import streamlit as st
-from google import genai
 from google.genai import types
 
+# 공용 모듈(common/) import를 위해 프로젝트 루트를 경로에 추가
+sys.path.append(str(Path(__file__).parent.parent))
+from common.rate_limiter import get_limiter, estimate_tokens
+from common.history_manager import HistoryManager, make_gemini_summarizer
+from common.client_cache import get_client, get_client_cache
+from common.chat_transcript import ChatTranscript
+from common.compact_transcript import CompactTranscript
+from common.session_store import get_session_store
+from common.prefix_cache import PrefixCache, prefix_cache_enabled
+from common.usage_ledger import SessionBudgetExceeded, get_usage_ledger
+
 # =============================================================================
 # 상수 정의
 # =============================================================================
@@ -13,6 +26,9 @@ DEFAULT_SYSTEM_INSTRUCTION = (
     "너는 사용자를 도와주는 상담사야. 공감적으로 답하고, "
     "불명확하면 짧게 되물어봐. 필요하면 단계별로 안내해줘."
 )
+# 말풍선으로 그릴 최근 메시지 수 / 이전 대화 한 페이지의 메시지 수
+RECENT_MESSAGES = int(os.getenv("CHAT_RECENT_MESSAGES", "40"))
+HISTORY_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_PAGE_SIZE", "50"))
 
 # =============================================================================
 # 초기화
@@ -25,18 +41,90 @@ st.set_page_config(page_title="Gemini Chat", page_icon="💬")
 # =============================================================================
 # 헬퍼 함수
 # =============================================================================
+def open_session(session_id=None):
+    """저장소에서 세션을 열기 (없으면 새로 만들고 URL의 ?session= 에 기록)
+
+    메모리에는 마지막 요약 이후의 메시지만 올리고, 그 앞은 화면에서 볼 때 저장소에서 읽음
+    """
+    store = get_session_store()
+    if not session_id or not store.exists(session_id):
+        session_id = store.new_session()
+    st.query_params["session"] = session_id
+    st.session_state.session_id = session_id
+
+    upto, summary = store.latest_summary(session_id)
+    if "history" not in st.session_state:
+        # 역할 / 텍스트만 연속 버퍼에 보관 (Content는 요청을 만들 때 필요한 구간만 생성)
+        st.session_state.history = CompactTranscript(store.load(session_id, upto))
+        st.session_state.history_offset = upto  # 메모리에 없는 앞쪽 메시지 수
+    st.session_state.setdefault("history_offset", 0)
+    st.session_state.transcript = ChatTranscript(offset=st.session_state.history_offset)
+
+    # 최근 턴만 그대로 보내고 오래된 턴은 요약 (재시작 후에도 저장된 요약부터 이어감)
+    manager = st.session_state.history_manager = HistoryManager()
+    manager.summary = summary
+    # 메모리에 없는 앞쪽 메시지도 전체 history 토큰 통계에 포함 (세션을 열 때 한 번만 셈)
+    offset = st.session_state.history_offset
+    if offset:
+        manager.folded_tokens = sum(estimate_tokens(text) for _, text in store.load(session_id, 0, offset))
+        manager.folded_total = offset
+
+    # (선택) 시스템 지시어 + 이전 턴을 Gemini 캐시로 보관하고 새 부분만 전송 (CHAT_PREFIX_CACHE=1)
+    st.session_state.prefix_cache = PrefixCache(None, MODEL_NAME) if prefix_cache_enabled() else None
+
+
 def init_session_state():
     """세션 상태 초기화"""
-    if "history" not in st.session_state:
-        st.session_state.history = []
+    if "session_id" not in st.session_state:
+        open_session(st.query_params.get("session"))
     if "system_instruction" not in st.session_state:
         st.session_state.system_instruction = DEFAULT_SYSTEM_INSTRUCTION
+    if "turn_metrics" not in st.session_state:
+        st.session_state.turn_metrics = []
 
 
 def reset_conversation():
-    """대화 초기화"""
-    st.session_state.history = []
+    """대화 초기화 (기존 기록은 저장소에 남기고 새 세션 시작)"""
+    if st.session_state.prefix_cache is not None:
+        st.session_state.prefix_cache.close()
+    del st.session_state.history
+    open_session()
     st.session_state.system_instruction = DEFAULT_SYSTEM_INSTRUCTION
+    st.session_state.turn_metrics = []
+
+
+def append_message(role, text):
+    """메시지를 메모리의 history와 저장소에 함께 추가"""
+    st.session_state.history.add(role, text)
+    save_last_message()
+
+
+def save_last_message():
+    """history의 마지막 메시지를 저장소에 기록 (예산 확인 뒤에 사용자 메시지를 저장할 때도 사용)"""
+    history = st.session_state.history
+    seq = st.session_state.history_offset + len(history) - 1
+    get_session_store().append(st.session_state.session_id, seq, history.role(-1), history.text(-1))
+
+
+def release_folded_messages():
+    """요약으로 접힌 메시지를 메모리에서 내리고 요약을 저장소에 기록"""
+    manager = st.session_state.history_manager
+    folded = manager.release_folded()
+    if folded:
+        del st.session_state.history[:folded]
+        st.session_state.transcript.drop_front(folded)
+        st.session_state.history_offset += folded
+        get_session_store().append_summary(
+            st.session_state.session_id, st.session_state.history_offset, manager.summary
+        )
+
+
+def load_older_messages(start, end):
+    """메모리에 없는 이전 메시지를 저장소에서 읽기 (이전 대화 페이지를 열 때만)"""
+    return [
+        ("assistant" if role == "model" else "user", text)
+        for role, text in get_session_store().load(st.session_state.session_id, start, end)
+    ]
 
 
 def render_sidebar():
@@ -67,14 +155,41 @@ def render_sidebar():
     )
     st.session_state.system_instruction = system_instruction
 
+    with st.sidebar.expander("🚦 Rate Limiter"):
+        st.json(get_limiter().stats())
+
+    with st.sidebar.expander("🧠 History Manager"):
+        st.caption(f"세션 {st.session_state.session_id[:8]} · 메모리 {len(st.session_state.history)}개 / "
+                   f"전체 {st.session_state.history_offset + len(st.session_state.history)}개 메시지")
+        st.json(st.session_state.history_manager.stats())
+
+    if st.session_state.prefix_cache is not None:
+        with st.sidebar.expander("🧊 Prefix Cache"):
+            st.json(st.session_state.prefix_cache.stats())
+
+    with st.sidebar.expander("⏱ 응답 속도 (턴별)"):
+        if st.session_state.turn_metrics:
+            st.dataframe(st.session_state.turn_metrics, hide_index=True)
+        else:
+            st.caption("아직 응답이 없습니다.")
+
     return api_key, temperature, thinking_off, system_instruction
 
 
 def render_chat_history():
-    """대화 히스토리 렌더링"""
-    for msg in st.session_state.history:
-        role = "assistant" if msg.role == "model" else "user"
-        text = "".join(p.text for p in msg.parts if hasattr(p, "text"))
+    """대화 히스토리 렌더링 (최근 메시지만 말풍선, 이전 대화는 페이지 단위로)"""
+    transcript = st.session_state.transcript
+    transcript.sync(st.session_state.history)  # 새로 추가된 메시지만 평탄화
+
+    recent = transcript.recent(RECENT_MESSAGES)
+    older = len(transcript) - len(recent)
+    if older:
+        with st.expander(f"📜 이전 대화 {older}개"):
+            pages = transcript.page_count(older, HISTORY_PAGE_SIZE)
+            page = st.number_input("페이지", 1, pages, pages, key="history_page") if pages > 1 else 1
+            st.markdown(transcript.page_markdown(page - 1, HISTORY_PAGE_SIZE, older, load_older_messages))
+
+    for role, text in recent:
         with st.chat_message(role):
             st.markdown(text)
 
@@ -90,6 +205,81 @@ def create_config(system_instruction, temperature, thinking_off):
     return config
 
 
+def stream_reply(client, contents, config, metrics):
+    """응답을 조각(chunk) 단위로 yield 하면서 TTFT / 출력 토큰 수를 metrics에 기록"""
+    estimated = estimate_tokens((config.system_instruction or "") + "".join(
+        p.text or "" for c in contents for p in c.parts
+    ))
+    metrics["estimated_prompt_tokens"] = estimated
+    # 공용 제한기를 거쳐 호출 (RPM/TPM 초과 시 실패 대신 대기)
+    with get_limiter().slot(estimated) as ticket:
+        metrics["queue_wait_s"] = ticket.queue_wait
+        started = time.perf_counter()  # 대기열 대기는 queue_wait_s로 따로 기록하고 TTFT에서는 제외
+        stream = client.models.generate_content_stream(model=MODEL_NAME, contents=contents, config=config)
+        try:
+            for chunk in stream:
+                usage = chunk.usage_metadata
+                if usage is not None:
+                    ticket.used_tokens = usage.total_token_count
+                    metrics["usage"] = usage
+                    metrics["output_tokens"] = usage.candidates_token_count or 0
+                if chunk.text:
+                    if "ttft_s" not in metrics:
+                        metrics["ttft_s"] = time.perf_counter() - started
+                        # 새 클라이언트의 첫 요청과 이후 요청을 나눠 기록 (연결 수립 비용 비교용)
+                        get_client_cache().record_ttft(client, metrics["ttft_s"])
+                    yield chunk.text
+        finally:
+            # 새 메시지 / Reset으로 중단되면 스트림을 닫아 연결을 끊음
+            stream.close()
+            metrics["total_s"] = time.perf_counter() - started
+
+
+def render_usage_panel(container):
+    """세션 토큰 사용량 / 예산 / 최근 호출 (응답 뒤에 그려서 방금 턴까지 반영)"""
+    ledger = get_usage_ledger()
+    session_id = st.session_state.session_id
+    stats = ledger.session_stats(session_id)
+    with container.expander("📊 Usage"):
+        if stats["budget"]:
+            st.progress(min(1.0, stats["total_tokens"] / stats["budget"]),
+                        text=f"{stats['total_tokens']:,} / {stats['budget']:,} 토큰 ({ledger.policy})")
+        st.json(stats)
+        calls = ledger.recent_calls(session_id, 10)
+        if calls:
+            st.dataframe(calls, hide_index=True)
+
+
+def record_turn_metrics(metrics, text, cancelled):
+    """턴별 TTFT, tokens/s, 캐시에서 처리된 입력 토큰 기록 (+ 세션 사용량 장부)"""
+    usage = metrics.get("usage")
+    if st.session_state.prefix_cache is not None:
+        st.session_state.prefix_cache.record_usage(usage)
+    output_tokens = metrics.get("output_tokens") or estimate_tokens(text)
+    ttft = metrics.get("ttft_s")
+    if "estimated_prompt_tokens" in metrics:  # 요청을 보내기 전에 중단된 경우는 기록하지 않음
+        get_usage_ledger().record(
+            st.session_state.session_id, "streamlit-chat", MODEL_NAME,
+            # 첫 응답 전에 중단되면 usage가 없으므로 추정치로 기록
+            prompt_tokens=usage.prompt_token_count if usage else metrics["estimated_prompt_tokens"],
+            output_tokens=output_tokens,
+            cached_tokens=(usage.cached_content_token_count or 0) if usage else 0,
+            latency_s=metrics.get("total_s", 0.0),
+            ttft_s=ttft,
+            queue_wait_s=metrics.get("queue_wait_s", 0.0),
+        )
+    generation_s = metrics.get("total_s", 0.0) - (ttft or 0.0)
+    st.session_state.turn_metrics.append({
+        "turn": len(st.session_state.turn_metrics) + 1,
+        "ttft_s": round(ttft, 3) if ttft is not None else None,
+        "tokens_per_s": round(output_tokens / generation_s, 1) if generation_s > 0 else None,
+        "output_tokens": output_tokens,
+        "prompt_tokens": usage.prompt_token_count if usage else None,
+        "cached_tokens": (usage.cached_content_token_count or 0) if usage else None,
+        "cancelled": cancelled,
+    })
+
+
 # =============================================================================
 # 메인 로직
 # =============================================================================
@@ -103,8 +293,20 @@ if not api_key:
     st.warning("좌측 사이드바에 GEMINI_API_KEY를 입력하세요.")
     st.stop()
 
-# 클라이언트 생성
-client = genai.Client(api_key=api_key)
+# 클라이언트 (API 키별로 프로세스 전체에서 재사용 → 재실행마다 연결을 새로 맺지 않음)
+# 세션 상태에 보관하지 않고 매 실행마다 캐시에서 다시 가져옴 (유휴 정리로 캐시에서 빠져도 새 클라이언트 사용)
+lookup_started = time.perf_counter()
+client = get_client(api_key)
+lookup_ms = (time.perf_counter() - lookup_started) * 1000
+
+with st.sidebar.expander("🔌 Gemini Client"):
+    # 캐시 조회(없으면 생성) 시간만 잼 — 연결 수립 비용은 stats의 first_ttft_ms / warm_ttft_avg_ms 차이
+    st.caption(f"이번 실행 클라이언트 조회: {lookup_ms:.2f} ms")
+    st.json(get_client_cache().stats())
+st.session_state.history_manager.summarizer = make_gemini_summarizer(client)
+if st.session_state.prefix_cache is not None:
+    st.session_state.prefix_cache.client = client
+usage_panel = st.sidebar.container()
 
 # =============================================================================
 # UI 렌더링
@@ -125,28 +327,56 @@ if user_input:
         reset_conversation()
         st.rerun()
 
-    # 사용자 메시지 추가
-    st.session_state.history.append(
-        types.Content(role="user", parts=[types.Part(text=user_input)])
-    )
+    # 사용자 메시지 추가 (저장소에는 토큰 예산 확인을 통과한 뒤에 기록)
+    st.session_state.history.add("user", user_input)
 
     with st.chat_message("user"):
         st.markdown(user_input)
 
-    # AI 응답 생성
-    config = create_config(system_instruction, temperature, thinking_off)
-
-    with st.chat_message("assistant"):
-        with st.spinner("생각 중..."):
-            response = client.models.generate_content(
-                model=MODEL_NAME,
-                contents=st.session_state.history,
-                config=config,
-            )
-            assistant_text = response.text or "(빈 응답)"
-            st.markdown(assistant_text)
-
-    # AI 응답 추가
-    st.session_state.history.append(
-        types.Content(role="model", parts=[types.Part(text=assistant_text)])
-    )
\ No newline at end of file
+    # AI 응답 생성 (토큰 예산 안의 최근 턴 + 이전 대화 요약만 전송)
+    contents, effective_instruction = st.session_state.history_manager.prepare(
+        st.session_state.history, system_instruction
+    )
+    release_folded_messages()
+    config = create_config(effective_instruction, temperature, thinking_off)
+    try:
+        # 세션 토큰 예산 안으로 (CHAT_BUDGET_POLICY: 오래된 턴을 빼고 출력 길이 제한 / 거절)
+        contents = get_usage_ledger().enforce(st.session_state.session_id, contents, config)
+    except SessionBudgetExceeded as e:
+        # 거절 안내는 화면에만 표시 (모델 답변으로 저장하면 다음 요청에 assistant 턴으로 들어감)
+        # 보내지 못한 사용자 메시지도 히스토리에서 제외
+        st.session_state.history.pop()
+        st.warning(f"⚠️ 이 대화의 토큰 예산을 모두 사용해서 답변하지 않았습니다. ({e})")
+        render_usage_panel(usage_panel)
+        st.stop()
+    save_last_message()
+    if st.session_state.prefix_cache is not None:
+        # 캐시된 앞부분은 cached_content로 보내고 나머지만 전송 (캐시 갱신은 백그라운드)
+        contents = st.session_state.prefix_cache.apply(contents, config)
+
+    # 스트리밍 중 새 메시지를 보내거나 Reset을 누르면 Streamlit이 이 실행을 중단시킴
+    # → finally에서 받은 데이터까지만 히스토리에 남기고 스트림을 닫음
+    metrics = {}
+    chunks = []
+    completed = False
+    reply = stream_reply(client, contents, config, metrics)
+    try:
+        with st.chat_message("assistant"):
+            def collect():
+                for text in reply:
+                    chunks.append(text)
+                    yield text
+
+            st.write_stream(collect())
+            completed = True
+    finally:
+        reply.close()
+        assistant_text = "".join(chunks) or "(빈 응답)"
+        if not completed:
+            assistant_text += " …(중단됨)"
+
+        # AI 응답 추가
+        append_message("model", assistant_text)
+        record_turn_metrics(metrics, "".join(chunks), cancelled=not completed)
+
+render_usage_panel(usage_panel)
@@ -5,7 +5,7 @@ Step 5-2-5: 대화 맥락 연결
 """
 
 import os
-import logging
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 from langchain_core.chat_history import InMemoryChatMessageHistory
@@ -13,13 +13,18 @@ from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.messages import HumanMessage
 from langchain_google_genai import ChatGoogleGenerativeAI
 
-# Rate Limit 재시도 경고 메시지 숨기기 (실제 에러는 여전히 표시됨)
-logging.getLogger("langchain_google_genai").setLevel(logging.ERROR)
-
 # 환경 설정
 project_root = Path(__file__).parent.parent
 load_dotenv(project_root / ".env")
 
+# 공용 속도 제한기: RPM/TPM 한도 안에서 호출하고, 넘치면 대기열에서 기다림
+sys.path.append(str(project_root))
+from common.rate_limiter import get_limiter, LimiterCallbackHandler
+from common.usage_ledger import get_usage_ledger, UsageCallbackHandler
+limiter = get_limiter()
+# 사용량 장부: 세션(session_id)별 입력 / 출력 토큰과 지연시간 기록, 세션 예산을 넘으면 호출 거절
+ledger = get_usage_ledger()
+
 api_key = os.getenv("GEMINI_API_KEY")
 if not api_key:
     print("❌ GEMINI_API_KEY를 찾을 수 없습니다.")
@@ -30,8 +35,10 @@ model = ChatGoogleGenerativeAI(
     model=os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite"),
     temperature=0.7,
     google_api_key=api_key,
-    max_retries=5,  # 재시도 횟수 증가
+    max_retries=2,  # 429 대응은 제한기가 담당하므로 재시도는 최소한으로
     request_timeout=60,  # 타임아웃 증가
+    # 예산 검사를 먼저: 시작 콜백에서 거절되면 on_llm_error가 오지 않아 먼저 받은 제한기 슬롯이 반환되지 않음
+    callbacks=[UsageCallbackHandler(ledger), LimiterCallbackHandler(limiter)],
     model_kwargs={
         "system_instruction": (
             "너는 사용자를 도와주는 상담사야. 공감적으로 답하고, "
@@ -60,7 +67,8 @@ print()
 print("📌 5-1. 세션 abc2 재현")
 print("-" * 70)
 
-config = {"configurable": {"session_id": "abc2"}}
+# metadata의 session_id는 사용량 장부가 세션별로 기록할 때 사용
+config = {"configurable": {"session_id": "abc2"}, "metadata": {"session_id": "abc2"}}
 
 # 이전 대화 재현
 with_message_history.invoke([HumanMessage(content="안녕? 난 김철수이야.")], config)
@@ -120,3 +128,7 @@ for i, message in enumerate(store['abc2'].messages, 1):
     content = message.content[:80] + "..." if len(message.content) > 80 else message.content
     print(f"{i}. {speaker}: {content}")
 print()
+
+print(f"🚦 제한기 상태: {limiter.stats()}")
+print(f"📊 세션 abc2 사용량: {ledger.session_stats('abc2')}")
+print()
@@ -0,0 +1,320 @@
+"""
+RAG FAQ 파이프라인 오프라인 벤치마크
+
+실제 Gemini API 없이 finish.py의 파이프라인 전체 성능을 측정합니다.
+
+1. 한국어 FAQ 합성 PDF 생성 (페이지 수 지정 가능)
+2. 적재(ingestion): pdf_to_documents → chunk_documents → 임베딩 + FAISS 인덱싱
+3. 질의 재생: 로컬 가짜 Gemini 서버를 상대로 process_question 반복 호출
+4. 결과: 적재 pages/s, 단계별 질의 지연 p50/p95/p99, 최대 메모리(RSS)를 JSON으로 저장
+
+사용법:
+    python 012.rag-faq/benchmark.py --pages 50 --queries 30 --latency 0.3
+    python 012.rag-faq/benchmark.py --embedding bigram        # 오프라인 2-gram 임베딩 (라우팅 점수 확인용)
+    python 012.rag-faq/benchmark.py --embedding real          # EMBEDDING_MODEL 사용
+    python 012.rag-faq/benchmark.py --compare old.json new.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+try:
+    import resource  # 유닉스 계열에서만 사용 가능
+except ImportError:
+    resource = None
+
+BASE_DIR = Path(__file__).parent
+sys.path.append(str(BASE_DIR))
+sys.path.append(str(BASE_DIR.parent))
+
+from common.fake_gemini_server import FakeGeminiConfig, start_fake_server
+
+TOPICS = ["청약 1순위", "무주택 세대주", "특별공급", "가점제", "추첨제", "청약통장", "소득 기준", "재당첨 제한",
+          "신혼부부 특별공급", "생애최초 특별공급", "전매 제한", "거주의무기간"]
+ASPECTS = ["자격 요건", "신청 방법", "제출 서류", "적용 기준", "예외 사항", "유의 사항"]
+ENTRIES_PER_PAGE = 6
+
+
+############################### 합성 데이터 생성 ##########################
+
+def make_synthetic_faq_pdf(pdf_path: str, pages: int, seed: int = 0) -> List[str]:
+    """한국어 FAQ 형식의 PDF를 만들고, 질의 재생에 쓸 질문 목록 반환"""
+    import fitz  # PyMuPDF
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    questions = []
+    for page_num in range(pages):
+        page = doc.new_page()
+        lines = [f"주택청약 FAQ ({page_num + 1}쪽)", ""]
+        for i in range(ENTRIES_PER_PAGE):
+            topic, aspect = rng.choice(TOPICS), rng.choice(ASPECTS)
+            number = page_num * ENTRIES_PER_PAGE + i + 1
+            question = f"{topic}의 {aspect}은 어떻게 되나요?"
+            questions.append(question)
+            lines.append(f"Q{number}. {question}")
+            lines.append(
+                f"A. {topic}의 {aspect}은 모집 공고일 기준으로 판단합니다. "
+                f"세대 구성원 전원이 무주택이어야 하며, 청약통장 가입 후 {rng.randint(6, 24)}개월이 "
+                f"지나고 납입 횟수가 {rng.randint(6, 24)}회 이상이어야 합니다. "
+                f"자세한 내용은 사업 주체의 입주자 모집 공고를 확인하세요."
+            )
+            lines.append("")
+        page.insert_textbox(fitz.Rect(50, 50, 545, 800), "\n".join(lines), fontname="korea", fontsize=9)
+    doc.save(pdf_path)
+    doc.close()
+    return questions
+
+
+class BigramEmbeddings:
+    """글자 2-gram을 해시해서 만든 오프라인 임베딩 (비슷한 글이면 점수도 높아 라우팅 확인용)"""
+
+    def __init__(self, size: int = 384):
+        self.size = size
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        compact = "".join(text.split())
+        for i in range(len(compact) - 1):
+            vector[zlib.crc32(compact[i:i + 2].encode("utf-8")) % self.size] += 1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+############################### 측정 도구 ##########################
+
+class StageTimer:
+    """단계별 소요 시간 기록 (스레드 안전하지 않아도 되는 append만 사용)"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def wrap(self, stage: str, fn):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.samples[stage].append(time.perf_counter() - started)
+        return timed
+
+    def total(self, stage: str) -> float:
+        return sum(self.samples.get(stage, []))
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """p50 / p95 / p99 (밀리초)"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+    return {"count": len(ordered), "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+
+def score_percentiles(values: List[float]) -> Dict[str, float]:
+    """점수 p10 / p50 / p90 (RAG_ROUTER_DIRECT_THRESHOLD / DIRECT_MARGIN 조정용)"""
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+    return {"count": len(ordered), "p10": pick(0.10), "p50": pick(0.50), "p90": pick(0.90)}
+
+
+def peak_rss_mb() -> float:
+    """프로세스 최대 RSS (MB)"""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux는 KB, macOS는 byte 단위
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+############################### 벤치마크 실행 ##########################
+
+def run_benchmark(args) -> dict:
+    # 가짜 Gemini 서버를 띄우고 finish.py가 그쪽으로 요청하도록 설정
+    server_config = FakeGeminiConfig(args.latency, args.jitter, args.tokens_per_sec)
+    server, base_url = start_fake_server(server_config)
+    os.environ["GEMINI_API_ENDPOINT"] = base_url
+    os.environ["GEMINI_API_KEY"] = "fake-key"
+    # 벤치마크는 가짜 서버를 상대로 하므로 속도 제한기 한도를 충분히 크게
+    os.environ.setdefault("GEMINI_RPM", "1000000")
+    os.environ.setdefault("GEMINI_TPM", "1000000000")
+    os.environ.setdefault("GEMINI_MAX_CONCURRENCY", str(max(4, args.concurrency)))
+
+    import finish
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.embeddings import Embeddings
+
+    timer = StageTimer()
+
+    # 임베딩: 기본은 네트워크/모델 다운로드가 필요 없는 가짜 임베딩
+    if args.embedding == "fake":
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        inner = DeterministicFakeEmbedding(size=384)
+    elif args.embedding == "bigram":
+        inner = BigramEmbeddings()
+    else:
+        inner = finish.get_embeddings()
+
+    class TimedEmbeddings(Embeddings):
+        def embed_documents(self, texts):
+            return timer.wrap("embed", inner.embed_documents)(texts)
+
+        def embed_query(self, text):
+            return timer.wrap("embed_query", inner.embed_query)(text)
+
+    embeddings = TimedEmbeddings()
+    finish.get_embeddings = lambda: embeddings
+
+    # 질의 단계 계측: 인덱스 로드 / 검색 / 답변 생성
+    class TimedFAISS(FAISS):
+        @classmethod
+        def load_local(cls, *a, **kw):
+            return timer.wrap("load_index", super().load_local)(*a, **kw)
+
+        def similarity_search_with_relevance_scores(self, *a, **kw):
+            return timer.wrap("retrieve", super().similarity_search_with_relevance_scores)(*a, **kw)
+
+    finish.FAISS = TimedFAISS
+    finish.generate_answer = timer.wrap("generate", finish.generate_answer)
+
+    workdir = tempfile.mkdtemp(prefix="rag_bench_")
+    os.chdir(workdir)  # faiss_index 등 상대 경로 산출물을 임시 폴더에 생성
+
+    # 1) 합성 PDF
+    pdf_path = os.path.join(workdir, f"synthetic_faq_{args.pages}p.pdf")
+    questions = make_synthetic_faq_pdf(pdf_path, args.pages, args.seed)
+
+    # 2) 적재
+    started = time.perf_counter()
+    documents = timer.wrap("pdf_to_documents", finish.pdf_to_documents)(pdf_path)
+    chunks = timer.wrap("chunk_documents", finish.chunk_documents)(documents)
+    timer.wrap("save_to_vector_store", finish.save_to_vector_store)(chunks)
+    ingest_total = time.perf_counter() - started
+    rss_after_ingest = peak_rss_mb()
+
+    # 3) 질의 재생 (cached_answer의 캐시는 매번 비워 실제 파이프라인을 측정)
+    rng = random.Random(args.seed)
+    query_set = [rng.choice(questions) for _ in range(args.queries)]
+    routes = defaultdict(int)
+    signals = defaultdict(list)  # 라우터 임계값 조정용 검색 점수 분포
+
+    def run_query(question: str) -> None:
+        finish.cached_answer.clear()
+        _, _, route_info = timer.wrap("total", finish.process_question)(question, finish.current_index_version())
+        routes[route_info["route"]] += 1
+        for name in ("top_score", "margin", "faq_match"):
+            if name in route_info:
+                signals[name].append(route_info[name])
+
+    query_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(run_query, query_set))
+    query_wall = time.perf_counter() - query_started
+    server.shutdown()
+
+    return {
+        "config": {
+            "pages": args.pages, "queries": args.queries, "concurrency": args.concurrency,
+            "latency_s": args.latency, "jitter_s": args.jitter, "tokens_per_sec": args.tokens_per_sec,
+            "embedding": args.embedding, "seed": args.seed,
+        },
+        "ingestion": {
+            "pages": len(documents),
+            "chunks": len(chunks),
+            "total_s": round(ingest_total, 3),
+            "pages_per_s": round(len(documents) / ingest_total, 2) if ingest_total else 0.0,
+            "stages_s": {
+                stage: round(timer.total(stage), 3)
+                for stage in ("pdf_to_documents", "chunk_documents", "embed", "save_to_vector_store")
+            },
+        },
+        "query": {
+            "wall_s": round(query_wall, 3),
+            "qps": round(len(query_set) / query_wall, 2) if query_wall else 0.0,
+            "routes": dict(routes),
+            "router_signals": {name: score_percentiles(values) for name, values in signals.items()},
+            "fake_server_requests": server_config.requests,
+            "hedging": finish.get_hedger().stats(),
+            "stages": {
+                stage: percentiles(timer.samples[stage])
+                for stage in ("load_index", "embed_query", "retrieve", "generate", "total")
+            },
+        },
+        "memory": {"peak_rss_after_ingest_mb": rss_after_ingest, "peak_rss_mb": peak_rss_mb()},
+    }
+
+
+def compare(old_path: str, new_path: str) -> None:
+    """두 결과 파일의 주요 지표 비교 출력"""
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+
+    rows = [("ingestion pages/s", old["ingestion"]["pages_per_s"], new["ingestion"]["pages_per_s"]),
+            ("peak RSS (MB)", old["memory"]["peak_rss_mb"], new["memory"]["peak_rss_mb"])]
+    for stage, values in new["query"]["stages"].items():
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if key in values:
+                rows.append((f"{stage} {key}", old["query"]["stages"].get(stage, {}).get(key), values[key]))
+
+    print(f"{'지표':<28}{'이전':>12}{'이후':>12}{'변화':>10}")
+    for name, before, after in rows:
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "-"
+        print(f"{name:<28}{str(before):>12}{str(after):>12}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG FAQ 오프라인 벤치마크")
+    parser.add_argument("--pages", type=int, default=50, help="합성 PDF 페이지 수")
+    parser.add_argument("--queries", type=int, default=30, help="재생할 질의 수")
+    parser.add_argument("--concurrency", type=int, default=1, help="동시 질의 수")
+    parser.add_argument("--latency", type=float, default=0.3, help="가짜 서버 첫 토큰 지연(초)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="가짜 서버 지연 편차(초)")
+    parser.add_argument("--tokens-per-sec", type=float, default=80.0, help="가짜 서버 토큰 생성 속도")
+    parser.add_argument("--embedding", choices=["fake", "bigram", "real"], default="fake",
+                        help="임베딩 모델 종류 (fake는 점수가 무작위라 라우팅은 bigram / real로 확인)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="결과 JSON 경로 (기본: bench_results/rag_<시각>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="두 결과 파일 비교")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    output = Path(args.output or BASE_DIR / "bench_results" / f"rag_{time.strftime('%Y%m%d_%H%M%S')}.json").resolve()
+    result = run_benchmark(args)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    print(f"\n결과 저장: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+PDF 전체 페이지 병렬 일괄 렌더링
+
+전체 페이지를 미리 이미지로 만들어 두고 싶을 때 사용합니다.
+페이지 범위를 나누어 여러 프로세스에서 동시에 렌더링하고,
+PNG 대신 WebP / JPEG로 저장해 디스크 사용량을 줄입니다.
+결과 파일은 page_cache.PageRenderCache와 같은 경로 규칙으로 저장되므로
+뷰어가 그대로 캐시 히트로 사용합니다.
+
+사용법:
+    python 012.rag-faq/bulk_render.py 문서.pdf --format webp --quality 80 --workers 8
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from page_cache import PageRenderCache, document_id, render_page_bytes
+from page_manifest import PageManifest
+
+logger = logging.getLogger(__name__)
+
+
+def _render_range(pdf_path: str, page_numbers: List[int], out_paths: List[str], dpi: int, fmt: str,
+                  quality: int) -> List[Tuple[str, int]]:
+    """워커 프로세스: 문서를 한 번 열고 맡은 페이지 범위를 렌더링"""
+    results = []
+    with fitz.open(pdf_path) as doc:
+        for page_number, path in zip(page_numbers, out_paths):
+            if os.path.exists(path):  # 이미 캐시에 있으면 건너뜀
+                results.append((path, os.path.getsize(path)))
+                continue
+            data = render_page_bytes(doc.load_page(page_number - 1), dpi, fmt, quality)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            results.append((path, len(data)))
+    return results
+
+
+def bulk_render(
+    pdf_path: str,
+    cache: PageRenderCache,
+    dpi: int = 250,
+    fmt: str = "webp",
+    quality: int = 80,
+    workers: Optional[int] = None,
+) -> Dict[str, object]:
+    """모든 페이지를 프로세스 풀로 렌더링하고 (이미지 경로 목록, 처리 통계) 반환"""
+    with fitz.open(pdf_path) as doc:
+        page_count = len(doc)
+    doc_id = document_id(pdf_path)
+    paths = [cache.path_for(doc_id, n, dpi, fmt, quality) for n in range(1, page_count + 1)]
+
+    workers = max(1, min(workers or os.cpu_count() or 1, page_count))
+    # 워커당 여러 개의 연속 범위로 나눠서 느린 페이지가 있어도 고르게 분배
+    chunk_size = max(1, -(-page_count // (workers * 4)))
+    ranges = [list(range(start, min(start + chunk_size, page_count + 1)))
+              for start in range(1, page_count + 1, chunk_size)]
+
+    started = time.perf_counter()
+    total_bytes = 0
+    batch = set(paths)  # 이번에 만든 페이지끼리는 서로 밀어내지 않음
+    # Streamlit 서버처럼 스레드가 여러 개인 프로세스에서 fork하면 잠금 상태까지 복제되므로 spawn 사용
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [
+            pool.submit(_render_range, pdf_path, pages, [paths[n - 1] for n in pages], dpi, fmt, quality)
+            for pages in ranges
+        ]
+        for future in futures:
+            for path, size in future.result():
+                cache.register(path, size, keep=batch)
+                total_bytes += size
+    elapsed = time.perf_counter() - started
+    exceeds_cap = total_bytes > cache.max_bytes
+    if exceeds_cap:
+        logger.warning("PDF 전체 이미지(%.1fMB)가 페이지 캐시 상한(%.1fMB)보다 커서 "
+                       "다음 캐시 추가 때 오래된 페이지부터 삭제됩니다.",
+                       total_bytes / (1024 * 1024), cache.max_bytes / (1024 * 1024))
+
+    return {
+        "image_paths": paths,
+        "stats": {
+            "pages": page_count,
+            "workers": workers,
+            "format": fmt,
+            "quality": quality,
+            "dpi": dpi,
+            "elapsed_s": round(elapsed, 3),
+            "pages_per_s": round(page_count / elapsed, 2) if elapsed else 0.0,
+            "bytes_per_page": total_bytes // page_count if page_count else 0,
+            "total_mb": round(total_bytes / (1024 * 1024), 2),
+            "exceeds_cache_cap": exceeds_cap,
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PDF 전체 페이지 병렬 렌더링")
+    parser.add_argument("pdf_path")
+    parser.add_argument("--dpi", type=int, default=250)
+    parser.add_argument("--format", choices=["png", "jpg", "webp"], default="webp")
+    parser.add_argument("--quality", type=int, default=80, help="jpg / webp 품질 (1~100)")
+    parser.add_argument("--workers", type=int, default=None, help="프로세스 수 (기본: CPU 코어 수)")
+    parser.add_argument("--cache-dir", default=os.getenv("RAG_PAGE_CACHE_DIR", "PDF_이미지"))
+    args = parser.parse_args()
+
+    page_cache = PageRenderCache(
+        cache_dir=args.cache_dir,
+        max_bytes=int(os.getenv("RAG_PAGE_CACHE_MAX_MB", "500")) * 1024 * 1024,
+        quality=args.quality,
+        manifest=PageManifest(os.path.join(args.cache_dir, "manifest.jsonl")),
+    )
+    result = bulk_render(args.pdf_path, page_cache, args.dpi, args.format, args.quality, args.workers)
+    print(json.dumps(result["stats"], ensure_ascii=False, indent=2))
@@ -0,0 +1,90 @@
+"""
+검색된 작은 청크를 주변 텍스트 / 페이지 전체로 넓히기 (parent-page expansion)
+
+검색은 작은 청크로 정확하게 하고, 답변 생성에 넘길 때만
+적재할 때 저장해 둔 페이지 텍스트(page_store)에서 앞뒤 문맥을 붙입니다.
+PDF를 다시 열지 않습니다.
+
+- window: 청크 앞뒤로 window_chars 글자씩 넓힘 (같은 페이지의 겹치는 범위는 합침)
+- page: 페이지 전체 텍스트 사용 (예산을 넘으면 window → 원래 청크 순으로 줄임)
+- 같은 페이지에서 나온 청크는 한 번만 넣음
+- 전체가 token_budget(추정 토큰)을 넘지 않도록 검색 순위가 높은 페이지부터 채움
+"""
+
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents.base import Document
+
+from page_store import PageStore
+
+# 공용 모듈(common/) import를 위해 프로젝트 루트를 경로에 추가 (이 모듈만 따로 import해도 동작하도록)
+sys.path.append(str(Path(__file__).parent.parent))
+from common.rate_limiter import estimate_tokens
+
+
+def _merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _window_text(page_text: str, chunks: List[Document], window_chars: int) -> str:
+    ranges = []
+    for chunk in chunks:
+        start = chunk.metadata["start_index"]
+        ranges.append((max(0, start - window_chars), min(len(page_text), start + len(chunk.page_content) + window_chars)))
+    return "\n...\n".join(page_text[start:end].strip() for start, end in _merge_ranges(ranges))
+
+
+def expand_context(
+    docs: List[Document],
+    page_store: PageStore,
+    mode: str = "window",
+    window_chars: int = 500,
+    token_budget: int = 3000,
+) -> Tuple[List[Document], Dict[str, int]]:
+    """검색된 청크(순위 순)를 페이지 단위로 묶어 넓힌 컨텍스트와 통계 반환"""
+    if mode == "off":
+        return docs, {"pages": len(docs), "expanded": 0, "tokens": sum(estimate_tokens(d.page_content) for d in docs)}
+
+    # 같은 페이지의 청크끼리 묶음 (처음 나온 순위 유지)
+    groups: Dict[str, List[Document]] = {}
+    for doc in docs:
+        key = doc.metadata.get("page_hash") or f"{doc.metadata.get('file_path')}:{doc.metadata.get('page')}"
+        groups.setdefault(key, []).append(doc)
+
+    expanded_docs: List[Document] = []
+    used_tokens = 0
+    expanded = 0
+    for key, chunks in groups.items():
+        page_text: Optional[str] = None
+        if chunks[0].metadata.get("page_hash") and all("start_index" in c.metadata for c in chunks):
+            page_text = page_store.get_text(chunks[0].metadata["page_hash"])
+
+        # 넓힌 정도가 큰 것부터 시도해서 남은 예산에 들어가는 것을 사용
+        candidates = []
+        if page_text is not None:
+            if mode == "page":
+                candidates.append(page_text.strip())
+            candidates.append(_window_text(page_text, chunks, window_chars))
+        candidates.append("\n\n".join(c.page_content for c in chunks))
+
+        remaining = token_budget - used_tokens
+        text = next((t for t in candidates if estimate_tokens(t) <= remaining), None)
+        if text is None:
+            if expanded_docs:
+                break  # 예산 초과: 낮은 순위 페이지는 뺌
+            text = candidates[-1]  # 가장 관련 높은 페이지는 예산을 넘어도 원래 청크는 넣음
+
+        if page_text is not None and text is not candidates[-1]:
+            expanded += 1
+        used_tokens += estimate_tokens(text)
+        expanded_docs.append(Document(page_content=text, metadata=dict(chunks[0].metadata)))
+
+    return expanded_docs, {"pages": len(expanded_docs), "expanded": expanded, "tokens": used_tokens}
@@ -18,21 +18,44 @@ from langchain_community.vectorstores import FAISS
 from langchain_core.prompts import PromptTemplate
 from langchain_core.runnables import Runnable
 from langchain_core.output_parsers import StrOutputParser
-from langchain_community.document_loaders import PyMuPDFLoader
 from typing import List
 import os
-import fitz  # PyMuPDF
-import re
+import time
 from pathlib import Path
 
+from singleflight import SingleFlight, make_cache_key
+from model_router import ModelRouter, direct_answer
+from hedging import HedgedGenerator
+from page_cache import ImageBytesCache, PageRenderCache, document_id
+from page_manifest import PageManifest
+from page_regions import chunk_bbox
+from pdf_ingest import extract_pages
+from page_store import PageStore
+from bulk_render import bulk_render
+
+# 공용 모듈(common/) import를 위해 프로젝트 루트를 경로에 추가
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+from common.rate_limiter import get_limiter, estimate_tokens
+from common.client_cache import get_client
+from context_expander import expand_context
+
 # 환경변수 설정
 from dotenv import load_dotenv
 env_path = Path(__file__).parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
 # Gemini API 키 설정
-api_key = os.getenv("GEMINI_API_KEY", "")
-genai.configure(api_key=api_key)
+def configure_gemini() -> None:
+    # GEMINI_API_ENDPOINT가 있으면 해당 서버로 요청 (벤치마크용 가짜 서버 등)
+    api_key = os.getenv("GEMINI_API_KEY", "")
+    endpoint = os.getenv("GEMINI_API_ENDPOINT")
+    if endpoint:
+        genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": endpoint})
+    else:
+        genai.configure(api_key=api_key)
+
+configure_gemini()
 
 
 
@@ -48,26 +71,69 @@ def save_uploadedfile(uploadedfile: UploadedFile) -> str :
         f.write(uploadedfile.read()) 
     return file_path
 
+## 페이지 해시 → 텍스트/청크 저장소 (고쳐서 다시 올린 PDF는 바뀐 페이지만 다시 처리)
+@st.cache_resource
+def get_page_store() -> PageStore:
+    return PageStore(os.getenv("RAG_PAGE_STORE_PATH", "page_store.sqlite3"))
+
 ## 2: 저장된 PDF 파일을 Document로 변환
 def pdf_to_documents(pdf_path: str) -> List[Document]:
-    loader = PyMuPDFLoader(pdf_path)
-    documents = loader.load()
-    # metadata에 file_path 추가 (나중에 참조용)
-    for doc in documents:
-        doc.metadata['file_path'] = pdf_path
-    return documents
+    # PDF를 한 번만 읽으면서 텍스트, 단어 좌표(청크 영역 계산용, 청크로 나눈 뒤 제거),
+    # 썸네일(페이지 이미지 캐시에 저장)을 함께 만듦. metadata에 file_path, doc_id 포함
+    page_cache = get_page_cache() if os.getenv("RAG_INGEST_THUMBNAILS", "1") == "1" else None
+    return extract_pages(pdf_path, page_cache, THUMBNAIL_DPI, "jpg", get_page_store())
 
 ## 3: Document를 더 작은 document로 변환
-def chunk_documents(documents: List[Document]) -> List[Document]:
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
-    return text_splitter.split_documents(documents)
+# 검색용 청크 크기 (작게 나누고 답변 생성 때 문맥을 넓히려면 RAG_CONTEXT_EXPANSION 사용)
+CHUNK_SIZE = int(os.getenv("RAG_CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("RAG_CHUNK_OVERLAP", "150"))
 
-## 4: Document를 벡터DB로 저장
-def save_to_vector_store(documents: List[Document]) -> None:
+def chunk_documents(documents: List[Document]) -> List[Document]:
+    # add_start_index: 청크가 페이지 텍스트의 어디서 시작하는지 기록 → 단어 좌표와 연결
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP,
+                                                   add_start_index=True)
+    splitter_key = f"recursive:{CHUNK_SIZE}:{CHUNK_OVERLAP}"
+    page_store = get_page_store()
+    chunks = []
+    for doc in documents:
+        word_spans = doc.metadata.pop('word_spans', None)
+        doc.metadata.pop('reused', None)
+        page_hash = doc.metadata.get('page_hash')
+
+        # 같은 내용의 페이지를 이미 나눈 적이 있으면 저장된 청크 사용
+        stored = page_store.get_chunks(page_hash, splitter_key) if page_hash else None
+        if stored is not None:
+            chunks.extend(
+                Document(page_content=c['text'], metadata={**doc.metadata, 'start_index': c['start_index'],
+                                                           'bbox': c['bbox']})
+                for c in stored
+            )
+            continue
+
+        page_chunks = text_splitter.split_documents([doc])
+        for chunk in page_chunks:
+            if word_spans:
+                start = chunk.metadata['start_index']
+                chunk.metadata['bbox'] = chunk_bbox(word_spans, start, start + len(chunk.page_content))
+        if page_hash:
+            page_store.put_chunks(page_hash, splitter_key, [
+                {'text': c.page_content, 'start_index': c.metadata['start_index'], 'bbox': c.metadata.get('bbox')}
+                for c in page_chunks
+            ])
+        chunks.extend(page_chunks)
+    return chunks
+
+## 임베딩 모델 (로딩이 무거우므로 프로세스 전체에서 한 번만 생성)
+@st.cache_resource
+def get_embeddings() -> HuggingFaceEmbeddings:
     # 로컬 임베딩 모델 사용 (무료, Google Cloud 인증 불필요)
-    embeddings = HuggingFaceEmbeddings(
+    return HuggingFaceEmbeddings(
         model_name=os.getenv("EMBEDDING_MODEL", "BAAI/bge-m3")
     )
+
+## 4: Document를 벡터DB로 저장
+def save_to_vector_store(documents: List[Document]) -> None:
+    embeddings = get_embeddings()
     vector_store = FAISS.from_documents(documents, embedding=embeddings)
     vector_store.save_local("faiss_index")
 
@@ -76,37 +142,129 @@ def save_to_vector_store(documents: List[Document]) -> None:
 ############################### 2단계 : RAG 기능 구현과 관련된 함수들 ##########################
 
 
-## 사용자 질문에 대한 RAG 처리
-@st.cache_data
-def process_question(user_question: str):
-    # 임베딩 모델 생성 (저장할 때와 동일한 모델 사용)
-    embeddings = HuggingFaceEmbeddings(
-        model_name=os.getenv("EMBEDDING_MODEL", "BAAI/bge-m3")
+## 동일 질문 동시 요청 병합기 (프로세스 전체에서 하나만 사용)
+@st.cache_resource
+def get_single_flight() -> SingleFlight:
+    # RAG_SINGLEFLIGHT_LOCK_DIR을 지정하면 여러 프로세스 간에도 병합 (결과는 JSON으로 공유)
+    return SingleFlight(lock_dir=os.getenv("RAG_SINGLEFLIGHT_LOCK_DIR") or None,
+                        encode=encode_answer, decode=decode_answer)
+
+
+def encode_answer(result):
+    """(답변, 문서 목록, 경로 정보) → JSON으로 저장할 수 있는 값"""
+    response, docs, route_info = result
+    return [response, [{"page_content": d.page_content, "metadata": d.metadata} for d in docs], route_info]
+
+
+def decode_answer(value):
+    response, docs, route_info = value
+    return response, [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in docs], route_info
+
+
+## 신뢰도 기반 모델 라우터 (경로별 통계를 프로세스 전체에서 누적)
+@st.cache_resource
+def get_model_router() -> ModelRouter:
+    return ModelRouter(
+        fast_model=os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite"),
+        strong_model=os.getenv("GEMINI_MODEL_STRONG", "gemini-2.5-flash"),
+        direct_threshold=float(os.getenv("RAG_ROUTER_DIRECT_THRESHOLD", "0.8")),
+        escalate_threshold=float(os.getenv("RAG_ROUTER_ESCALATE_THRESHOLD", "0.5")),
+        direct_margin=float(os.getenv("RAG_ROUTER_DIRECT_MARGIN", "0.02")),
     )
 
-    # 벡터 DB 로드
-    vector_db = FAISS.load_local("faiss_index", embeddings, allow_dangerous_deserialization=True)
 
-    # 관련 문서 3개 검색
-    retriever = vector_db.as_retriever(search_kwargs={"k": 3})
-    related_docs: List[Document] = retriever.invoke(user_question)
+## 헤지 요청 호출기 (RAG_HEDGING=1일 때만 사용)
+@st.cache_resource
+def get_hedger() -> HedgedGenerator:
+    return HedgedGenerator(
+        percentile=float(os.getenv("RAG_HEDGE_PERCENTILE", "0.95")),
+        max_hedge_ratio=float(os.getenv("RAG_HEDGE_MAX_RATIO", "0.1")),
+    )
+
+
+## 벡터 DB 버전 (PDF를 새로 올려 인덱스를 다시 저장하면 바뀜)
+def current_index_version() -> str:
+    try:
+        return str(os.stat(os.path.join("faiss_index", "index.faiss")).st_mtime_ns)
+    except OSError:
+        return ""
+
+
+## 사용자 질문에 대한 RAG 처리
+def process_question(user_question: str, index_version: str = ""):
+    # 같은 질문이 동시에 들어오면 캐시 조회보다 먼저 합쳐서 한 번만 검색/답변 생성하고 결과를 공유
+    # (st.cache_data는 키마다 계산 잠금이 있어 뒤에 두면 동시 요청이 병합 전에 줄을 섬)
+    cache_key = make_cache_key(user_question, os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite"), index_version)
+    return get_single_flight().do(cache_key, cached_answer, user_question, index_version)
 
-    # Gemini로 답변 생성
-    response = generate_answer(user_question, related_docs)
 
-    return response, related_docs
+@st.cache_data
+def cached_answer(user_question: str, index_version: str = ""):
+    # index_version은 캐시 키 용도: 인덱스가 바뀌면 이전 인덱스로 만든 답변을 재사용하지 않음
+    return answer_question(user_question)
+
+
+def answer_question(user_question: str):
+    # 임베딩 모델 (저장할 때와 동일한 모델 사용)
+    embeddings = get_embeddings()
 
+    # 벡터 DB 로드
+    vector_db = FAISS.load_local("faiss_index", embeddings, allow_dangerous_deserialization=True)
 
+    # 관련 문서 k개 검색 (라우팅에 쓰도록 유사도 점수도 함께)
+    k = int(os.getenv("RAG_RETRIEVAL_K", "3"))
+    docs_with_scores = vector_db.similarity_search_with_relevance_scores(user_question, k=k)
+    related_docs: List[Document] = [doc for doc, _ in docs_with_scores]
+
+    # (선택) 답변 생성에 넘길 컨텍스트를 청크 주변 문맥/페이지 전체로 넓힘 (같은 페이지는 한 번만, 토큰 예산 안에서)
+    # 기본값 off: 검색된 청크만 보냄 (window / page로 켜면 프롬프트와 입력 토큰이 늘어남)
+    answer_docs, expansion = expand_context(
+        related_docs,
+        get_page_store(),
+        mode=os.getenv("RAG_CONTEXT_EXPANSION", "off"),
+        window_chars=int(os.getenv("RAG_EXPANSION_WINDOW_CHARS", "500")),
+        token_budget=int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "3000")),
+    )
 
-def generate_answer(question: str, context: List[Document]) -> str:
-    """Gemini API를 직접 사용해서 답변 생성"""
+    # 신뢰도에 따라 답변 경로 선택 (direct / fast / strong)
+    router = get_model_router()
+    decision = router.decide(user_question, docs_with_scores)
+
+    started = time.perf_counter()
+    response = direct_answer(user_question, related_docs) if decision.route == "direct" else None
+    if response is not None:
+        router.record("direct", "", time.perf_counter() - started)
+    else:
+        if decision.route == "direct":
+            # 1위 문서에서 Q/A 항목을 꺼내지 못하면 빠른 모델로 답변
+            decision.route, decision.model = "fast", router.fast_model
+        response, prompt = generate_answer(user_question, answer_docs, decision.model)
+        router.record(decision.route, decision.model, time.perf_counter() - started,
+                      estimate_tokens(prompt), estimate_tokens(response))
+
+        # 빠른 모델이 답을 못 찾으면 강한 모델로 한 번 더 시도
+        if decision.route == "fast" and router.should_escalate(response):
+            decision.route, decision.model = "escalated", router.strong_model
+            started = time.perf_counter()
+            response, prompt = generate_answer(user_question, answer_docs, decision.model)
+            router.record("escalated", decision.model, time.perf_counter() - started,
+                          estimate_tokens(prompt), estimate_tokens(response))
+
+    route_info = {"route": decision.route, "model": decision.model,
+                  "confidence": round(decision.confidence, 3), **decision.signals,
+                  "context": expansion}
+    return response, related_docs, route_info
+
+
+
+def generate_answer(question: str, context: List[Document], model_name: str = ""):
+    """Gemini API를 직접 사용해서 답변 생성 (답변, 프롬프트 반환)"""
     # API 키 재설정 (캐싱 문제 방지) - dotenv를 다시 로드
     from dotenv import load_dotenv
     env_path = Path(__file__).parent.parent / ".env"
     load_dotenv(dotenv_path=env_path)
 
-    api_key = os.getenv("GEMINI_API_KEY", "")
-    genai.configure(api_key=api_key)
+    configure_gemini()
 
     # 컨텍스트를 문자열로 변환
     context_text = "\n\n".join([doc.page_content for doc in context])
@@ -124,46 +282,166 @@ def generate_answer(question: str, context: List[Document]) -> str:
 응답:"""
 
     # Gemini 모델 호출
-    model = genai.GenerativeModel(os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite"))
-    response = model.generate_content(prompt)
-
-    return response.text
+    model = genai.GenerativeModel(model_name or os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite"))
+
+    if os.getenv("RAG_HEDGING", "0") == "1":
+        # 첫 토큰이 늦으면 같은 요청을 한 번 더 보내고 빠른 쪽을 사용
+        # 진 쪽은 태스크 취소로 연결을 바로 끊어야 하므로 google.genai의 비동기 스트림 사용
+        client = get_client(os.getenv("GEMINI_API_KEY", ""))
+        hedged_model = model_name or os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite")
+
+        async def start_stream():
+            limiter = get_limiter()
+            ticket = await limiter.acquire_async(estimate_tokens(prompt))
+            used, error = None, None
+            try:
+                stream = await client.aio.models.generate_content_stream(model=hedged_model, contents=prompt)
+                try:
+                    async for chunk in stream:
+                        if chunk.usage_metadata is not None:
+                            used = chunk.usage_metadata.total_token_count
+                        if chunk.text:
+                            yield chunk.text
+                finally:
+                    await stream.aclose()  # 취소되면 연결을 끊어 서버 쪽 생성도 멈춤
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                limiter.release(ticket, used, error=error)
+
+        return get_hedger().generate(start_stream), prompt
+
+    # 공용 제한기를 거쳐 호출 (RPM/TPM 초과 시 실패 대신 대기)
+    response = get_limiter().call(model.generate_content, prompt, estimated_tokens=estimate_tokens(prompt))
+
+    return response.text, prompt
 
 
 
 ############################### 3단계 : 응답결과와 문서를 함께 보도록 도와주는 함수 ##########################
+
+# 페이지 이미지 저장 포맷 (png / jpg / webp)과 jpg·webp 품질
+PAGE_IMAGE_DPI = 250
+PAGE_IMAGE_FORMAT = os.getenv("RAG_PAGE_IMAGE_FORMAT", "png")
+PAGE_IMAGE_QUALITY = int(os.getenv("RAG_PAGE_IMAGE_QUALITY", "80"))
+# 먼저 보여줄 썸네일 해상도
+THUMBNAIL_DPI = int(os.getenv("RAG_THUMBNAIL_DPI", "40"))
+# 인용 영역만 잘라서 보여줄 때의 해상도 / 여백(pt) / 형광펜 표시 여부
+REGION_DPI = int(os.getenv("RAG_REGION_DPI", "300"))
+REGION_MARGIN = float(os.getenv("RAG_REGION_MARGIN", "24"))
+REGION_HIGHLIGHT = os.getenv("RAG_REGION_HIGHLIGHT", "1") == "1"
+
+## (문서 ID, 페이지) → 이미지 경로 매니페스트 (폴더를 훑지 않고 O(1) 조회)
+@st.cache_resource
+def get_page_manifest() -> PageManifest:
+    return PageManifest(os.path.join(os.getenv("RAG_PAGE_CACHE_DIR", "PDF_이미지"), "manifest.jsonl"))
+
+## 페이지 이미지 캐시 (요청한 페이지만 렌더링하고 디스크에 보관, 만든 이미지는 매니페스트에 기록)
+@st.cache_resource
+def get_page_cache() -> PageRenderCache:
+    return PageRenderCache(
+        cache_dir=os.getenv("RAG_PAGE_CACHE_DIR", "PDF_이미지"),
+        max_bytes=int(os.getenv("RAG_PAGE_CACHE_MAX_MB", "500")) * 1024 * 1024,
+        quality=PAGE_IMAGE_QUALITY,
+        manifest=get_page_manifest(),
+    )
+
+## 이미지 바이트 메모리 캐시 (모든 세션이 같은 버퍼를 공유)
+@st.cache_resource
+def get_image_bytes_cache() -> ImageBytesCache:
+    return ImageBytesCache(max_bytes=int(os.getenv("RAG_IMAGE_MEMORY_CACHE_MB", "128")) * 1024 * 1024)
+
+## 전체 페이지를 미리 렌더링하고 싶을 때 사용 (기본 흐름은 요청 시 렌더링)
 @st.cache_data(show_spinner=False)
-def convert_pdf_to_images(pdf_path: str, dpi: int = 250) -> List[str]:
-    doc = fitz.open(pdf_path)  # 문서 열기
-    image_paths = []
-    
-    # 이미지 저장용 폴더 생성
-    output_folder = "PDF_이미지"
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-
-    for page_num in range(len(doc)):  #  각 페이지를 순회
-        page = doc.load_page(page_num)  # 페이지 로드
-
-        zoom = dpi / 72  # 72이 디폴트 DPI
-        mat = fitz.Matrix(zoom, zoom)
-        pix = page.get_pixmap(matrix=mat) # type: ignore
-
-        image_path = os.path.join(output_folder, f"page_{page_num + 1}.png")  # 페이지 이미지 저장 page_1.png, page_2.png, etc.
-        pix.save(image_path)  # PNG 형태로 저장
-        image_paths.append(image_path)  # 경로를 저장
-        
-    return image_paths
+def convert_pdf_to_images(pdf_path: str, dpi: int = PAGE_IMAGE_DPI) -> dict:
+    # 여러 프로세스로 페이지 범위를 나눠 렌더링 (이미지 경로 목록 + pages/s, bytes/page 통계)
+    return bulk_render(pdf_path, get_page_cache(), dpi, PAGE_IMAGE_FORMAT, PAGE_IMAGE_QUALITY)
 
 def display_pdf_page(image_path: str, page_number: int) -> None:
-    image_bytes = open(image_path, "rb").read()  # 파일에서 이미지 인식
-    st.image(image_bytes, caption=f"Page {page_number}", output_format="PNG", width=600)
+    image_bytes = get_image_bytes_cache().get(image_path)  # 메모리 캐시에 없을 때만 파일에서 읽음
+    st.image(image_bytes, caption=f"Page {page_number}", output_format="auto", width=600)
+
+def display_pdf_page_progressive(pdf_path: str, page_number: int, doc_id: str = "") -> None:
+    # 고해상도 이미지가 아직 없으면 작은 썸네일을 먼저 보여주고, 렌더링이 끝나면 교체
+    page_cache = get_page_cache()
+    doc_id = doc_id or document_id(pdf_path)
+    image_path = get_page_manifest().lookup(doc_id, page_number, PAGE_IMAGE_DPI, PAGE_IMAGE_FORMAT)
+    # 품질 설정이 바뀌었으면 매니페스트의 이전 이미지는 쓰지 않음 (경로에 품질이 들어 있음)
+    expected_path = page_cache.path_for(doc_id, page_number, PAGE_IMAGE_DPI, PAGE_IMAGE_FORMAT)
+    if image_path != expected_path or not os.path.exists(image_path):
+        placeholder = st.empty()
+        thumbnail_path = page_cache.get(pdf_path, page_number, THUMBNAIL_DPI, "jpg")
+        with placeholder.container():
+            display_pdf_page(thumbnail_path, page_number)
+        image_path = page_cache.get(pdf_path, page_number, PAGE_IMAGE_DPI, PAGE_IMAGE_FORMAT)
+        with placeholder.container():
+            display_pdf_page(image_path, page_number)
+    else:
+        display_pdf_page(image_path, page_number)
+
+def display_pdf_region(pdf_path: str, page_number: int, bbox: List[float]) -> None:
+    # 인용된 청크 영역만 고해상도로 잘라서 표시 (전체 페이지는 버튼으로 전환)
+    image_path = get_page_cache().get_region(pdf_path, page_number, bbox, REGION_DPI, PAGE_IMAGE_FORMAT,
+                                             REGION_MARGIN, REGION_HIGHLIGHT)
+    image_bytes = get_image_bytes_cache().get(image_path)
+    st.image(image_bytes, caption=f"Page {page_number} (인용 영역)", output_format="auto", width=600)
+    if st.button("📄 전체 페이지 보기", key=f"full_page_{pdf_path}_{page_number}"):
+        st.session_state.bbox = None
+        st.rerun(scope="fragment")
+
+def display_thumbnail_strip(cited_pages: List[tuple]) -> None:
+    # 인용된 페이지들의 썸네일 목록 (같은 렌더링 캐시 사용), 클릭하면 해당 페이지로 이동
+    if not cited_pages:
+        return
+    columns = st.columns(len(cited_pages))
+    for column, (file_path, page_number) in zip(columns, cited_pages):
+        with column:
+            thumbnail_path = get_page_cache().get(file_path, page_number, THUMBNAIL_DPI, "jpg")
+            st.image(thumbnail_path, width="stretch")
+            st.button(f"pg.{page_number}", key=f"thumb_{file_path}_{page_number}",
+                      on_click=select_page, args=(file_path, page_number))
+
+def select_page(file_path: str, page_number: int, doc_id: str = "", bbox=None) -> None:
+    # 참조/썸네일 버튼 콜백: 뷰어가 보여줄 페이지(와 인용 영역) 지정
+    st.session_state.page_number = str(page_number)
+    st.session_state.pdf_path = file_path
+    st.session_state.doc_id = doc_id
+    st.session_state.bbox = bbox
+
+@st.fragment
+def viewer_pane() -> None:
+    # 오른쪽 뷰어: 참조/썸네일 버튼을 누르면 이 부분만 다시 실행 (왼쪽 답변 영역은 그대로)
+    started = time.perf_counter()
+
+    # 참조 버튼 (PDF 페이지로 이동)
+    for idx, citation in enumerate(st.session_state.get("citations", [])):
+        file_path, page_number = citation["file_path"], citation["page_number"]
+        st.button(f"🔍 {os.path.basename(file_path)} pg.{page_number}", key=f"link_{file_path}_{page_number}_{idx}",
+                  on_click=select_page, args=(file_path, page_number, citation["doc_id"], citation["bbox"]))
+
+    # 인용된 페이지 썸네일 목록
+    display_thumbnail_strip(st.session_state.get("cited_pages", []))
+
+    page_number = st.session_state.get("page_number")
+    pdf_path = st.session_state.get("pdf_path")
+    bbox = st.session_state.get("bbox")
+
+    if page_number and pdf_path and bbox:
+        # 인용 버튼으로 왔으면 청크 영역만 렌더링
+        display_pdf_region(pdf_path, int(page_number), bbox)
+    elif page_number and pdf_path:
+        # 캐시에 없으면 이 페이지만 렌더링 (썸네일 먼저 표시)
+        display_pdf_page_progressive(pdf_path, int(page_number), st.session_state.get("doc_id", ""))
+
+    # 재실행 소요 시간 (전체 = 마지막 전체 스크립트 실행, 뷰어 = 이번 뷰어 실행)
+    viewer_ms = (time.perf_counter() - started) * 1000
+    full_ms = st.session_state.get("full_rerun_ms")
+    st.caption(f"⏱ 뷰어 {viewer_ms:.0f} ms" + (f" · 전체 {full_ms:.0f} ms" if full_ms is not None else ""))
 
 
-def natural_sort_key(s):
-    return [int(text) if text.isdigit() else text for text in re.split(r'(\d+)', s)]
-
 def main():
+    started = time.perf_counter()
     st.set_page_config("청약 FAQ 챗봇", layout="wide")
 
     left_column, right_column = st.columns([1, 1])
@@ -180,12 +458,20 @@ def main():
                 # PDF 저장 및 벡터DB 생성
                 pdf_path = save_uploadedfile(pdf_doc)
                 pdf_documents = pdf_to_documents(pdf_path)
+                reused_pages = sum(1 for doc in pdf_documents if doc.metadata.get('reused'))
                 smaller_documents = chunk_documents(pdf_documents)
                 save_to_vector_store(smaller_documents)
-
-            with st.spinner("PDF 페이지를 이미지로 변환하는 중입니다..."):
-                images = convert_pdf_to_images(pdf_path)
-                st.session_state.images = images
+            # 이전에 올린 PDF와 내용이 같은 페이지는 추출/분할을 건너뜀
+            st.caption(f"{len(pdf_documents)}페이지 중 {reused_pages}페이지 재사용, "
+                       f"{len(pdf_documents) - reused_pages}페이지 새로 처리")
+
+            # 페이지 이미지는 기본적으로 미리 만들지 않고, 참조 버튼으로 처음 열 때 렌더링
+            if os.getenv("RAG_PRERENDER", "0") == "1":
+                with st.spinner("PDF 페이지를 이미지로 변환하는 중입니다..."):
+                    rendered = convert_pdf_to_images(pdf_path)
+                stats = rendered["stats"]
+                st.caption(f"{stats['pages']}페이지 변환: {stats['pages_per_s']} pages/s, "
+                           f"페이지당 {stats['bytes_per_page'] // 1024}KB ({stats['format']})")
 
         # 질문 입력
         user_question = st.text_input(
@@ -194,36 +480,53 @@ def main():
         )
 
         if user_question:
-            response, context = process_question(user_question)
+            response, context, route_info = process_question(user_question, current_index_version())
             st.write(response)
 
-            # 관련 문서 표시
-            for idx, document in enumerate(context):
-                with st.expander("관련 문서"):
+            with st.expander("⚙️ 요청 병합 / 속도 제한 / 모델 라우팅 통계"):
+                st.json({
+                    "route": route_info,
+                    "routes": get_model_router().stats(),
+                    "singleflight": get_single_flight().stats(),
+                    "rate_limiter": get_limiter().stats(),
+                    "hedging": get_hedger().stats(),
+                    "page_cache": get_page_cache().stats(),
+                    "image_memory_cache": get_image_bytes_cache().stats(),
+                })
+
+            # 답변에 인용된 페이지 목록 (중복 제거, 순서 유지)
+            cited_pages = list(dict.fromkeys(
+                (doc.metadata.get('file_path', ''), doc.metadata.get('page', 0) + 1)
+                for doc in context if os.path.exists(doc.metadata.get('file_path', ''))
+            ))
+            st.session_state.cited_pages = cited_pages
+
+            # 답변에 인용된 페이지는 백그라운드에서 미리 렌더링
+            if os.getenv("RAG_PREFETCH_PAGES", "1") == "1":
+                for file_path in {file_path for file_path, _ in cited_pages}:
+                    get_page_cache().prefetch(file_path, [
+                        page_number for path, page_number in cited_pages if path == file_path
+                    ], PAGE_IMAGE_DPI, PAGE_IMAGE_FORMAT)
+
+            # 관련 문서 표시 (참조 버튼은 오른쪽 뷰어에 있음)
+            citations = []
+            for document in context:
+                file_path = document.metadata.get('file_path', '')
+                page_number = document.metadata.get('page', 0) + 1
+                with st.expander(f"관련 문서 ({os.path.basename(file_path)} pg.{page_number})"):
                     st.write(document.page_content)
-
-                    # 참조 버튼 (PDF 페이지로 이동)
-                    file_path = document.metadata.get('file_path', '')
-                    page_number = document.metadata.get('page', 0) + 1
-                    button_key = f"link_{file_path}_{page_number}_{idx}"
-                    reference_button = st.button(
-                        f"🔍 {os.path.basename(file_path)} pg.{page_number}",
-                        key=button_key
-                    )
-
-                    if reference_button:
-                        st.session_state.page_number = str(page_number)
-
-    # 오른쪽: PDF 페이지 이미지 표시
+                citations.append({"file_path": file_path, "page_number": page_number,
+                                  "doc_id": document.metadata.get('doc_id', ''),
+                                  "bbox": document.metadata.get('bbox')})
+            st.session_state.citations = citations
+        else:
+            st.session_state.citations = []
+
+    # 오른쪽: 참조 버튼 + PDF 페이지 이미지 표시
     with right_column:
-        page_number = st.session_state.get("page_number")
-
-        if page_number:
-            page_number = int(page_number)
-            image_folder = "PDF_이미지"
-            images = sorted(os.listdir(image_folder), key=natural_sort_key)
-            image_paths = [os.path.join(image_folder, img) for img in images]
-            display_pdf_page(image_paths[page_number - 1], page_number)
+        viewer_pane()
+
+    st.session_state.full_rerun_ms = (time.perf_counter() - started) * 1000
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,176 @@
+"""
+헤지 요청(Hedged Request)으로 꼬리 지연 줄이기
+
+대부분의 Gemini 호출은 빨리 끝나지만 가끔 아주 느린 호출이 섞여 있습니다.
+첫 토큰이 최근 지연시간의 특정 백분위(예: p95) 안에 오지 않으면
+같은 요청을 한 번 더 보내고, 먼저 첫 토큰을 보낸 쪽을 사용합니다.
+
+- 시도마다 asyncio 태스크로 스트림을 읽고, 승자가 정해지면 진 쪽 태스크를 바로 취소
+  (첫 토큰을 기다리며 막혀 있던 연결도 그 자리에서 끊기고, start_stream의 finally에서 제한기 슬롯 반환)
+- 동기 코드(Streamlit 스크립트)에서는 generate()가 헤지 전용 이벤트 루프 스레드에서 실행
+  (HTTP 클라이언트가 항상 같은 루프에서 쓰이도록 루프는 하나를 계속 사용)
+- 헤지 기준 시간은 요청마다 원 요청(첫 번째 시도)의 첫 토큰 지연으로 계산
+  (헤지에 져서 취소된 경우는 취소 시점까지의 경과 시간 = 실제 값의 하한을 기록해서
+   빠른 요청만 표본에 남아 기준 시간이 짧아지지 않도록 함)
+- 추가 요청 비율 상한(max_hedge_ratio)으로 비용 폭증 방지
+- 헤지 발동 횟수 / 헤지가 이긴 횟수를 stats()로 확인
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+# 호출할 때마다 새 스트림(텍스트 조각의 async iterator)을 시작하는 함수
+StartStream = Callable[[], AsyncIterator[str]]
+
+
+class _Attempt:
+    """스트리밍 요청 한 번의 진행 상태"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.started = time.monotonic()
+        self.first_token_at: Optional[float] = None
+        self.cancelled_at: Optional[float] = None
+        self.chunks: List[str] = []
+        self.task: Optional[asyncio.Task] = None
+
+    def ttft(self) -> Optional[float]:
+        """첫 토큰 지연 (첫 토큰 전에 취소됐으면 취소까지의 경과 시간, 실패했으면 None)"""
+        end = self.first_token_at or self.cancelled_at
+        return end - self.started if end is not None else None
+
+
+class HedgedGenerator:
+    """첫 토큰 지연을 기준으로 중복 요청을 보내는 스트리밍 호출기"""
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        max_hedge_ratio: float = 0.1,
+        min_samples: int = 20,
+        min_delay: float = 0.2,
+        window: int = 200,
+    ):
+        self.percentile = percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+
+        self._lock = threading.Lock()
+        self._ttft = deque(maxlen=window)  # 최근 첫 토큰 지연(초)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.requests = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.losers_cancelled = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """헤지를 보낼 기준 시간 (표본이 부족하면 None = 헤지 안 함)"""
+        with self._lock:
+            if len(self._ttft) < self.min_samples:
+                return None
+            ordered = sorted(self._ttft)
+            value = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+        return max(self.min_delay, value)
+
+    def _hedge_allowed(self) -> bool:
+        # 추가 요청 수가 전체 요청의 max_hedge_ratio를 넘지 않도록 (처음 1회는 허용)
+        return self.hedges_fired + 1 <= self.max_hedge_ratio * self.requests + 1
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        """헤지 전용 이벤트 루프 (처음 쓸 때 데몬 스레드에서 시작)"""
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="hedged-generator", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def generate(self, start_stream: StartStream) -> str:
+        """동기 코드용: start_stream()의 스트림을 헤지하며 끝까지 읽어 반환"""
+        return asyncio.run_coroutine_threadsafe(self.agenerate(start_stream), self._event_loop()).result()
+
+    @staticmethod
+    async def _read(attempt: _Attempt, start_stream: StartStream, first: asyncio.Future) -> None:
+        async for text in start_stream():
+            if attempt.first_token_at is None:
+                attempt.first_token_at = time.monotonic()
+                if not first.done():
+                    first.set_result(attempt)
+            attempt.chunks.append(text)
+
+    async def agenerate(self, start_stream: StartStream) -> str:
+        """start_stream()의 스트림을 헤지하며 끝까지 읽어 반환"""
+        with self._lock:
+            self.requests += 1
+        delay = self.hedge_delay()
+
+        first: asyncio.Future = asyncio.get_running_loop().create_future()  # 첫 토큰을 보낸 시도
+        attempts: List[_Attempt] = []
+
+        def launch() -> None:
+            attempt = _Attempt(len(attempts))
+            attempt.task = asyncio.ensure_future(self._read(attempt, start_stream, first))
+            attempts.append(attempt)
+
+        def pending() -> List[asyncio.Task]:
+            return [a.task for a in attempts if not a.task.done()]
+
+        try:
+            launch()
+            # 1) 기준 시간 안에 첫 토큰이 오는지 기다림
+            await asyncio.wait([first, attempts[0].task], timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+
+            # 2) 첫 토큰이 없으면 (예산이 허락할 때) 같은 요청을 한 번 더
+            if not first.done() and not attempts[0].task.done() and delay is not None:
+                with self._lock:
+                    fire = self._hedge_allowed()
+                    if fire:
+                        self.hedges_fired += 1
+                if fire:
+                    launch()
+
+            # 3) 누군가 첫 토큰을 보내거나 전부 끝날(실패할) 때까지 대기
+            while not first.done() and pending():
+                await asyncio.wait([first, *pending()], return_when=asyncio.FIRST_COMPLETED)
+            if not first.done():
+                error = attempts[-1].task.exception()
+                raise error or RuntimeError("빈 응답 스트림")
+            best = first.result()
+
+            # 4) 진 쪽은 바로 취소 (연결 종료 / 제한기 슬롯 반환) → 승자가 끝날 때까지 대기
+            losers = [a for a in attempts if a is not best and not a.task.done()]
+            for loser in losers:
+                loser.cancelled_at = time.monotonic()
+                loser.task.cancel()
+            await asyncio.gather(*(a.task for a in losers), return_exceptions=True)
+            await best.task  # 승자가 도중에 실패하면 그 예외를 그대로 전달
+        finally:
+            for task in pending():  # 호출한 쪽이 취소했거나 예외로 빠져나온 경우
+                task.cancel()
+
+        primary_ttft = attempts[0].ttft()
+        with self._lock:
+            if primary_ttft is not None:
+                self._ttft.append(primary_ttft)
+            self.losers_cancelled += len(losers)
+            if best.index > 0:
+                self.hedges_won += 1
+        return "".join(best.chunks)
+
+    def stats(self) -> Dict[str, float]:
+        """헤지 발동/승리 횟수와 현재 기준 지연"""
+        delay = self.hedge_delay()
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedges_fired": self.hedges_fired,
+                "hedges_won": self.hedges_won,
+                "losers_cancelled": self.losers_cancelled,
+                "hedge_rate": round(self.hedges_fired / self.requests, 3) if self.requests else 0.0,
+                "hedge_delay_s": round(delay, 3) if delay is not None else None,
+                "ttft_samples": len(self._ttft),
+            }
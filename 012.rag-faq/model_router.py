@@ -0,0 +1,171 @@
+"""
+신뢰도 기반 모델 라우팅 (Model Cascade)
+
+검색 결과의 점수, 1위와 2위 점수 차이(margin), 1위 문서의 FAQ 질문과의 일치도, 질문 길이를 이용해
+질문마다 답변 경로를 고릅니다.
+
+- direct : 1위 문서에 거의 같은 FAQ 질문이 있고 2위보다 확실히 높으면 LLM 없이 그 Q/A 항목으로 답변
+- fast   : 일반적인 질문은 빠르고 저렴한 모델 (GEMINI_MODEL)
+- strong : 신뢰도가 낮을 때만 더 강한 모델 (GEMINI_MODEL_STRONG)
+
+경로별 지연시간과 예상 비용을 모아두어 임계값 조정에 활용할 수 있습니다.
+"""
+
+import re
+import threading
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents.base import Document
+
+# 1M 토큰당 대략적인 가격 (USD, 입력/출력) - 비용 비교용 추정치
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gemini-1.5-pro": (1.25, 5.00),
+}
+
+# 빠른 모델이 이런 표현으로 답하면 강한 모델로 한 번 더 시도
+UNSURE_PATTERNS = ("알 수 없", "정보가 없", "모르겠", "확인할 수 없", "찾을 수 없")
+
+
+@dataclass
+class RouteDecision:
+    route: str          # "direct" | "fast" | "strong"
+    model: str          # 사용할 모델명 (direct면 빈 문자열)
+    confidence: float   # 0~1 사이 신뢰도
+    signals: Dict[str, float] = field(default_factory=dict)
+
+
+# FAQ 질문 줄 ("Q12. ...", "Q. ...", "질문: ...")
+QUESTION_LINE = re.compile(r"^(?:Q\s*\d*\s*[.:)]|질문\s*\d*\s*[.:)])")
+
+
+def _bigrams(text: str) -> set:
+    """공백을 뺀 글자 2-gram (한국어 조사가 붙어도 겹치도록 단어 대신 사용)"""
+    compact = re.sub(r"\s+", "", text.lower())
+    return {compact[i:i + 2] for i in range(len(compact) - 1)}
+
+
+def _similarity(a: str, b: str) -> float:
+    first, second = _bigrams(a), _bigrams(b)
+    union = first | second
+    return len(first & second) / len(union) if union else 0.0
+
+
+class ModelRouter:
+    """질문과 검색 결과로 답변 경로를 고르고, 경로별 통계를 기록"""
+
+    def __init__(
+        self,
+        fast_model: str,
+        strong_model: str,
+        direct_threshold: float = 0.8,
+        escalate_threshold: float = 0.5,
+        direct_margin: float = 0.02,
+    ):
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.direct_threshold = direct_threshold  # direct에 필요한 FAQ 질문 일치도 (글자 2-gram, 0~1)
+        self.escalate_threshold = escalate_threshold  # 이보다 신뢰도가 낮으면 강한 모델
+        self.direct_margin = direct_margin  # direct에 필요한 1위 - 2위 검색 점수 차이
+
+        self._lock = threading.Lock()
+        self._latencies = defaultdict(lambda: deque(maxlen=500))
+        self._counts = defaultdict(int)
+        self._cost = defaultdict(float)
+
+    def decide(self, question: str, docs_with_scores: List[Tuple[Document, float]]) -> RouteDecision:
+        """검색 점수 / 1위와 2위 점수 차이 / FAQ 질문 일치도 / 질문 길이로 신뢰도를 계산해 경로 결정
+
+        direct는 1위 문서에 사용자 질문과 거의 같은 FAQ 질문이 있고(faq_match),
+        1위가 2위보다 확실히 높을 때(margin)만 선택.
+        검색 점수의 범위는 임베딩 모델마다 달라서 direct 조건에는 쓰지 않음
+        """
+        if not docs_with_scores:
+            return RouteDecision("strong", self.strong_model, 0.0)
+
+        scores = [max(0.0, min(1.0, float(score))) for _, score in docs_with_scores]
+        top_score = scores[0]
+        margin = top_score - scores[1] if len(scores) > 1 else top_score
+        # 2위와의 차이가 direct_margin의 2배 이상이면 1.0 (1위 문서가 확실히 구분됨)
+        margin_factor = min(1.0, margin / (2 * self.direct_margin)) if self.direct_margin > 0 else 1.0
+        _, faq_match = match_faq_entry(question, docs_with_scores[0][0])
+        # 짧은 질문일수록 FAQ 한 항목으로 답하기 쉬움 (30자 이하 1.0 → 150자 이상 0.0)
+        length_factor = max(0.0, min(1.0, (150 - len(question)) / 120))
+
+        confidence = 0.4 * top_score + 0.2 * margin_factor + 0.2 * faq_match + 0.2 * length_factor
+        signals = {
+            "top_score": round(top_score, 3),
+            "margin": round(margin, 3),
+            "faq_match": round(faq_match, 3),
+            "length_factor": round(length_factor, 3),
+        }
+
+        if faq_match >= self.direct_threshold and margin >= self.direct_margin:
+            return RouteDecision("direct", "", confidence, signals)
+        if confidence >= self.escalate_threshold:
+            return RouteDecision("fast", self.fast_model, confidence, signals)
+        return RouteDecision("strong", self.strong_model, confidence, signals)
+
+    def should_escalate(self, answer: str) -> bool:
+        """빠른 모델의 답변이 '모르겠다'류이면 True"""
+        return any(pattern in answer for pattern in UNSURE_PATTERNS)
+
+    def record(self, route: str, model: str, latency: float, input_tokens: int = 0, output_tokens: int = 0) -> None:
+        """경로별 지연시간과 예상 비용 기록"""
+        input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+        cost = (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+        with self._lock:
+            self._counts[route] += 1
+            self._latencies[route].append(latency)
+            self._cost[route] += cost
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """경로별 호출 수 / 지연시간 p50, p95 / 누적 예상 비용"""
+        with self._lock:
+            result = {}
+            for route, count in self._counts.items():
+                latencies = sorted(self._latencies[route])
+                result[route] = {
+                    "count": count,
+                    "latency_p50_s": round(latencies[len(latencies) // 2], 3),
+                    "latency_p95_s": round(latencies[max(0, int(len(latencies) * 0.95) - 1)], 3),
+                    "est_cost_usd": round(self._cost[route], 6),
+                }
+            return result
+
+
+def match_faq_entry(question: str, doc: Document) -> Tuple[Optional[List[str]], float]:
+    """문서에서 사용자 질문과 가장 비슷한 FAQ 항목(질문 줄 ~ 다음 질문 줄 전)과 일치도
+
+    청크에는 여러 FAQ 항목이 섞여 있으므로 항목 단위로 비교하고, 답변 줄이 없는 항목은 제외
+    """
+    blocks: List[List[str]] = []
+    for line in doc.page_content.splitlines():
+        line = line.strip()
+        if QUESTION_LINE.match(line):
+            blocks.append([line])
+        elif line and blocks:
+            blocks[-1].append(line)
+
+    best, best_similarity = None, 0.0
+    for block in blocks:
+        similarity = _similarity(question, QUESTION_LINE.sub("", block[0]))
+        if len(block) > 1 and similarity > best_similarity:
+            best, best_similarity = block, similarity
+    return best, best_similarity
+
+
+def direct_answer(question: str, docs: List[Document], min_similarity: float = 0.3) -> Optional[str]:
+    """LLM 없이 가장 관련 높은 문서에서 질문과 가장 비슷한 Q/A 항목 하나만 답변으로 사용
+
+    Q/A 형식이 아니거나 비슷한 질문이 없으면 None (호출한 쪽에서 빠른 모델로 답변)
+    """
+    if not docs:
+        return None
+    block, similarity = match_faq_entry(question, docs[0])
+    return "\n".join(block) if block and similarity >= min_similarity else None
@@ -0,0 +1,330 @@
+"""
+PDF 페이지 이미지 지연 렌더링 + 디스크 캐시
+
+업로드 시 모든 페이지를 미리 그리는 대신, 사용자가 처음 요청한 페이지만 렌더링하고
+결과를 디스크에 저장해 둡니다.
+
+- 캐시 키: (PDF 해시, 페이지, DPI, 포맷, 품질) → PDF_이미지/<문서 ID>/page_<n>_<dpi>dpi[_q<품질>].<포맷>
+  (품질은 jpg / webp처럼 손실 압축 포맷일 때만 붙음 → 품질 설정을 바꾸면 새로 렌더링)
+- 전체 용량이 상한을 넘으면 가장 오래 쓰지 않은 파일부터 삭제 (LRU)
+- 답변에 인용된 페이지는 백그라운드에서 미리 렌더링(prefetch) 가능
+- 청크 영역만 잘라서 렌더링(get_region): 잘라낸 영역과 여백도 캐시 키에 포함
+"""
+
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Collection, Dict, Iterable, Optional, Sequence, Tuple
+
+import fitz  # PyMuPDF
+
+from page_regions import expand_clip
+from singleflight import SingleFlight
+
+STALE_TMP_S = 3600  # 이보다 오래된 임시 파일은 중단된 쓰기로 보고 삭제
+
+_hash_lock = threading.Lock()
+_hash_memo: Dict[Tuple[str, int, int], str] = {}
+
+
+def file_sha256(path: str) -> str:
+    """파일 내용 해시 (같은 파일을 매번 다시 읽지 않도록 크기/수정시각으로 메모)"""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _hash_lock:
+        if memo_key in _hash_memo:
+            return _hash_memo[memo_key]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    value = digest.hexdigest()
+
+    with _hash_lock:
+        _hash_memo[memo_key] = value
+    return value
+
+
+def document_id(pdf_path: str) -> str:
+    """PDF 내용 기반 문서 ID (다른 PDF끼리 이미지가 섞이지 않도록)"""
+    return file_sha256(pdf_path)[:16]
+
+
+_PATH_RE = re.compile(
+    r"(?P<doc_id>[0-9a-f]{16})[\\/]page_(?P<page>\d+)_(?P<dpi>\d+)dpi(?:_q\d+)?\.(?P<fmt>\w+)$"
+)
+
+LOSSY_FORMATS = ("jpg", "jpeg", "webp")  # 저장 품질(quality)에 따라 결과가 달라지는 포맷
+
+
+def _quality_tag(fmt: str, quality: int) -> str:
+    return f"_q{quality}" if fmt in LOSSY_FORMATS else ""
+
+
+def render_page_bytes(page: "fitz.Page", dpi: int, fmt: str = "png", quality: int = 80,
+                      clip: Optional["fitz.Rect"] = None) -> bytes:
+    """페이지 하나(clip을 주면 그 영역만)를 지정한 DPI/포맷의 이미지 바이트로 렌더링 (png / jpg / webp)"""
+    zoom = dpi / 72  # 72이 디폴트 DPI
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip)  # type: ignore
+    if fmt in ("jpg", "jpeg"):
+        return pix.tobytes("jpg", jpg_quality=quality)
+    if fmt == "webp":
+        # PyMuPDF는 WebP 인코딩을 지원하지 않으므로 Pillow 사용 (선택 의존성)
+        try:
+            from PIL import Image
+        except ImportError as e:
+            raise ImportError("WebP 출력에는 Pillow가 필요합니다: pip install pillow") from e
+        buffer = io.BytesIO()
+        Image.frombytes("RGB", (pix.width, pix.height), pix.samples).save(buffer, "WEBP", quality=quality)
+        return buffer.getvalue()
+    return pix.tobytes(fmt)
+
+
+class PageRenderCache:
+    """(PDF 해시, 페이지, DPI, 포맷) 단위의 디스크 이미지 캐시"""
+
+    def __init__(self, cache_dir: str = "PDF_이미지", max_bytes: int = 500 * 1024 * 1024, prefetch_workers: int = 2,
+                 quality: int = 80, manifest=None):
+        self.cache_dir = cache_dir
+        self.manifest = manifest  # page_manifest.PageManifest (선택)
+        self.max_bytes = max_bytes
+        self.quality = quality  # jpg / webp 저장 품질
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # 경로 → 파일 크기 (앞쪽이 오래된 것)
+        self._total_bytes = 0
+        self._flight = SingleFlight()  # 같은 페이지를 동시에 두 번 렌더링하지 않도록
+        self._prefetcher = ThreadPoolExecutor(max_workers=prefetch_workers, thread_name_prefix="page-prefetch")
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load_index()
+
+    def _load_index(self) -> None:
+        """기존 캐시 파일을 수정 시각 순으로 읽어 LRU 순서를 복원 (프로세스 시작 시 한 번)
+
+        쓰다가 중단된 임시 파일(*.tmp)은 캐시 항목이 아니므로 제외하고, 오래된 것은 삭제
+        (최근 것은 다른 프로세스가 아직 쓰는 중일 수 있으므로 남김)
+        """
+        found = []
+        now = time.time()
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.startswith("page_"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                    if name.endswith(".tmp"):
+                        if now - stat.st_mtime > STALE_TMP_S:
+                            os.remove(path)
+                        continue
+                except OSError:  # 다른 프로세스가 교체 / 삭제한 경우
+                    continue
+                found.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(found):
+            self._entries[path] = size
+            self._total_bytes += size
+
+    def path_for(self, doc_id: str, page_number: int, dpi: int, fmt: str, quality: Optional[int] = None) -> str:
+        """페이지 이미지 경로 (quality를 안 주면 이 캐시의 저장 품질)"""
+        tag = _quality_tag(fmt, self.quality if quality is None else quality)
+        return os.path.join(self.cache_dir, doc_id, f"page_{page_number}_{dpi}dpi{tag}.{fmt}")
+
+    def region_path_for(self, doc_id: str, page_number: int, bbox: Sequence[float], dpi: int, fmt: str,
+                        margin: float, highlight: bool) -> str:
+        clip = "_".join(str(int(round(v))) for v in bbox)
+        suffix = f"_m{margin:g}{_quality_tag(fmt, self.quality)}" + ("_hl" if highlight else "")
+        return os.path.join(self.cache_dir, doc_id, f"page_{page_number}_{dpi}dpi_clip_{clip}{suffix}.{fmt}")
+
+    def peek(self, pdf_path: str, page_number: int, dpi: int = 250, fmt: str = "png") -> Optional[str]:
+        """렌더링하지 않고 캐시에 있는 경우에만 경로 반환"""
+        path = self.path_for(document_id(pdf_path), page_number, dpi, fmt)
+        with self._lock:
+            return path if path in self._entries and os.path.exists(path) else None
+
+    def get(self, pdf_path: str, page_number: int, dpi: int = 250, fmt: str = "png") -> str:
+        """페이지 이미지 경로 반환 (캐시에 없으면 그 페이지만 렌더링, page_number는 1부터)"""
+        path = self.path_for(document_id(pdf_path), page_number, dpi, fmt)
+        with self._lock:
+            if path in self._entries and os.path.exists(path):
+                self.hits += 1
+                self._entries.move_to_end(path)
+                touch = True
+            else:
+                touch = False
+        if touch:
+            os.utime(path)  # 재시작 후에도 LRU 순서가 유지되도록 수정 시각 갱신
+            return path
+        return self._flight.do(path, self._render, pdf_path, page_number, dpi, fmt, path)
+
+    def get_region(self, pdf_path: str, page_number: int, bbox: Sequence[float], dpi: int = 300, fmt: str = "png",
+                   margin: float = 24, highlight: bool = False) -> str:
+        """청크 영역(bbox, PDF 좌표)에 여백을 더한 부분만 렌더링한 이미지 경로 반환"""
+        path = self.region_path_for(document_id(pdf_path), page_number, bbox, dpi, fmt, margin, highlight)
+        with self._lock:
+            if path in self._entries and os.path.exists(path):
+                self.hits += 1
+                self._entries.move_to_end(path)
+                return path
+        return self._flight.do(path, self._render_region, pdf_path, page_number, bbox, dpi, fmt, margin,
+                               highlight, path)
+
+    def _render_region(self, pdf_path: str, page_number: int, bbox: Sequence[float], dpi: int, fmt: str,
+                       margin: float, highlight: bool, path: str) -> str:
+        if os.path.exists(path):
+            self.register(path, os.path.getsize(path))
+            return path
+
+        with fitz.open(pdf_path) as doc:
+            page = doc.load_page(page_number - 1)
+            if highlight:
+                # 메모리에서만 그리는 반투명 형광펜 (원본 PDF는 저장하지 않음)
+                page.draw_rect(fitz.Rect(bbox), color=None, fill=(1, 0.9, 0), fill_opacity=0.3, overlay=True)
+            data = render_page_bytes(page, dpi, fmt, self.quality, clip=expand_clip(page, bbox, margin))
+        self.put_bytes(path, data)
+        with self._lock:
+            self.misses += 1
+        return path
+
+    def _render(self, pdf_path: str, page_number: int, dpi: int, fmt: str, path: str) -> str:
+        if os.path.exists(path):  # 다른 요청이 먼저 만들어 둔 경우
+            self.register(path, os.path.getsize(path))
+            return path
+
+        with fitz.open(pdf_path) as doc:
+            data = render_page_bytes(doc.load_page(page_number - 1), dpi, fmt, self.quality)
+        self.put_bytes(path, data)
+        with self._lock:
+            self.misses += 1
+        return path
+
+    def put_bytes(self, path: str, data: bytes) -> None:
+        """이미지 바이트를 캐시에 저장 (임시 파일에 쓴 뒤 교체)"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.register(path, len(data))
+
+    def register(self, path: str, size: int, keep: Collection[str] = ()) -> None:
+        """캐시 폴더에 직접 쓴 파일을 LRU 목록에 등록 (일괄 렌더링 등에서 사용)
+
+        keep: 삭제하지 않을 경로 (같은 일괄 렌더링에서 먼저 만든 페이지 등, 그동안은 상한을 넘을 수 있음)
+        """
+        with self._lock:
+            self._total_bytes += size - self._entries.pop(path, 0)
+            self._entries[path] = size
+            evicted = self._evict(keep)
+        self._update_manifest(path, evicted)
+
+    def _update_manifest(self, added: str, evicted) -> None:
+        """캐시 추가/삭제를 매니페스트에 반영"""
+        if self.manifest is None:
+            return
+        for path in evicted:
+            match = _PATH_RE.search(path)
+            if match:
+                self.manifest.remove(match["doc_id"], int(match["page"]), int(match["dpi"]), match["fmt"], path)
+        match = _PATH_RE.search(added)
+        if match:
+            self.manifest.record(match["doc_id"], int(match["page"]), added, int(match["dpi"]), match["fmt"])
+
+    def _evict(self, keep: Collection[str] = ()) -> list:
+        # 방금 추가한 항목(맨 뒤)과 keep은 남기고 오래된 것부터 삭제
+        if self._total_bytes <= self.max_bytes:
+            return []
+        newest = next(reversed(self._entries))
+        excess = self._total_bytes - self.max_bytes
+        evicted = []
+        for old_path, old_size in self._entries.items():
+            if excess <= 0:
+                break
+            if old_path != newest and old_path not in keep:
+                evicted.append(old_path)
+                excess -= old_size
+        for old_path in evicted:
+            self._total_bytes -= self._entries.pop(old_path)
+            self.evictions += 1
+            try:
+                os.remove(old_path)
+            except FileNotFoundError:
+                pass
+        return evicted
+
+    def prefetch(self, pdf_path: str, page_numbers: Iterable[int], dpi: int = 250, fmt: str = "png") -> None:
+        """인용된 페이지들을 백그라운드에서 미리 렌더링"""
+        for page_number in sorted(set(page_numbers)):
+            self._prefetcher.submit(self.get, pdf_path, page_number, dpi, fmt)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_mb": round(self._total_bytes / (1024 * 1024), 1),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 1),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class ImageBytesCache:
+    """렌더링된 페이지 이미지 바이트를 메모리에 보관하는 LRU 캐시 (전체 용량 상한)
+
+    Streamlit은 상호작용할 때마다 스크립트를 다시 실행하므로, 같은 이미지를 매번
+    디스크에서 읽지 않도록 프로세스 전체에서 하나의 버퍼를 모든 세션이 공유합니다.
+    """
+
+    def __init__(self, max_bytes: int = 128 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, int, int], bytes]" = OrderedDict()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, image_path: str) -> bytes:
+        """이미지 바이트 반환 (파일이 바뀌면 크기/수정시각이 달라져 새로 읽음)"""
+        stat = os.stat(image_path)
+        key = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return data
+
+        with open(image_path, "rb") as f:
+            data = f.read()
+
+        with self._lock:
+            self.misses += 1
+            if len(data) > self.max_bytes:  # 상한보다 큰 이미지는 보관하지 않음
+                return data
+            if key not in self._entries:
+                self._entries[key] = data
+                self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self._total_bytes -= len(old)
+        return data
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_mb": round(self._total_bytes / (1024 * 1024), 1),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 1),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,106 @@
+"""
+문서별 페이지 이미지 매니페스트
+
+(문서 ID, 페이지) → 이미지 경로를 기록해 두는 색인입니다.
+이미지를 만들 때 한 줄씩 추가(append-only JSONL)하고,
+조회는 메모리의 dict에서 O(1)로 처리하므로 폴더를 매번 listdir/정렬할 필요가 없습니다.
+
+- 문서 ID는 PDF 내용 해시 → 다른 PDF끼리 이미지가 덮어써지지 않음
+- 다른 프로세스(일괄 렌더링 CLI 등)가 추가한 줄은 파일 크기가 바뀌었을 때 이어서 읽음
+"""
+
+import json
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+
+class PageManifest:
+    """(문서 ID, 페이지) → {(dpi, 포맷): 이미지 경로} 색인"""
+
+    def __init__(self, manifest_path: str = os.path.join("PDF_이미지", "manifest.jsonl")):
+        self.manifest_path = manifest_path
+        os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._pages: Dict[Tuple[str, int], Dict[Tuple[int, str], str]] = {}
+        self._offset = 0  # 지금까지 읽은 파일 위치
+        self._refresh()
+
+    def _apply(self, entry: dict) -> None:
+        key = (entry["doc_id"], entry["page"])
+        variant = (entry["dpi"], entry["format"])
+        if entry.get("op") == "del":
+            variants = self._pages.get(key, {})
+            variants.pop(variant, None)
+            if not variants:
+                self._pages.pop(key, None)
+        else:
+            self._pages.setdefault(key, {})[variant] = entry["path"]
+
+    def _refresh(self) -> None:
+        """파일에 새로 추가된 줄만 읽어서 반영 (lock 안에서 호출)"""
+        try:
+            size = os.path.getsize(self.manifest_path)
+        except FileNotFoundError:
+            return
+        if size == self._offset:
+            return
+        with open(self.manifest_path, "rb") as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # 다른 프로세스가 아직 쓰는 중인 줄
+                self._apply(json.loads(line))
+                self._offset += len(line)
+
+    def _append(self, entry: dict) -> None:
+        # 한 번의 write로 한 줄을 추가 (append 모드라 여러 프로세스가 써도 줄이 섞이지 않음)
+        with open(self.manifest_path, "ab") as f:
+            f.write(json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    def record(self, doc_id: str, page_number: int, image_path: str, dpi: int, fmt: str) -> None:
+        """이미지를 만든 직후 호출"""
+        entry = {"doc_id": doc_id, "page": page_number, "dpi": dpi, "format": fmt, "path": image_path}
+        with self._lock:
+            self._refresh()
+            if self._pages.get((doc_id, page_number), {}).get((dpi, fmt)) == image_path:
+                return
+            self._append(entry)
+            self._refresh()  # 방금 쓴 줄(과 다른 프로세스가 쓴 줄)까지 반영
+
+    def remove(self, doc_id: str, page_number: int, dpi: int, fmt: str, image_path: Optional[str] = None) -> None:
+        """이미지가 삭제(캐시 제거)되었을 때 호출 (image_path를 주면 기록된 경로가 같을 때만 삭제)"""
+        entry = {"op": "del", "doc_id": doc_id, "page": page_number, "dpi": dpi, "format": fmt}
+        with self._lock:
+            self._refresh()
+            recorded = self._pages.get((doc_id, page_number), {}).get((dpi, fmt))
+            if recorded is None or (image_path is not None and recorded != image_path):
+                return  # 이미 없거나, 같은 (dpi, 포맷)의 다른 파일(예: 품질이 다른 이미지)로 바뀐 경우
+            self._append(entry)
+            self._refresh()  # 방금 쓴 줄(과 다른 프로세스가 쓴 줄)까지 반영
+
+    def lookup(self, doc_id: str, page_number: int, dpi: Optional[int] = None, fmt: Optional[str] = None) -> Optional[str]:
+        """(문서 ID, 페이지)의 이미지 경로 (dpi/포맷을 안 주면 가장 높은 해상도)"""
+        with self._lock:
+            self._refresh()
+            variants = self._pages.get((doc_id, page_number))
+            if not variants:
+                return None
+            if dpi is not None and fmt is not None:
+                return variants.get((dpi, fmt))
+            candidates = [(v_dpi, path) for (v_dpi, v_fmt), path in variants.items()
+                          if (dpi is None or v_dpi == dpi) and (fmt is None or v_fmt == fmt)]
+            return max(candidates)[1] if candidates else None
+
+    def compact(self) -> None:
+        """삭제 기록이 쌓인 매니페스트를 현재 상태만 남기도록 다시 씀"""
+        with self._lock:
+            self._refresh()
+            tmp_path = f"{self.manifest_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                for (doc_id, page_number), variants in self._pages.items():
+                    for (dpi, fmt), path in variants.items():
+                        entry = {"doc_id": doc_id, "page": page_number, "dpi": dpi, "format": fmt, "path": path}
+                        f.write(json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n")
+            os.replace(tmp_path, self.manifest_path)
+            self._offset = os.path.getsize(self.manifest_path)
@@ -0,0 +1,96 @@
+"""
+페이지 해시 기반 텍스트 / 청크 저장소 (SQLite)
+
+FAQ PDF는 조금만 고쳐서 다시 배포되는 경우가 많습니다.
+페이지마다 내용 해시를 계산해 두고, 이미 본 페이지는 저장해 둔 텍스트/단어 좌표/청크를
+그대로 다시 사용하므로 바뀐 페이지만 새로 추출하고 나눕니다.
+
+- 페이지 해시: 페이지 콘텐츠 스트림 + 페이지가 그리는 Form XObject / 이미지 스트림
+  + 크기/회전 + 사용 폰트 이름
+  (show_pdf_page나 PDF 병합 도구로 만든 페이지는 콘텐츠 스트림이 `q /fzFrm0 Do Q`뿐이라
+   XObject 내용까지 넣어야 페이지가 구분됨.
+   문서 안의 객체 번호(xref)는 다시 저장하면 바뀌므로 해시에 넣지 않음)
+- 청크는 (페이지 해시, 분할 설정) 단위로 저장 → chunk_size 등을 바꾸면 다시 나눔
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from page_regions import WordSpan
+
+
+PAGE_HASH_VERSION = b"page-hash-v2"  # 해시 계산 방식을 바꾸면 올림 (이전 방식으로 저장된 결과는 재사용하지 않음)
+
+
+def page_content_hash(page: "fitz.Page") -> str:
+    """텍스트를 추출하지 않고 계산하는 페이지 내용 해시"""
+    pdf = page.parent
+    digest = hashlib.sha256(PAGE_HASH_VERSION)
+    digest.update(page.read_contents())
+    digest.update(repr((tuple(page.rect), page.rotation)).encode())
+    # 페이지(와 중첩된 XObject)가 그리는 Form XObject — 내용 스트림과 배치 영역
+    for xref, name, _invoker, bbox in page.get_xobjects():
+        digest.update(b"\0form\0" + name.encode() + repr(tuple(bbox)).encode())
+        digest.update(pdf.xref_stream(xref) or b"")
+    # 이미지 (인코딩된 원본 스트림 그대로)
+    for image in page.get_images(full=True):
+        digest.update(b"\0image\0" + image[7].encode())
+        digest.update(pdf.xref_stream_raw(image[0]) or b"")
+    for font in page.get_fonts(full=True):
+        digest.update(b"\0font\0" + font[3].encode())  # basefont 이름
+    return digest.hexdigest()
+
+
+class PageStore:
+    """페이지 해시 → (텍스트, 단어 좌표), (페이지 해시, 분할 설정) → 청크 목록"""
+
+    def __init__(self, db_path: str = "page_store.sqlite3"):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._local = threading.local()  # sqlite 연결은 스레드마다 따로
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS pages ("
+                         "page_hash TEXT PRIMARY KEY, text TEXT NOT NULL, word_spans TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS chunks ("
+                         "page_hash TEXT NOT NULL, splitter TEXT NOT NULL, chunks TEXT NOT NULL, "
+                         "PRIMARY KEY (page_hash, splitter))")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def get_page(self, page_hash: str) -> Optional[Tuple[str, List[WordSpan]]]:
+        row = self._conn().execute("SELECT text, word_spans FROM pages WHERE page_hash = ?", (page_hash,)).fetchone()
+        if row is None:
+            return None
+        return row[0], [tuple(span) for span in json.loads(row[1])]
+
+    def get_text(self, page_hash: str) -> Optional[str]:
+        """페이지 텍스트만 조회 (답변 생성 시 문맥 확장용)"""
+        row = self._conn().execute("SELECT text FROM pages WHERE page_hash = ?", (page_hash,)).fetchone()
+        return row[0] if row else None
+
+    def put_page(self, page_hash: str, text: str, word_spans: List[WordSpan]) -> None:
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?)", (page_hash, text, json.dumps(word_spans)))
+
+    def get_chunks(self, page_hash: str, splitter: str) -> Optional[List[dict]]:
+        """저장된 청크 목록 [{'text', 'start_index', 'bbox'}, ...]"""
+        row = self._conn().execute("SELECT chunks FROM chunks WHERE page_hash = ? AND splitter = ?",
+                                   (page_hash, splitter)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_chunks(self, page_hash: str, splitter: str, chunks: List[dict]) -> None:
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?)",
+                         (page_hash, splitter, json.dumps(chunks, ensure_ascii=False)))
@@ -0,0 +1,73 @@
+"""
+PDF 한 번 읽기(single pass) 적재
+
+PyMuPDFLoader로 텍스트를 뽑고 이미지를 만들 때 다시 fitz.open 하면
+같은 페이지를 두 번 파싱하게 됩니다.
+여기서는 PDF를 한 번 열고 페이지마다 한 번씩만 불러와서
+
+- 페이지 텍스트 → Document (청크 분할용)
+- 단어 좌표 → 청크 영역 계산용 (metadata['word_spans'])
+- (선택) 썸네일 → 페이지 이미지 캐시에 바로 저장
+
+을 함께 만듭니다. 텍스트/단어는 같은 TextPage를 공유하므로 텍스트 분석도 한 번입니다.
+page_store를 주면 내용 해시가 같은 페이지는 텍스트를 다시 추출하지 않고 저장된 결과를 사용합니다.
+"""
+
+from typing import List, Optional
+
+import fitz  # PyMuPDF
+from langchain_core.documents.base import Document
+
+from page_cache import PageRenderCache, document_id, render_page_bytes
+from page_regions import extract_word_spans
+from page_store import PageStore, page_content_hash
+
+
+def _document_metadata(pdf: "fitz.Document", pdf_path: str) -> dict:
+    """PyMuPDFLoader와 같은 형식의 문서 공통 metadata"""
+    metadata = {"source": pdf_path, "file_path": pdf_path, "total_pages": len(pdf)}
+    metadata.update({k: v for k, v in pdf.metadata.items() if isinstance(v, (str, int))})
+    return metadata
+
+
+def extract_pages(
+    pdf_path: str,
+    page_cache: Optional[PageRenderCache] = None,
+    thumbnail_dpi: int = 40,
+    thumbnail_fmt: str = "jpg",
+    page_store: Optional[PageStore] = None,
+) -> List[Document]:
+    """PDF를 한 번만 읽으면서 페이지별 Document(+단어 좌표)를 만들고, page_cache가 있으면 썸네일도 저장
+
+    page_store를 주면 metadata에 page_hash와 재사용 여부(reused)가 들어갑니다.
+    """
+    doc_id = document_id(pdf_path)
+    documents = []
+    with fitz.open(pdf_path) as pdf:
+        base_metadata = _document_metadata(pdf, pdf_path)
+        for page_index in range(len(pdf)):
+            page = pdf.load_page(page_index)
+
+            metadata = {**base_metadata, "page": page_index, "doc_id": doc_id}
+            stored = None
+            if page_store is not None:
+                metadata["page_hash"] = page_content_hash(page)
+                stored = page_store.get_page(metadata["page_hash"])
+                metadata["reused"] = stored is not None
+
+            if stored is not None:
+                text, metadata["word_spans"] = stored
+            else:
+                textpage = page.get_textpage()  # 텍스트와 단어 좌표가 같은 분석 결과를 사용
+                text = page.get_text("text", textpage=textpage).rstrip()
+                metadata["word_spans"] = extract_word_spans(page, text, textpage)
+                if page_store is not None:
+                    page_store.put_page(metadata["page_hash"], text, metadata["word_spans"])
+            documents.append(Document(page_content=text, metadata=metadata))
+
+            if page_cache is not None:
+                path = page_cache.path_for(doc_id, page_index + 1, thumbnail_dpi, thumbnail_fmt)
+                if page_cache.peek(pdf_path, page_index + 1, thumbnail_dpi, thumbnail_fmt) is None:
+                    data = render_page_bytes(page, thumbnail_dpi, thumbnail_fmt, page_cache.quality)
+                    page_cache.put_bytes(path, data)
+    return documents
@@ -0,0 +1,210 @@
+"""
+동일 질문 동시 요청 병합 (Single-flight)
+
+공지가 나간 직후처럼 같은 질문이 동시에 몰릴 때,
+먼저 들어온 요청 하나만 실제로 검색 + Gemini 호출을 수행하고
+나머지 요청은 그 결과(Future)를 함께 기다리도록 합니다.
+
+- 스레드 간 병합: 같은 프로세스 안의 Streamlit 세션끼리 Future 공유
+- 프로세스 간 병합(선택): 로컬 잠금 파일(flock)로 한 프로세스만 실행하고
+  결과를 JSON 파일로 공유 (pickle은 쓰지 않음: 폴더에 쓸 수 있는 사람이 코드를 실행할 수 있게 됨)
+  잠금 폴더는 현재 사용자 소유 + 0700일 때만 사용하고, 오래된 결과 / 잠금 파일은 주기적으로 삭제
+"""
+
+import hashlib
+import json
+import logging
+import os
+import stat
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl  # 유닉스 계열에서만 사용 가능
+except ImportError:  # Windows
+    fcntl = None
+
+
+FILE_TTL = 60.0  # 결과 / 잠금 파일 보관 시간 (합류한 프로세스가 결과를 읽기에 충분한 시간)
+
+
+def _private_dir(path: str) -> bool:
+    """현재 사용자만 접근할 수 있는 폴더인지 확인 (없으면 0700으로 생성)"""
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISDIR(info.st_mode) and info.st_uid == os.getuid() and not info.st_mode & 0o077
+
+
+class SingleFlight:
+    """같은 키로 동시에 들어온 호출을 하나로 합쳐주는 클래스
+
+    프로세스 간 병합의 결과는 JSON으로 저장하므로, 결과가 JSON으로 바로 바뀌지 않으면
+    encode(결과 → JSON 값) / decode(JSON 값 → 결과)를 지정 (변환할 수 없으면 공유만 생략)
+    """
+
+    def __init__(
+        self,
+        lock_dir: Optional[str] = None,
+        encode: Callable[[Any], Any] = lambda result: result,
+        decode: Callable[[Any], Any] = lambda value: value,
+    ):
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self.encode = encode
+        self.decode = decode
+        self._last_sweep = 0.0
+        # 프로세스 간 병합은 잠금 폴더가 지정되고 fcntl을 쓸 수 있을 때만 활성화
+        self.lock_dir = lock_dir if (lock_dir and fcntl is not None) else None
+        if self.lock_dir and not _private_dir(self.lock_dir):
+            logger.warning("잠금 폴더 %s가 현재 사용자 전용(0700)이 아니라서 프로세스 간 병합을 끕니다.", self.lock_dir)
+            self.lock_dir = None
+
+        # 관측용 카운터
+        self.calls = 0            # 전체 호출 수
+        self.executed = 0         # 실제로 함수를 실행한 횟수
+        self.coalesced = 0        # 스레드 간 병합된 횟수
+        self.coalesced_process = 0  # 다른 프로세스 결과를 재사용한 횟수
+
+    def do(self, key: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """key가 같은 진행 중 호출이 있으면 그 결과를 기다리고, 없으면 fn을 실행"""
+        with self._lock:
+            self.calls += 1
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            if self.lock_dir:
+                result = self._run_across_processes(key, fn, *args, **kwargs)
+            else:
+                result = self._run(fn, *args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            self.executed += 1
+        return fn(*args, **kwargs)
+
+    def _run_across_processes(self, key: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """잠금 파일로 프로세스 간 하나만 실행하고, 결과 파일을 공유"""
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+        lock_path = os.path.join(self.lock_dir, f"{digest}.lock")
+        result_path = os.path.join(self.lock_dir, f"{digest}.result")
+        started = time.time()
+
+        lock_file = self._lock_file(lock_path)  # 다른 프로세스가 실행 중이면 여기서 대기
+        try:
+            cached = self._read_result(result_path, started)
+            if cached is not None:
+                with self._lock:
+                    self.coalesced_process += 1
+                return cached[0]
+
+            result = self._run(fn, *args, **kwargs)
+
+            # 다른 프로세스가 읽을 수 있도록 결과를 원자적으로 기록
+            tmp_path = f"{result_path}.{os.getpid()}.tmp"
+            try:
+                payload = json.dumps({"written_at": time.time(), "result": self.encode(result)}, ensure_ascii=False)
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(payload)
+                os.replace(tmp_path, result_path)
+            except (TypeError, ValueError):
+                # 결과를 JSON으로 바꿀 수 없으면 공유만 생략
+                pass
+            os.utime(lock_path)  # 정리(_sweep) 기준 시각 갱신
+            return result
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+            self._sweep()
+
+    def _lock_file(self, lock_path: str):
+        """잠금 파일을 열어 flock (기다리는 동안 _sweep이 파일을 지웠으면 새 파일로 다시 시도)"""
+        while True:
+            lock_file = open(lock_path, "a+b")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if os.fstat(lock_file.fileno()).st_ino == os.stat(lock_path).st_ino:
+                    return lock_file
+            except FileNotFoundError:
+                pass
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def _read_result(self, result_path: str, started: float):
+        """대기하는 동안 다른 프로세스가 만든 결과가 있으면 (result,) 형태로 반환"""
+        try:
+            with open(result_path, encoding="utf-8") as f:
+                payload = json.load(f)
+            written_at, value = payload["written_at"], payload["result"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        # 내가 기다리기 시작한 이후에 끝난 실행(= 내가 합류한 실행)의 결과만 재사용
+        # (그 전에 끝난 결과까지 쓰면 병합이 아니라 답변 캐시가 되어 오래된 답을 돌려줄 수 있음)
+        if written_at >= started:
+            return (self.decode(value),)
+        return None
+
+    def _sweep(self) -> None:
+        """FILE_TTL보다 오래된 결과 / 임시 파일과 쓰지 않는 잠금 파일 삭제 (FILE_TTL마다 한 번)"""
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < FILE_TTL:
+                return
+            self._last_sweep = now
+        try:
+            names = os.listdir(self.lock_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.lock_dir, name)
+            try:
+                if now - os.path.getmtime(path) < FILE_TTL:
+                    continue
+                if name.endswith(".lock"):
+                    with open(path, "a+b") as lock_file:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)  # 사용 중이면 OSError
+                        os.remove(path)
+                elif name.endswith((".result", ".tmp")):
+                    os.remove(path)
+            except OSError:
+                continue
+
+    def stats(self) -> Dict[str, int]:
+        """병합 관련 카운터 반환"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "coalesced_process": self.coalesced_process,
+                "inflight": len(self._inflight),
+            }
+
+
+def make_cache_key(question: str, *parts: str) -> str:
+    """질문의 공백/대소문자 차이를 무시한 병합용 키 생성"""
+    normalized = " ".join(question.split()).lower()
+    return "\x1f".join([normalized, *parts])
@@ -17,9 +17,11 @@ from langchain_community.vectorstores import FAISS
 from typing import List
 import os
 import fitz  # PyMuPDF
-import re
 from pathlib import Path
 
+from page_cache import ImageBytesCache, document_id
+from page_manifest import PageManifest
+
 # 환경변수 설정
 from dotenv import load_dotenv
 env_path = Path(__file__).parent.parent / ".env"
@@ -80,14 +82,22 @@ def generate_answer(question: str, context: List[Document]) -> str:
 
 ############################### 3단계: PDF 페이지 이미지 변환 및 표시 ##########################
 
+@st.cache_resource
+def get_page_manifest() -> PageManifest:
+    """(문서 ID, 페이지) → 이미지 경로 매니페스트"""
+    return PageManifest(os.path.join("PDF_이미지", "manifest.jsonl"))
+
+
 @st.cache_data(show_spinner=False)
 def convert_pdf_to_images(pdf_path: str, dpi: int = 250) -> List[str]:
     """PDF의 각 페이지를 이미지로 변환"""
     doc = fitz.open(pdf_path)
     image_paths = []
+    manifest = get_page_manifest()
 
-    # 이미지 저장용 폴더 생성
-    output_folder = "PDF_이미지"
+    # 이미지 저장용 폴더 생성 (PDF마다 별도 폴더 → 다른 PDF의 이미지를 덮어쓰지 않음)
+    doc_id = document_id(pdf_path)
+    output_folder = os.path.join("PDF_이미지", doc_id)
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
@@ -101,20 +111,22 @@ def convert_pdf_to_images(pdf_path: str, dpi: int = 250) -> List[str]:
         image_path = os.path.join(output_folder, f"page_{page_num + 1}.png")
         pix.save(image_path)
         image_paths.append(image_path)
+        manifest.record(doc_id, page_num + 1, image_path, dpi, "png")  # 만든 즉시 매니페스트에 기록
 
     return image_paths
 
+@st.cache_resource
+def get_image_bytes_cache() -> ImageBytesCache:
+    """이미지 바이트 메모리 캐시 (재실행마다 디스크에서 다시 읽지 않도록)"""
+    return ImageBytesCache()
+
+
 def display_pdf_page(image_path: str, page_number: int) -> None:
     """PDF 페이지 이미지를 표시"""
-    image_bytes = open(image_path, "rb").read()
+    image_bytes = get_image_bytes_cache().get(image_path)
     st.image(image_bytes, caption=f"Page {page_number}", output_format="PNG", width=600)
 
 
-def natural_sort_key(s):
-    """자연스러운 숫자 정렬을 위한 키 함수"""
-    return [int(text) if text.isdigit() else text for text in re.split(r'(\d+)', s)]
-
-
 ############################### Streamlit UI ##########################
 
 def main():
@@ -196,6 +208,7 @@ def main():
 
                         if reference_button:
                             st.session_state.page_number = str(page_number)
+                            st.session_state.pdf_path = file_path
 
                 st.success("""
                 ✅ **RAG FAQ 챗봇 완성!**
@@ -211,19 +224,18 @@ def main():
         st.header("📄 PDF 페이지")
 
         page_number = st.session_state.get("page_number")
+        pdf_path = st.session_state.get("pdf_path", "")
 
         if page_number:
             page_number = int(page_number)
-            image_folder = "PDF_이미지"
-            if os.path.exists(image_folder):
-                images = sorted(os.listdir(image_folder), key=natural_sort_key)
-                image_paths = [os.path.join(image_folder, img) for img in images]
-                if page_number - 1 < len(image_paths):
-                    display_pdf_page(image_paths[page_number - 1], page_number)
-                else:
-                    st.warning("해당 페이지를 찾을 수 없습니다.")
+            # 폴더를 훑어 정렬하지 않고 매니페스트에서 (문서 ID, 페이지)로 바로 조회
+            image_path = None
+            if os.path.exists(pdf_path):
+                image_path = get_page_manifest().lookup(document_id(pdf_path), page_number)
+            if image_path and os.path.exists(image_path):
+                display_pdf_page(image_path, page_number)
             else:
-                st.info("PDF 이미지가 아직 생성되지 않았습니다.")
+                st.info("PDF 이미지가 아직 생성되지 않았습니다. 먼저 '🖼️ PDF를 이미지로 변환'을 눌러주세요.")
         else:
             st.info("왼쪽에서 참조 문서의 '🔍' 버튼을 클릭하면 해당 페이지가 여기에 표시됩니다.")
 
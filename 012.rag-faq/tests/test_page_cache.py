@@ -0,0 +1,49 @@
+"""page_cache 디스크 LRU 테스트"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+import page_cache
+from page_cache import PageRenderCache
+
+
+def write(path: Path, size: int) -> str:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def test_register_keeps_current_batch(tmp_path):
+    cache = PageRenderCache(str(tmp_path / "cache"), max_bytes=250)
+    older = write(tmp_path / "cache" / "doc" / "page_9_100dpi.png", 100)
+    cache.register(older, 100)
+
+    batch = [str(tmp_path / "cache" / "doc" / f"page_{n}_100dpi.png") for n in range(1, 5)]
+    for path in batch:
+        cache.register(write(Path(path), 100), 100, keep=set(batch))
+
+    # 상한을 넘어도 이번 일괄 렌더링의 페이지는 남고, 그 전 파일만 삭제
+    assert all(os.path.exists(path) for path in batch)
+    assert not os.path.exists(older)
+    assert cache.stats()["evictions"] == 1
+
+    # 일괄 렌더링이 끝난 뒤 추가하면 다시 오래된 것부터 정리
+    cache.register(write(tmp_path / "cache" / "doc" / "page_5_100dpi.png", 100), 100)
+    assert sum(os.path.exists(path) for path in batch) == 1
+
+
+def test_load_index_skips_interrupted_writes(tmp_path):
+    cache_dir = tmp_path / "cache"
+    page = write(cache_dir / "doc" / "page_1_100dpi.png", 100)
+    fresh_tmp = write(cache_dir / "doc" / "page_2_100dpi.png.123.tmp", 50)
+    stale_tmp = write(cache_dir / "doc" / "page_3_100dpi.png.456.tmp", 50)
+    old = time.time() - page_cache.STALE_TMP_S - 1
+    os.utime(stale_tmp, (old, old))
+
+    cache = PageRenderCache(str(cache_dir))
+    assert cache.stats()["entries"] == 1 and cache._total_bytes == 100
+    assert os.path.exists(page) and os.path.exists(fresh_tmp)
+    assert not os.path.exists(stale_tmp)
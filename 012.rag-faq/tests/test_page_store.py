@@ -0,0 +1,46 @@
+"""page_store 페이지 해시 회귀 테스트 (XObject로 감싼 페이지)"""
+
+import sys
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from page_store import PageStore, page_content_hash
+from pdf_ingest import extract_pages
+
+TEXTS = ["첫 번째 페이지: 청약 1순위 조건", "두 번째 페이지: 무주택 세대주 기준"]
+
+
+def make_wrapped_pdf(path: Path, texts=TEXTS) -> None:
+    """show_pdf_page로 각 페이지를 Form XObject 하나(`q /fzFrm0 Do Q`)로 감싼 PDF"""
+    with fitz.open() as source, fitz.open() as wrapped:
+        for text in texts:
+            source.new_page().insert_text((72, 72), text, fontname="korea")
+        for index in range(len(texts)):
+            page = wrapped.new_page()
+            page.show_pdf_page(page.rect, source, index)
+        wrapped.save(str(path))
+
+
+def test_xobject_pages_hash_differently(tmp_path):
+    pdf_path = tmp_path / "wrapped.pdf"
+    make_wrapped_pdf(pdf_path)
+    with fitz.open(str(pdf_path)) as pdf:
+        assert pdf[0].read_contents() == pdf[1].read_contents()  # 콘텐츠 스트림만으로는 구분 불가
+        assert page_content_hash(pdf[0]) != page_content_hash(pdf[1])
+
+
+def test_extract_pages_does_not_reuse_other_page(tmp_path):
+    pdf_path = tmp_path / "wrapped.pdf"
+    make_wrapped_pdf(pdf_path)
+    store = PageStore(str(tmp_path / "pages.sqlite3"))
+
+    first = extract_pages(str(pdf_path), page_store=store)
+    assert [doc.metadata["reused"] for doc in first] == [False, False]
+    assert ["두 번째" in doc.page_content for doc in first] == [False, True]
+
+    # 같은 PDF를 다시 적재하면 두 페이지 모두 자기 결과를 재사용
+    second = extract_pages(str(pdf_path), page_store=store)
+    assert [doc.metadata["reused"] for doc in second] == [True, True]
+    assert [doc.page_content for doc in second] == [doc.page_content for doc in first]
@@ -0,0 +1,74 @@
+"""singleflight 병합 / 프로세스 간 공유 파일 테스트"""
+
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+import singleflight
+from singleflight import SingleFlight
+
+
+def slow(value, delay=0.3):
+    time.sleep(delay)
+    return value
+
+
+def test_concurrent_identical_calls_execute_once():
+    flight = SingleFlight()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("q", slow, "답변"))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["답변"] * 5
+    assert flight.stats()["executed"] == 1
+    assert flight.stats()["coalesced"] == 4
+
+
+def test_shared_lock_dir_must_be_private(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    os.chmod(shared, 0o777)
+    assert SingleFlight(lock_dir=str(shared)).lock_dir is None
+
+    private = tmp_path / "private"
+    assert SingleFlight(lock_dir=str(private)).lock_dir == str(private)
+    assert private.stat().st_mode & 0o777 == 0o700
+
+
+def test_joined_flight_result_is_shared_as_json(tmp_path):
+    # 같은 잠금 폴더를 쓰는 두 인스턴스 = 두 프로세스 (flock은 파일을 따로 열면 같은 프로세스에서도 막힘)
+    leader = SingleFlight(lock_dir=str(tmp_path), encode=list, decode=tuple)
+    follower = SingleFlight(lock_dir=str(tmp_path), encode=list, decode=tuple)
+    results = {}
+    first = threading.Thread(target=lambda: results.setdefault("leader", leader.do("q", slow, ("답변", 1))))
+    first.start()
+    time.sleep(0.1)
+    results["follower"] = follower.do("q", slow, ("다른 답변", 2))
+    first.join()
+
+    assert results == {"leader": ("답변", 1), "follower": ("답변", 1)}
+    assert follower.stats()["executed"] == 0 and follower.stats()["coalesced_process"] == 1
+    (result_file,) = tmp_path.glob("*.result")
+    assert json.loads(result_file.read_text(encoding="utf-8"))["result"] == ["답변", 1]
+
+    # 합류하지 않은 나중 호출은 남은 결과 파일을 재사용하지 않음
+    assert follower.do("q", slow, ("새 답변", 3), 0) == ("새 답변", 3)
+
+
+def test_sweep_removes_expired_files(tmp_path):
+    flight = SingleFlight(lock_dir=str(tmp_path))
+    old = time.time() - singleflight.FILE_TTL - 1
+    for name in ("a.lock", "a.result", "b.result.1.tmp", "c.result"):
+        (tmp_path / name).write_text("{}")
+    for name in ("a.lock", "a.result", "b.result.1.tmp"):
+        os.utime(tmp_path / name, (old, old))
+
+    flight._sweep()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["c.result"]
@@ -0,0 +1 @@
+"""여러 예제가 함께 사용하는 공용 유틸리티 모음"""
@@ -0,0 +1,100 @@
+"""
+채팅 화면 표시용 대화 기록 (메시지별 텍스트를 한 번만 평탄화)
+
+Streamlit은 재실행할 때마다 화면 전체를 다시 그리므로, 대화가 수백 턴이 되면
+매번 모든 메시지의 parts를 이어 붙이고 markdown 요소를 만드는 비용이 커집니다.
+
+- history(types.Content 목록 또는 CompactTranscript)에 새로 추가된 메시지만 텍스트로 평탄화해서 보관
+- 화면에는 최근 메시지만 개별 말풍선으로 그리고,
+  오래된 메시지는 페이지 단위로 하나의 markdown 문자열로 묶어서 보여줌
+- 꽉 찬 페이지는 내용이 바뀌지 않으므로 만들어 둔 markdown을 재사용
+- 메모리에는 최근 구간만 두고 앞쪽(offset개)은 저장소에서 필요할 때 읽을 수 있음 (loader)
+"""
+
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from common.compact_transcript import CompactTranscript
+
+# (시작, 끝) → [(역할, 텍스트), ...]  메모리에 없는 앞쪽 메시지를 읽는 함수
+Loader = Callable[[int, int], List[Tuple[str, str]]]
+
+MAX_CACHED_PAGES = 8
+
+
+def flatten_text(content) -> str:
+    """types.Content의 텍스트 parts를 하나의 문자열로"""
+    return "".join(p.text or "" for p in content.parts or [] if hasattr(p, "text"))
+
+
+class ChatTranscript:
+    """history와 나란히 유지되는 (역할, 텍스트) 목록 + 페이지별 markdown 캐시"""
+
+    def __init__(self, offset: int = 0):
+        self.roles: List[str] = []
+        self.texts: List[str] = []
+        self.offset = offset  # 메모리에 없는(저장소에만 있는) 앞쪽 메시지 수
+        self._pages: Dict[Tuple[int, int], str] = {}
+
+    def __len__(self) -> int:
+        return self.offset + len(self.texts)
+
+    def reset(self, offset: int = 0) -> None:
+        self.roles.clear()
+        self.texts.clear()
+        self.offset = offset
+        self._pages.clear()
+
+    def sync(self, history: Sequence) -> None:
+        """history(메모리에 있는 구간)에 새로 추가된 메시지만 평탄화 (history가 줄었으면 처음부터)"""
+        if len(history) < len(self.texts):
+            self.reset(self.offset)
+        if isinstance(history, CompactTranscript):  # Content를 만들지 않고 텍스트를 바로 읽음
+            rows = history.rows(len(self.texts))
+        else:
+            rows = ((content.role, flatten_text(content)) for content in history[len(self.texts):])
+        for role, text in rows:
+            self.roles.append("assistant" if role == "model" else "user")
+            self.texts.append(text)
+
+    def drop_front(self, count: int) -> None:
+        """앞쪽 count개 메시지를 메모리에서 내림 (history 앞부분을 지울 때 같이 호출)"""
+        del self.roles[:count]
+        del self.texts[:count]
+        self.offset += count
+
+    def recent(self, count: int) -> List[Tuple[str, str]]:
+        """메모리에 있는 최근 count개 메시지 (역할, 텍스트)"""
+        start = max(0, len(self.texts) - count)
+        return list(zip(self.roles[start:], self.texts[start:]))
+
+    def _messages(self, start: int, end: int, loader: Optional[Loader]) -> List[Tuple[str, str]]:
+        rows: List[Tuple[str, str]] = []
+        if start < self.offset and loader is not None:
+            rows.extend(loader(start, min(end, self.offset)))
+        if end > self.offset:
+            lo, hi = max(start, self.offset) - self.offset, end - self.offset
+            rows.extend(zip(self.roles[lo:hi], self.texts[lo:hi]))
+        return rows
+
+    def page_count(self, older: int, page_size: int) -> int:
+        """최근 메시지를 뺀 앞쪽 older개 메시지의 페이지 수"""
+        return -(-older // page_size) if older > 0 else 0
+
+    def page_markdown(self, page: int, page_size: int, older: int, loader: Optional[Loader] = None) -> str:
+        """앞쪽 older개 메시지 중 page번째(0부터) 페이지를 하나의 markdown으로 (offset 앞은 loader로 읽음)"""
+        start = page * page_size
+        end = min(start + page_size, older)
+        key = (start, page_size)
+        cached = self._pages.get(key)
+        if cached is not None and end - start == page_size:
+            return cached
+
+        icons = {"user": "🧑", "assistant": "🤖"}
+        markdown = "\n\n---\n\n".join(
+            f"{icons[role]} {text}" for role, text in self._messages(start, end, loader)
+        )
+        if end - start == page_size:  # 꽉 찬 페이지만 캐시 (마지막 페이지는 아직 늘어날 수 있음)
+            if len(self._pages) >= MAX_CACHED_PAGES:
+                self._pages.pop(next(iter(self._pages)))
+            self._pages[key] = markdown
+        return markdown
@@ -0,0 +1,154 @@
+"""
+google.genai 클라이언트 공용 캐시 (API 키별 하나, 유휴 시간이 지나면 정리)
+
+Streamlit은 상호작용할 때마다 스크립트를 처음부터 다시 실행하므로
+genai.Client(api_key=...)를 매번 만들면 연결 풀(keep-alive 연결)을 버리고
+매 요청마다 TCP/TLS 연결을 새로 맺게 됩니다.
+같은 API 키라면 프로세스 전체(여러 재실행, 여러 세션)에서 같은 클라이언트를 재사용합니다.
+
+- 캐시 키: API 키의 SHA-256 해시 (키 원문은 보관하지 않음) + 엔드포인트
+- idle_ttl초 동안 쓰이지 않은 클라이언트는 다음 조회 때 캐시에서 뺌
+  (직접 close하지 않음: 세션 상태 등에서 아직 참조 중일 수 있으므로,
+   참조가 모두 사라지면 genai.Client가 가비지 컬렉션될 때 스스로 연결을 닫음)
+- 클라이언트 생성 시간 / 재사용 횟수는 stats()로 확인
+  (생성은 소켓을 열지 않으므로, 연결 수립 비용은 record_ttft()로 기록한
+   새 클라이언트의 첫 요청 TTFT와 이후 요청 TTFT 평균의 차이로 봄)
+
+환경 변수:
+    GEMINI_CLIENT_IDLE_TTL   유휴 클라이언트 정리 기준(초) (기본값: 900)
+    GEMINI_API_ENDPOINT      API 엔드포인트 변경 (벤치마크용 가짜 서버 등)
+"""
+
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from google import genai
+from google.genai import types
+
+
+def key_fingerprint(api_key: str) -> str:
+    """API 키 대신 표시/캐시 키로 쓰는 해시"""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+def _create_client(api_key: str, endpoint: Optional[str]) -> genai.Client:
+    if endpoint:
+        return genai.Client(api_key=api_key, http_options=types.HttpOptions(base_url=endpoint))
+    return genai.Client(api_key=api_key)
+
+
+class _Entry:
+    def __init__(self, client: Any, create_s: float):
+        self.client = client
+        self.create_s = create_s
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+        self.first_ttft_s: Optional[float] = None  # 첫 요청 (TCP/TLS 연결 수립 포함)
+        self.warm_ttft_total = 0.0  # 이후 요청 (keep-alive 연결 재사용)
+        self.warm_requests = 0
+
+
+class ClientCache:
+    """(API 키 해시, 엔드포인트) → genai.Client"""
+
+    def __init__(self, idle_ttl: float = 900.0, factory: Callable[[str, Optional[str]], Any] = _create_client):
+        self.idle_ttl = idle_ttl
+        self.factory = factory
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, api_key: str, endpoint: Optional[str] = None) -> Any:
+        """캐시된 클라이언트 반환 (없으면 생성)"""
+        endpoint = endpoint if endpoint is not None else os.getenv("GEMINI_API_ENDPOINT") or None
+        key = (key_fingerprint(api_key), endpoint or "")
+        with self._lock:
+            self._evict_idle()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                started = time.perf_counter()
+                entry = _Entry(self.factory(api_key, endpoint), time.perf_counter() - started)
+                self._entries[key] = entry
+            entry.uses += 1
+            entry.last_used = time.monotonic()
+        return entry.client
+
+    def record_ttft(self, client: Any, ttft_s: float) -> None:
+        """client로 보낸 요청의 첫 토큰 시간 기록 (캐시에 없는 클라이언트면 무시)"""
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.client is client:
+                    if entry.first_ttft_s is None:
+                        entry.first_ttft_s = ttft_s
+                    else:
+                        entry.warm_ttft_total += ttft_s
+                        entry.warm_requests += 1
+                    return
+
+    def _evict_idle(self) -> None:
+        # lock 안에서 호출 (캐시의 참조만 없앰, 다른 곳에서 쓰는 중이면 그대로 동작)
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if now - entry.last_used > self.idle_ttl]
+        self.evictions += len(expired)
+        for key in expired:
+            del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "clients": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": [
+                    {
+                        "key": fingerprint,
+                        "endpoint": endpoint or "default",
+                        "create_ms": round(entry.create_s * 1000, 1),
+                        "uses": entry.uses,
+                        "idle_s": round(now - entry.last_used, 1),
+                        **_ttft_stats(entry),
+                    }
+                    for (fingerprint, endpoint), entry in self._entries.items()
+                ],
+            }
+
+
+def _ttft_stats(entry: _Entry) -> Dict[str, Any]:
+    """첫 요청 / 이후 요청 TTFT와 그 차이 (연결 수립 비용 추정)"""
+    if entry.first_ttft_s is None:
+        return {}
+    stats = {"first_ttft_ms": round(entry.first_ttft_s * 1000, 1)}
+    if entry.warm_requests:
+        warm = entry.warm_ttft_total / entry.warm_requests
+        stats["warm_ttft_avg_ms"] = round(warm * 1000, 1)
+        stats["connect_overhead_ms"] = round((entry.first_ttft_s - warm) * 1000, 1)
+    return stats
+
+
+_cache: Optional[ClientCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_client_cache() -> ClientCache:
+    """프로세스 전체에서 공유하는 클라이언트 캐시"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ClientCache(idle_ttl=float(os.getenv("GEMINI_CLIENT_IDLE_TTL", "900")))
+        return _cache
+
+
+def get_client(api_key: str) -> genai.Client:
+    """API 키에 해당하는 공유 클라이언트"""
+    return get_client_cache().get(api_key)
@@ -0,0 +1,174 @@
+"""
+메모리를 적게 쓰는 대화 기록 (역할 / 텍스트를 연속된 버퍼에 저장)
+
+history를 types.Content 목록으로 두면 메시지마다 Content + Part(pydantic 모델)와 dict, list가 생겨서
+텍스트 자체보다 몇 배 많은 메모리를 씁니다.
+CompactTranscript는 텍스트 대화만 다음 세 버퍼에 저장합니다.
+
+- roles: 메시지별 역할 1바이트 (0 = user, 1 = model)
+- ends:  메시지별 텍스트 끝 위치 (UTF-8 바이트 기준)
+- data:  모든 메시지 텍스트를 이어 붙인 UTF-8 바이트
+
+list[types.Content]처럼 쓸 수 있도록 append / len / 인덱스 / 슬라이스 / pop / del[:n]을 지원하고,
+인덱스나 슬라이스로 꺼낼 때만 그 구간의 Content를 만듭니다 (요청을 만들 때 필요한 구간만).
+to_bytes() / from_bytes()는 버퍼를 그대로 복사하므로 JSON / pickle보다 빠릅니다.
+
+텍스트가 아닌 part(이미지, 함수 호출 등)는 저장하지 않습니다.
+"""
+
+import struct
+import sys
+from array import array
+from typing import Iterable, Iterator, List, Tuple, Union
+
+from google.genai import types
+
+ROLES = ("user", "model")
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+_MAGIC = b"CTR1"
+_HEADER = struct.Struct("<4sQ")  # magic, 메시지 수
+
+
+def _flatten(content: types.Content) -> str:
+    return "".join(p.text or "" for p in content.parts or [])
+
+
+class CompactTranscript:
+    """역할 / 텍스트를 배열 버퍼에 저장하는 대화 기록 (Content는 꺼낼 때 생성)"""
+
+    __slots__ = ("_roles", "_ends", "_data")
+
+    def __init__(self, rows: Iterable[Tuple[str, str]] = ()):
+        self._roles = array("B")
+        self._ends = array("Q")
+        self._data = bytearray()
+        for role, text in rows:
+            self.add(role, text)
+
+    @classmethod
+    def from_contents(cls, contents: Iterable[types.Content]) -> "CompactTranscript":
+        transcript = cls()
+        for content in contents:
+            transcript.append(content)
+        return transcript
+
+    # -------------------------------------------------------------
+    # 추가 / 삭제
+    # -------------------------------------------------------------
+    def add(self, role: str, text: str) -> None:
+        """(역할, 텍스트)로 메시지 추가"""
+        if role not in ROLE_CODES:
+            raise ValueError(f"지원하지 않는 역할입니다: {role}")
+        self._data += text.encode("utf-8")
+        self._roles.append(ROLE_CODES[role])
+        self._ends.append(len(self._data))
+
+    def append(self, content: types.Content) -> None:
+        """list.append와 같은 모양 (Content의 텍스트만 저장)"""
+        self.add(content.role or "user", _flatten(content))
+
+    def pop(self, index: int = -1) -> types.Content:
+        """마지막 메시지를 꺼냄 (중간 삭제는 지원하지 않음)"""
+        if not self._roles:
+            raise IndexError("pop from empty transcript")
+        if index not in (-1, len(self) - 1):
+            raise IndexError("CompactTranscript.pop은 마지막 메시지만 지원합니다")
+        content = self[-1]
+        self._roles.pop()
+        self._ends.pop()
+        del self._data[self._ends[-1] if self._ends else 0:]
+        return content
+
+    def drop_front(self, count: int) -> None:
+        """앞쪽 count개 메시지 삭제 (요약으로 접힌 메시지를 메모리에서 내릴 때)"""
+        count = min(max(count, 0), len(self))
+        if not count:
+            return
+        cut = self._ends[count - 1]
+        del self._data[:cut]
+        del self._roles[:count]
+        self._ends = array("Q", (end - cut for end in self._ends[count:]))
+
+    def clear(self) -> None:
+        self._roles = array("B")
+        self._ends = array("Q")
+        self._data = bytearray()
+
+    def __delitem__(self, index: slice) -> None:
+        # del history[:n]만 지원 (앞부분 삭제)
+        if not isinstance(index, slice) or index.start not in (None, 0) or index.step not in (None, 1):
+            raise TypeError("CompactTranscript는 del history[:n] 형태만 지원합니다")
+        self.drop_front(len(range(len(self))[index]))
+
+    # -------------------------------------------------------------
+    # 조회
+    # -------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self._roles)
+
+    def _span(self, i: int) -> Tuple[int, int]:
+        return (self._ends[i - 1] if i else 0), self._ends[i]
+
+    def role(self, i: int) -> str:
+        return ROLES[self._roles[i]]
+
+    def text(self, i: int) -> str:
+        i = range(len(self))[i]
+        start, end = self._span(i)
+        return self._data[start:end].decode("utf-8")
+
+    def rows(self, start: int = 0, end: Union[int, None] = None) -> Iterator[Tuple[str, str]]:
+        """[start, end) 구간의 (역할, 텍스트) — Content를 만들지 않음"""
+        for i in range(*slice(start, end).indices(len(self))):
+            yield ROLES[self._roles[i]], self.text(i)
+
+    def _content(self, i: int) -> types.Content:
+        return types.Content(role=ROLES[self._roles[i]], parts=[types.Part(text=self.text(i))])
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[types.Content, List[types.Content]]:
+        """history[i] / history[a:b] — 그 구간의 Content만 생성"""
+        if isinstance(index, slice):
+            if index.step not in (None, 1):
+                raise ValueError("step이 있는 슬라이스는 지원하지 않습니다")
+            return [self._content(i) for i in range(*index.indices(len(self)))]
+        return self._content(range(len(self))[index])
+
+    def __iter__(self) -> Iterator[types.Content]:
+        for i in range(len(self)):
+            yield self._content(i)
+
+    def nbytes(self) -> int:
+        """버퍼 크기 (바이트)"""
+        return len(self._data) + self._roles.itemsize * len(self._roles) + self._ends.itemsize * len(self._ends)
+
+    # -------------------------------------------------------------
+    # 직렬화
+    # -------------------------------------------------------------
+    def to_bytes(self) -> bytes:
+        """헤더 + roles + ends(리틀 엔디언) + data"""
+        ends = array("Q", self._ends)
+        if sys.byteorder != "little":
+            ends.byteswap()
+        return b"".join((_HEADER.pack(_MAGIC, len(self)), self._roles.tobytes(), ends.tobytes(), self._data))
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> "CompactTranscript":
+        magic, count = _HEADER.unpack_from(payload)
+        if magic != _MAGIC:
+            raise ValueError("CompactTranscript 직렬화 데이터가 아닙니다")
+        offset = _HEADER.size
+        transcript = cls()
+        transcript._roles.frombytes(payload[offset:offset + count])
+        offset += count
+        transcript._ends.frombytes(payload[offset:offset + count * 8])
+        if sys.byteorder != "little":
+            transcript._ends.byteswap()
+        offset += count * 8
+        transcript._data = bytearray(payload[offset:])
+        if count and transcript._ends[-1] != len(transcript._data):
+            raise ValueError("CompactTranscript 직렬화 데이터가 손상되었습니다")
+        return transcript
+
+    def __repr__(self) -> str:
+        return f"CompactTranscript(messages={len(self)}, bytes={self.nbytes()})"
@@ -0,0 +1,240 @@
+"""
+로컬 가짜 Gemini 서버 (벤치마크 / 부하 테스트용)
+
+실제 API 대신 정해진 지연시간 후 더미 응답을 돌려주는 HTTP 서버입니다.
+google.genai(신규 SDK)와 google.generativeai(REST transport) 모두
+base URL만 바꾸면 그대로 사용할 수 있습니다.
+
+지원 엔드포인트:
+    POST /{version}/models/{model}:generateContent
+    POST /{version}/models/{model}:streamGenerateContent   (?alt=sse면 SSE, 아니면 JSON 배열)
+    POST /{version}/models/{model}:countTokens
+    POST /{version}/cachedContents, DELETE /{version}/cachedContents/{id}   (컨텍스트 캐시)
+
+사용법:
+    python common/fake_gemini_server.py --port 8765 --latency 0.3 --tokens-per-sec 80
+
+    # google.genai
+    client = genai.Client(api_key="fake", http_options={"base_url": "http://127.0.0.1:8765"})
+    # google.generativeai
+    genai.configure(api_key="fake", transport="rest",
+                    client_options={"api_endpoint": "http://127.0.0.1:8765"})
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+_PATH_RE = re.compile(r"^/[^/]+/models/(?P<model>[^:/]+):(?P<method>\w+)")
+_CACHE_RE = re.compile(r"^/[^/]+/(?P<name>cachedContents(?:/[^/?]+)?)")
+
+DEFAULT_REPLY = (
+    "청약 1순위는 청약통장 가입 기간과 납입 횟수 요건을 충족한 무주택 세대 구성원이 대상입니다. "
+    "지역과 주택 유형에 따라 세부 기준이 다르니 모집 공고를 함께 확인해 주세요."
+)
+
+
+class FakeGeminiConfig:
+    """가짜 서버 동작 설정"""
+
+    def __init__(self, latency: float = 0.3, jitter: float = 0.1, tokens_per_sec: float = 80.0,
+                 reply: str = DEFAULT_REPLY):
+        self.latency = latency              # 첫 토큰까지 기본 지연(초)
+        self.jitter = jitter                # 지연에 더할 무작위 편차(초)
+        self.tokens_per_sec = tokens_per_sec  # 스트리밍 시 토큰 생성 속도
+        self.reply = reply
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.caches = {}  # 캐시 이름 → 토큰 수
+
+    def first_token_delay(self) -> float:
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+
+def _count_tokens(text: str) -> int:
+    return max(1, len(text) // 2)
+
+
+def _prompt_text(body: dict) -> str:
+    texts = []
+    for content in body.get("contents", []):
+        for part in content.get("parts", []):
+            texts.append(part.get("text", ""))
+    system = body.get("systemInstruction") or body.get("system_instruction") or {}
+    for part in system.get("parts", []):
+        texts.append(part.get("text", ""))
+    return "".join(texts)
+
+
+def _response_chunk(text: str, prompt_tokens: int, output_tokens: int, finished: bool, cached_tokens: int = 0) -> dict:
+    chunk = {
+        "candidates": [{
+            "content": {"role": "model", "parts": [{"text": text}]},
+            "index": 0,
+        }],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": output_tokens,
+            "totalTokenCount": prompt_tokens + output_tokens,
+        },
+        "modelVersion": "fake-gemini",
+    }
+    if cached_tokens:
+        chunk["usageMetadata"]["cachedContentTokenCount"] = cached_tokens
+    if finished:
+        chunk["candidates"][0]["finishReason"] = "STOP"
+    return chunk
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: FakeGeminiConfig = None  # start_fake_server에서 주입
+
+    def log_message(self, format, *args):  # 요청 로그 출력 생략
+        pass
+
+    def _send_json(self, payload: dict, status: int = 200) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        match = _PATH_RE.match(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        cache_match = _CACHE_RE.match(self.path)
+        if cache_match:
+            self._create_cache(body)
+            return
+        if not match:
+            self._send_json({"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}}, 404)
+            return
+
+        config = self.config
+        with config._lock:
+            config.requests += 1
+        method = match.group("method")
+        prompt_tokens = _count_tokens(_prompt_text(body))
+        cached_tokens = 0
+        if body.get("cachedContent"):
+            cached_tokens = config.caches.get(body["cachedContent"])
+            if cached_tokens is None:
+                self._send_json({"error": {"code": 403, "message": "CachedContent not found",
+                                           "status": "PERMISSION_DENIED"}}, 403)
+                return
+            prompt_tokens += cached_tokens
+
+        if method == "countTokens":
+            self._send_json({"totalTokens": prompt_tokens})
+        elif method == "generateContent":
+            time.sleep(config.first_token_delay() + _count_tokens(config.reply) / config.tokens_per_sec)
+            self._send_json(_response_chunk(config.reply, prompt_tokens, _count_tokens(config.reply), True,
+                                            cached_tokens))
+        elif method == "streamGenerateContent":
+            self._stream(prompt_tokens, sse="alt=sse" in self.path, cached_tokens=cached_tokens)
+        else:
+            self._send_json({"error": {"code": 404, "message": method, "status": "NOT_FOUND"}}, 404)
+
+    def do_DELETE(self):
+        cache_match = _CACHE_RE.match(self.path)
+        with self.config._lock:
+            found = cache_match is not None and self.config.caches.pop(cache_match.group("name"), None) is not None
+        if found:
+            self._send_json({})
+        else:
+            self._send_json({"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}}, 404)
+
+    def _create_cache(self, body: dict) -> None:
+        """컨텍스트 캐시 생성 (내용은 보관하지 않고 토큰 수만 기록)"""
+        tokens = _count_tokens(_prompt_text(body))
+        name = f"cachedContents/{uuid.uuid4().hex[:12]}"
+        with self.config._lock:
+            self.config.requests += 1
+            self.config.caches[name] = tokens
+        now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        ttl = float(str(body.get("ttl", "3600s")).rstrip("s"))
+        self._send_json({
+            "name": name,
+            "model": body.get("model", ""),
+            "displayName": body.get("displayName", ""),
+            "createTime": now,
+            "updateTime": now,
+            "expireTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + ttl)),
+            "usageMetadata": {"totalTokenCount": tokens},
+        })
+
+    def _write_chunk(self, data: bytes) -> None:
+        """HTTP chunked 인코딩으로 한 조각 전송"""
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream(self, prompt_tokens: int, sse: bool, cached_tokens: int = 0) -> None:
+        """단어 단위 청크를 흘려보냄 (google.genai는 SSE, google.generativeai는 JSON 배열)"""
+        config = self.config
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream" if sse else "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        words = config.reply.split(" ")
+        output_tokens = 0
+        time.sleep(config.first_token_delay())
+        try:
+            if not sse:
+                self._write_chunk(b"[")
+            for i, word in enumerate(words):
+                last = i == len(words) - 1
+                text = word if last else word + " "
+                output_tokens += _count_tokens(text)
+                payload = json.dumps(_response_chunk(text, prompt_tokens, output_tokens, last, cached_tokens),
+                                     ensure_ascii=False)
+                if sse:
+                    self._write_chunk(f"data: {payload}\r\n\r\n".encode("utf-8"))
+                else:
+                    self._write_chunk((payload + ("]" if last else ",")).encode("utf-8"))
+                if not last:
+                    time.sleep(_count_tokens(text) / config.tokens_per_sec)
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 클라이언트가 스트림을 취소한 경우
+
+
+def start_fake_server(config: FakeGeminiConfig = None, host: str = "127.0.0.1", port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """백그라운드 스레드에서 서버를 띄우고 (server, base_url) 반환"""
+    config = config or FakeGeminiConfig()
+    handler = type("FakeGeminiHandler", (_Handler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="로컬 가짜 Gemini 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.3, help="첫 토큰까지 지연(초)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="지연 편차(초)")
+    parser.add_argument("--tokens-per-sec", type=float, default=80.0, help="토큰 생성 속도")
+    args = parser.parse_args()
+
+    server, url = start_fake_server(
+        FakeGeminiConfig(args.latency, args.jitter, args.tokens_per_sec), args.host, args.port
+    )
+    print(f"가짜 Gemini 서버 실행 중: {url} (Ctrl+C로 종료)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
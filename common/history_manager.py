@@ -0,0 +1,201 @@
+"""
+토큰 예산 기반 대화 히스토리 관리 (최근 N턴 + 이전 대화 요약)
+
+멀티턴 예제는 매 턴마다 history 전체를 보내므로 대화가 길어질수록
+입력 토큰 / 지연 / 비용이 계속 늘어납니다.
+HistoryManager는 요청에 보낼 내용을 일정한 크기로 유지합니다.
+
+- 최근 keep_turns 턴(user + model)은 그대로 보냄
+- 그보다 오래된 턴은 요약(rolling summary)으로 접어서 system_instruction 뒤에 붙임
+  (매 턴 요약하지 않도록 fold_batch 턴이 더 쌓였을 때 한 번에 접음)
+- 최근 턴만으로도 max_tokens를 넘으면 예산 안에 들어올 때까지 더 접음 (마지막 사용자 메시지는 유지)
+- 요약은 접을 때만 만들고, 이전 요약 + 새로 접을 턴으로 갱신
+- 원본 history는 건드리지 않음 (화면 표시용으로 그대로 사용)
+
+환경 변수:
+    CHAT_HISTORY_MAX_TOKENS   요청에 보낼 대화 내용의 추정 토큰 상한 (기본값: 4000)
+    CHAT_HISTORY_KEEP_TURNS   그대로 보낼 최근 턴 수 (기본값: 6)
+    CHAT_SUMMARY_MAX_TOKENS   요약 길이 상한 (기본값: 400)
+    CHAT_SUMMARY_MODEL        요약에 사용할 모델 (기본값: gemini-2.5-flash-lite)
+"""
+
+import logging
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from google.genai import types
+
+from common.rate_limiter import estimate_tokens, get_limiter
+
+logger = logging.getLogger(__name__)
+
+# (이전 요약, 새로 접을 메시지들, 요약 최대 토큰) → 새 요약
+Summarizer = Callable[[str, List[types.Content], int], str]
+
+SUMMARY_HEADER = "[이전 대화 요약]"
+
+
+def content_text(content: types.Content) -> str:
+    return "".join(p.text or "" for p in content.parts or [])
+
+
+def _transcript(contents: List[types.Content]) -> str:
+    lines = []
+    for content in contents:
+        speaker = "AI" if content.role == "model" else "사용자"
+        lines.append(f"{speaker}: {content_text(content)}")
+    return "\n".join(lines)
+
+
+def truncate_summarizer(previous: str, contents: List[types.Content], max_tokens: int) -> str:
+    """LLM 없이 만드는 요약 (메시지마다 앞부분만 남김, 요약 호출이 실패했을 때도 사용)"""
+    lines = [previous] if previous else []
+    for content in contents:
+        speaker = "AI" if content.role == "model" else "사용자"
+        lines.append(f"{speaker}: {content_text(content)[:80]}")
+    text = "\n".join(lines)
+    max_chars = max_tokens * 2  # estimate_tokens와 같은 비율
+    return text[-max_chars:]
+
+
+def make_gemini_summarizer(client, model: Optional[str] = None) -> Summarizer:
+    """Gemini로 이전 요약 + 새 턴을 합쳐 요약하는 함수 생성 (공용 속도 제한기 사용)"""
+    model = model or os.getenv("CHAT_SUMMARY_MODEL", "gemini-2.5-flash-lite")
+
+    def summarize(previous: str, contents: List[types.Content], max_tokens: int) -> str:
+        prompt = (
+            "다음은 상담 대화의 이전 요약과 그 뒤에 이어진 대화야.\n"
+            "둘을 합쳐서 이후 대화에 필요한 사실, 사용자의 상황과 요청, 이미 안내한 내용을 "
+            f"{max_tokens * 2}자 이내의 한국어 요약으로 정리해줘. 요약만 출력해.\n\n"
+            f"[이전 요약]\n{previous or '(없음)'}\n\n[이어진 대화]\n{_transcript(contents)}"
+        )
+        response = get_limiter().call(
+            client.models.generate_content,
+            estimated_tokens=estimate_tokens(prompt) + max_tokens,
+            model=model,
+            contents=prompt,
+            config=types.GenerateContentConfig(
+                temperature=0.2,
+                max_output_tokens=max_tokens,
+                thinking_config=types.ThinkingConfig(thinking_budget=0),
+            ),
+        )
+        return (response.text or "").strip()
+
+    return summarize
+
+
+class HistoryManager:
+    """history 전체에서 요청에 보낼 (contents, system_instruction)을 만드는 관리자"""
+
+    def __init__(
+        self,
+        summarizer: Optional[Summarizer] = None,
+        max_tokens: Optional[int] = None,
+        keep_turns: Optional[int] = None,
+        summary_max_tokens: Optional[int] = None,
+        fold_batch: Optional[int] = None,
+    ):
+        self.summarizer = summarizer or truncate_summarizer
+        self.max_tokens = max_tokens or int(os.getenv("CHAT_HISTORY_MAX_TOKENS", "4000"))
+        self.keep_turns = keep_turns or int(os.getenv("CHAT_HISTORY_KEEP_TURNS", "6"))
+        self.summary_max_tokens = summary_max_tokens or int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "400"))
+        self.fold_batch = fold_batch or max(1, self.keep_turns // 2)
+
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """대화 초기화 시 호출"""
+        self.summary = ""
+        self.folded = 0  # history 앞쪽에서 요약으로 접힌 메시지 수
+        self.folded_total = 0  # 지금까지 요약으로 접은 메시지 수 (release_folded 이후에도 유지)
+        self.folded_tokens = 0  # 접은 메시지의 추정 토큰 합 (전체 history 토큰을 매번 다시 세지 않도록)
+        self.requests = 0
+        self.summaries = 0
+        self.last_full_tokens = 0
+        self.last_sent_tokens = 0
+        self.tokens_saved = 0  # 전체 history를 보냈을 때 대비 줄인 입력 토큰 (누적)
+        self.summarizer_tokens = 0  # 요약 호출에 쓴 추정 토큰 (누적)
+
+    def release_folded(self) -> int:
+        """요약으로 접힌 메시지 수를 반환하고 위치를 0으로 (호출한 쪽이 history 앞부분을 지울 때 사용)"""
+        with self._lock:
+            folded, self.folded = self.folded, 0
+            return folded
+
+    def _fold_point(self, window: List[types.Content], tokens: List[int]) -> int:
+        """window(접히지 않은 구간) 안에서 이 위치 앞까지 접음 (항상 user 메시지에서 시작하도록)"""
+        user_starts = [i for i, c in enumerate(window) if c.role == "user"]
+        if not user_starts:
+            return 0
+
+        # 1) keep_turns + fold_batch 턴이 쌓이면 최근 keep_turns 턴만 남김
+        point = 0
+        if len(user_starts) >= self.keep_turns + self.fold_batch:
+            point = user_starts[-self.keep_turns]
+        # 2) 그래도 예산을 넘으면 마지막 사용자 메시지 직전까지 한 턴씩 더 접음
+        budget = self.max_tokens - (estimate_tokens(self.summary) if self.summary else 0)
+        for start in user_starts:
+            if start < point:
+                continue
+            if sum(tokens[start:]) <= budget or start == user_starts[-1]:
+                point = start
+                break
+        return point
+
+    def prepare(self, history: Sequence[types.Content], system_instruction: str = "") -> Tuple[List[types.Content], str]:
+        """요청에 보낼 contents와 (요약이 붙은) system_instruction 반환
+
+        접히지 않은 구간(history[folded:])만 읽으므로 CompactTranscript처럼
+        꺼낼 때 Content를 만드는 history도 요청에 필요한 구간만 만들어짐
+        """
+        with self._lock:
+            if self.folded > len(history):  # history가 바깥에서 초기화된 경우
+                self.reset()
+
+            window = history[self.folded:]
+            tokens = [estimate_tokens(content_text(c)) for c in window]
+            point = self._fold_point(window, tokens)
+            if point > 0:
+                to_fold = window[:point]
+                try:
+                    summary = self.summarizer(self.summary, to_fold, self.summary_max_tokens)
+                except Exception as e:
+                    logger.warning("대화 요약 실패, 앞부분만 남기는 요약으로 대체: %s", e)
+                    summary = truncate_summarizer(self.summary, to_fold, self.summary_max_tokens)
+                self.summarizer_tokens += estimate_tokens(self.summary + _transcript(to_fold)) + estimate_tokens(summary)
+                self.summary = summary
+                self.folded_tokens += sum(tokens[:point])
+                self.folded_total += point
+                self.folded += point
+                self.summaries += 1
+
+            contents = window[point:]
+            instruction = system_instruction
+            if self.summary:
+                instruction = f"{system_instruction}\n\n{SUMMARY_HEADER}\n{self.summary}".strip()
+
+            window_tokens = sum(tokens[point:])
+            full = estimate_tokens(system_instruction) + self.folded_tokens + window_tokens
+            sent = estimate_tokens(instruction) + window_tokens
+            self.requests += 1
+            self.last_full_tokens = full
+            self.last_sent_tokens = sent
+            self.tokens_saved += max(0, full - sent)
+            return contents, instruction
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "summaries": self.summaries,
+                "folded_messages": self.folded_total,
+                "summary_tokens": estimate_tokens(self.summary) if self.summary else 0,
+                "last_full_tokens": self.last_full_tokens,
+                "last_sent_tokens": self.last_sent_tokens,
+                "tokens_saved": self.tokens_saved,
+                "summarizer_tokens": self.summarizer_tokens,
+                "net_tokens_saved": self.tokens_saved - self.summarizer_tokens,
+            }
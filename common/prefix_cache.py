@@ -0,0 +1,221 @@
+"""
+대화 접두부(prefix) 캐싱 — 시스템 지시어 + 이미 끝난 이전 턴을 Gemini 캐시(cached content)로 보관
+
+멀티턴 대화는 매 턴마다 같은 system_instruction과 이전 턴들을 다시 보내므로
+모델이 같은 앞부분을 매번 다시 처리합니다.
+PrefixCache는 바뀌지 않는 앞부분을 client.caches.create로 캐시해 두고, 요청에는 캐시 이름과 새 부분만 보냅니다.
+
+- 캐시 내용: system_instruction + contents의 앞부분 (모델 응답으로 끝나는 지점까지)
+- 요청: cached_content=<캐시 이름>, contents=나머지 (system_instruction은 캐시에 있으므로 보내지 않음)
+- 캐시 뒤에 refresh_turns 턴 이상 쌓이면 백그라운드 스레드에서 더 긴 앞부분으로 새 캐시를 만들고,
+  준비되면 교체 (만드는 동안에는 기존 캐시를 그대로 사용, 이전 캐시는 다음 요청 때 삭제)
+- system_instruction(이전 대화 요약 포함)이나 앞부분이 달라지면 캐시 없이 전체를 보내고 새로 만듦
+- 추정 토큰이 min_tokens보다 적으면 만들지 않음 (모델별 최소 캐시 크기 / 저장 비용)
+- 응답의 usage_metadata.cached_content_token_count를 모아 실제로 캐시에서 처리된 입력 토큰을 기록
+
+환경 변수:
+    CHAT_PREFIX_CACHE                 1이면 사용 (기본값: 0)
+    CHAT_PREFIX_CACHE_MIN_TOKENS      캐시를 만들 최소 추정 토큰 (기본값: 1024)
+    CHAT_PREFIX_CACHE_TTL             캐시 유지 시간(초) (기본값: 600)
+    CHAT_PREFIX_CACHE_REFRESH_TURNS   캐시 뒤에 이만큼 턴이 쌓이면 새로 만듦 (기본값: 2)
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from google.genai import types
+
+from common.rate_limiter import estimate_tokens, get_limiter
+
+logger = logging.getLogger(__name__)
+
+RETRY_AFTER_FAILURE_S = 60.0
+
+
+def prefix_cache_enabled() -> bool:
+    return os.getenv("CHAT_PREFIX_CACHE", "0").lower() in ("1", "true", "yes")
+
+
+def _text(content: types.Content) -> str:
+    return "".join(p.text or "" for p in content.parts or [])
+
+
+def _fingerprint(instruction: str, contents: List[types.Content]) -> str:
+    digest = hashlib.sha256(instruction.encode())
+    for content in contents:
+        digest.update(b"\0" + (content.role or "").encode() + b"\0" + _text(content).encode())
+    return digest.hexdigest()
+
+
+class _Entry:
+    def __init__(self, name: str, instruction: str, count: int, fingerprint: str, tokens: int, ttl: float):
+        self.name = name
+        self.instruction = instruction
+        self.count = count  # 캐시에 들어간 메시지 수
+        self.fingerprint = fingerprint
+        self.tokens = tokens
+        self.expires_at = time.monotonic() + ttl
+
+
+class PrefixCache:
+    """대화 하나(세션 하나)의 접두부 캐시"""
+
+    def __init__(
+        self,
+        client,
+        model: str,
+        min_tokens: Optional[int] = None,
+        ttl: Optional[float] = None,
+        refresh_turns: Optional[int] = None,
+    ):
+        self.client = client
+        self.model = model
+        self.min_tokens = min_tokens or int(os.getenv("CHAT_PREFIX_CACHE_MIN_TOKENS", "1024"))
+        self.ttl = ttl or float(os.getenv("CHAT_PREFIX_CACHE_TTL", "600"))
+        self.refresh_turns = refresh_turns or int(os.getenv("CHAT_PREFIX_CACHE_REFRESH_TURNS", "2"))
+
+        self._lock = threading.Lock()
+        self._entry: Optional[_Entry] = None
+        self._worker: Optional[threading.Thread] = None
+        self._retired: List[str] = []  # 교체된 캐시 (진행 중인 요청이 쓰고 있을 수 있어 다음 요청 때 삭제)
+        self._retry_at = 0.0
+        self.requests = 0
+        self.hits = 0
+        self.created = 0
+        self.failures = 0
+        self.last_error = ""
+        self.prompt_tokens = 0  # 응답 기준 입력 토큰 (캐시 포함)
+        self.cached_tokens = 0  # 그중 캐시에서 처리된 토큰
+
+    def _valid(self, instruction: str, contents: List[types.Content]) -> Optional[_Entry]:
+        entry = self._entry
+        if entry is None or entry.instruction != instruction or entry.count >= len(contents):
+            return None
+        if time.monotonic() > entry.expires_at - 30:  # 만료 직전 캐시는 쓰지 않음
+            return None
+        if _fingerprint(instruction, contents[:entry.count]) != entry.fingerprint:
+            return None
+        return entry
+
+    def apply(self, contents: List[types.Content], config: types.GenerateContentConfig) -> List[types.Content]:
+        """캐시된 앞부분을 config.cached_content로 바꾸고 실제로 보낼 contents 반환
+
+        config.system_instruction은 캐시에 들어 있으므로 캐시를 쓸 때는 비움
+        """
+        instruction = config.system_instruction or ""
+        with self._lock:
+            self.requests += 1
+            entry = self._valid(instruction, contents)
+            self.hits += entry is not None
+            self._maybe_refresh(instruction, contents, entry)
+            retired, self._retired = self._retired, []
+        if retired:
+            threading.Thread(target=self._delete_all, args=(retired,), daemon=True).start()
+        if entry is None:
+            return contents
+        config.system_instruction = None
+        config.cached_content = entry.name
+        return contents[entry.count:]
+
+    def _maybe_refresh(self, instruction: str, contents: List[types.Content], entry: Optional[_Entry]) -> None:
+        # lock 안에서 호출
+        if self._worker is not None or time.monotonic() < self._retry_at:
+            return
+        # 마지막 모델 응답까지 (새 사용자 메시지는 제외)
+        count = max((i + 1 for i, c in enumerate(contents) if c.role == "model"), default=0)
+        if entry is not None and count - entry.count < self.refresh_turns * 2 \
+                and time.monotonic() < entry.expires_at - self.ttl / 4:
+            return
+        prefix = list(contents[:count])
+        tokens = estimate_tokens(instruction + "".join(_text(c) for c in prefix))
+        if not prefix or tokens < self.min_tokens:
+            return
+        self._worker = threading.Thread(
+            target=self._create, args=(instruction, prefix, tokens), name="prefix-cache", daemon=True
+        )
+        self._worker.start()
+
+    def _create(self, instruction: str, prefix: List[types.Content], tokens: int) -> None:
+        """백그라운드에서 새 캐시를 만들고 교체"""
+        try:
+            cache = get_limiter().call(
+                self.client.caches.create,
+                estimated_tokens=tokens,
+                model=self.model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=instruction or None,
+                    contents=prefix,
+                    ttl=f"{int(self.ttl)}s",
+                    display_name="chat-prefix",
+                ),
+            )
+        except Exception as e:
+            logger.warning("접두부 캐시 생성 실패, 전체 전송으로 계속: %s", e)
+            with self._lock:
+                self.failures += 1
+                self.last_error = str(e)[:200]
+                self._retry_at = time.monotonic() + RETRY_AFTER_FAILURE_S
+                self._worker = None
+            return
+
+        usage = getattr(cache, "usage_metadata", None)
+        entry = _Entry(cache.name, instruction, len(prefix), _fingerprint(instruction, prefix),
+                       getattr(usage, "total_token_count", None) or tokens, self.ttl)
+        with self._lock:
+            if self._entry is not None:
+                self._retired.append(self._entry.name)
+            self._entry = entry
+            self.created += 1
+            self._worker = None
+
+    def _delete_all(self, names: List[str]) -> None:
+        for name in names:
+            try:
+                self.client.caches.delete(name=name)
+            except Exception as e:
+                logger.debug("접두부 캐시 삭제 실패 (TTL이 지나면 사라짐): %s", e)
+
+    def record_usage(self, usage) -> None:
+        """응답의 usage_metadata 기록 (스트리밍이면 마지막 값으로 한 번)"""
+        if usage is None:
+            return
+        with self._lock:
+            self.prompt_tokens += usage.prompt_token_count or 0
+            self.cached_tokens += usage.cached_content_token_count or 0
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """진행 중인 캐시 생성이 끝날 때까지 대기 (벤치마크 / 종료 시)"""
+        worker = self._worker
+        if worker is not None:
+            worker.join(timeout)
+
+    def close(self) -> None:
+        """대화를 끝낼 때 캐시 삭제 (저장 비용이 TTL 동안 계속 들지 않도록)"""
+        self.wait()
+        with self._lock:
+            names, self._retired = self._retired, []
+            if self._entry is not None:
+                names.append(self._entry.name)
+            self._entry = None
+        self._delete_all(names)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entry = self._entry
+            return {
+                "requests": self.requests,
+                "hits": self.hits,
+                "caches_created": self.created,
+                "failures": self.failures,
+                "refreshing": self._worker is not None,
+                "cached_messages": entry.count if entry else 0,
+                "cache_tokens": entry.tokens if entry else 0,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "cached_ratio": round(self.cached_tokens / self.prompt_tokens, 3) if self.prompt_tokens else 0.0,
+                "last_error": self.last_error,
+            }
@@ -0,0 +1,329 @@
+"""
+Gemini 호출 공용 속도 제한기 (Rate Limiter + Concurrency Governor)
+
+google.genai 클라이언트 호출과 LangChain의 ChatGoogleGenerativeAI 호출이
+하나의 제한기를 함께 사용하도록 만든 모듈입니다.
+
+- 분당 요청 수(RPM) / 분당 토큰 수(TPM)를 토큰 버킷으로 제한
+- 429(RESOURCE_EXHAUSTED)나 느린 응답에는 동시 실행 수를 AIMD 방식으로 조절
+  (성공하면 조금씩 늘리고, 429가 나면 절반으로 줄임)
+- 한도를 넘는 요청은 실패시키지 않고 대기열에서 기다림
+- 대기 시간(queue wait)은 stats()로 확인 가능
+
+환경 변수:
+    GEMINI_RPM               분당 요청 수 (기본값: 15)
+    GEMINI_TPM               분당 토큰 수 (기본값: 250000)
+    GEMINI_MAX_CONCURRENCY   최대 동시 실행 수 (기본값: 4)
+    GEMINI_LATENCY_TARGET    목표 지연시간(초), 넘으면 동시 실행 수 감소 (기본값: 0 = 사용 안 함)
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+try:
+    from langchain_core.callbacks import BaseCallbackHandler
+except ImportError:  # LangChain을 쓰지 않는 예제에서도 import 가능하도록
+    BaseCallbackHandler = object
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """문자 수로 대략적인 토큰 수 추정 (한글/영문 혼합 기준으로 보수적으로 계산)"""
+    return max(1, len(text) // 2)
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """429 / RESOURCE_EXHAUSTED 계열 오류인지 판별"""
+    for attr in ("code", "status_code"):
+        if getattr(error, attr, None) == 429:
+            return True
+    message = str(error)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message
+
+
+def _usage_tokens(response: Any) -> Optional[int]:
+    """응답 객체의 usage_metadata에서 실제 사용 토큰 수 추출"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return None
+    if isinstance(usage, dict):  # LangChain AIMessage.usage_metadata
+        return usage.get("total_tokens")
+    return getattr(usage, "total_token_count", None)
+
+
+class TokenBucket:
+    """분당 rate만큼 채워지는 토큰 버킷"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0  # 초당 충전량
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """amount만큼 꺼낼 수 있을 때까지 남은 시간(초)"""
+        self._refill()
+        # 버킷 용량보다 큰 요청은 가득 찼을 때 통과시킴 (영원히 막히지 않도록)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, delta: float) -> None:
+        """추정치와 실제 사용량의 차이만큼 보정 (음수면 빚으로 남음)"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class Ticket:
+    """제한기를 통과한 호출 하나의 정보"""
+
+    def __init__(self, estimated_tokens: int, queue_wait: float):
+        self.estimated_tokens = estimated_tokens
+        self.queue_wait = queue_wait
+        self.started = time.monotonic()
+
+
+class AdaptiveLimiter:
+    """RPM/TPM 토큰 버킷 + AIMD 동시 실행 수 조절기"""
+
+    def __init__(
+        self,
+        rpm: float = 15,
+        tpm: float = 250_000,
+        max_concurrency: int = 4,
+        min_concurrency: int = 1,
+        latency_target: float = 0.0,
+    ):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.latency_target = latency_target
+
+        self.limit = float(max_concurrency)  # 현재 허용 동시 실행 수
+        self.inflight = 0
+        self.paused_until = 0.0  # 429 직후 잠시 모든 요청을 멈추는 시점
+        self._consecutive_429 = 0
+
+        self._cond = threading.Condition()
+        self._async_waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self._waiting = 0
+        self._waits = deque(maxlen=500)  # 최근 대기 시간 (초)
+        self.completed = 0
+        self.throttled = 0
+
+    # -------------------------------------------------------------
+    # 슬롯 획득 / 반환
+    # -------------------------------------------------------------
+    def _delay(self, estimated_tokens: int) -> float:
+        # lock 안에서 호출: 버킷 / 429 일시 정지 때문에 더 기다려야 하는 시간 (0이면 동시 실행 수만 확인)
+        return max(
+            self.paused_until - time.monotonic(),
+            self.requests.wait_time(1),
+            self.tokens.wait_time(estimated_tokens),
+        )
+
+    def _take(self, estimated_tokens: int, enqueued: float) -> Ticket:
+        # lock 안에서 호출: 슬롯을 차지하고 Ticket 생성
+        self.requests.take(1)
+        self.tokens.take(estimated_tokens)
+        self.inflight += 1
+        queue_wait = time.monotonic() - enqueued
+        self._waits.append(queue_wait)
+        if queue_wait > 1.0:
+            logger.info("Gemini 요청이 %.1f초 대기 후 실행됩니다.", queue_wait)
+        return Ticket(estimated_tokens, queue_wait)
+
+    def acquire(self, estimated_tokens: int = 0) -> Ticket:
+        """요청을 보낼 수 있을 때까지 대기한 뒤 Ticket 반환"""
+        enqueued = time.monotonic()
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    delay = self._delay(estimated_tokens)
+                    if delay <= 0 and self.inflight < int(self.limit):
+                        return self._take(estimated_tokens, enqueued)
+                    # 동시 실행 수 때문에 막힌 경우에는 release()가 깨워줌
+                    self._cond.wait(timeout=delay if delay > 0 else None)
+            finally:
+                self._waiting -= 1
+
+    async def acquire_async(self, estimated_tokens: int = 0) -> Ticket:
+        """asyncio 코드용 acquire (대기는 이벤트 루프에서, 스레드를 차지하지 않음)
+
+        release()가 스레드 쪽 Condition과 함께 등록된 asyncio.Event도 깨움.
+        슬롯은 대기를 마친 뒤 await 없이 바로 차지하므로, 대기 중에 취소되면 받은 슬롯이 없음
+        """
+        enqueued = time.monotonic()
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        waiter = (loop, wake)
+        with self._cond:
+            self._waiting += 1
+            self._async_waiters.add(waiter)
+        try:
+            while True:
+                with self._cond:
+                    delay = self._delay(estimated_tokens)
+                    if delay <= 0 and self.inflight < int(self.limit):
+                        return self._take(estimated_tokens, enqueued)
+                    wake.clear()  # lock 안에서 비우므로 이후 release()의 알림은 놓치지 않음
+                try:
+                    await asyncio.wait_for(wake.wait(), timeout=delay if delay > 0 else None)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._cond:
+                self._waiting -= 1
+                self._async_waiters.discard(waiter)
+
+    def _notify(self) -> None:
+        # lock 안에서 호출: 스레드 대기자와 asyncio 대기자를 모두 깨움
+        self._cond.notify_all()
+        for loop, wake in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:  # 루프가 이미 닫힘
+                pass
+
+    def release(self, ticket: Ticket, used_tokens: Optional[int] = None, error: Optional[BaseException] = None) -> None:
+        """호출 결과를 반영하여 슬롯을 반환하고 동시 실행 수를 조절"""
+        latency = time.monotonic() - ticket.started
+        with self._cond:
+            self.inflight -= 1
+            if used_tokens is not None:
+                self.tokens.adjust(used_tokens - ticket.estimated_tokens)
+
+            if error is not None and is_rate_limit_error(error):
+                # Multiplicative Decrease: 429면 절반으로 줄이고 잠시 멈춤
+                self.throttled += 1
+                self._consecutive_429 += 1
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                backoff = min(2 ** self._consecutive_429, 30)
+                self.paused_until = max(self.paused_until, time.monotonic() + backoff)
+                logger.warning("Gemini 429 응답: 동시 실행 수를 %.1f로 줄입니다.", self.limit)
+            elif error is None:
+                self.completed += 1
+                if self.latency_target and latency > self.latency_target:
+                    self.limit = max(self.min_concurrency, self.limit * 0.9)
+                else:
+                    # Additive Increase: 한 바퀴(limit개) 성공마다 1씩 증가
+                    self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+                    self._consecutive_429 = 0
+            # 그 밖의 오류(취소 포함)는 슬롯만 반환하고 동시 실행 수는 그대로
+            self._notify()
+
+    @contextmanager
+    def slot(self, estimated_tokens: int = 0):
+        """with 문으로 사용하는 슬롯 (ticket.used_tokens에 실제 사용량 기록 가능)"""
+        ticket = self.acquire(estimated_tokens)
+        ticket.used_tokens = None
+        try:
+            yield ticket
+        except BaseException as e:
+            self.release(ticket, ticket.used_tokens, error=e)
+            raise
+        else:
+            self.release(ticket, ticket.used_tokens)
+
+    # -------------------------------------------------------------
+    # google.genai / google.generativeai 호출 래퍼
+    # -------------------------------------------------------------
+    def call(self, fn: Callable[..., Any], *args, estimated_tokens: int = 0, max_attempts: int = 5, **kwargs) -> Any:
+        """fn(*args, **kwargs)를 제한기 안에서 실행 (429면 다시 대기열로)"""
+        for attempt in range(1, max_attempts + 1):
+            try:
+                with self.slot(estimated_tokens) as ticket:
+                    response = fn(*args, **kwargs)
+                    ticket.used_tokens = _usage_tokens(response)
+                    return response
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == max_attempts:
+                    raise
+                # 실패 대신 대기열로 돌아감 (paused_until까지 acquire에서 대기)
+
+    def stats(self) -> Dict[str, Any]:
+        """대기 시간 등 관측용 지표"""
+        with self._cond:
+            waits = sorted(self._waits)
+            return {
+                "concurrency_limit": round(self.limit, 2),
+                "inflight": self.inflight,
+                "queued": self._waiting,
+                "completed": self.completed,
+                "throttled": self.throttled,
+                "queue_wait_avg_s": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "queue_wait_p95_s": round(waits[int(len(waits) * 0.95) - 1], 3) if waits else 0.0,
+                "queue_wait_max_s": round(waits[-1], 3) if waits else 0.0,
+            }
+
+
+class LimiterCallbackHandler(BaseCallbackHandler):
+    """ChatGoogleGenerativeAI(callbacks=[...])에 연결하는 LangChain 콜백
+
+    호출을 거절할 수 있는 콜백(UsageCallbackHandler 등)보다 뒤에 둬야 함.
+    시작 콜백에서 예외가 나면 LangChain이 on_llm_error를 부르지 않으므로
+    이 콜백이 먼저 받은 슬롯은 반환되지 않음
+    """
+
+    raise_error = True  # 대기 중 예외가 생기면 호출도 중단
+
+    def __init__(self, limiter: AdaptiveLimiter):
+        self.limiter = limiter
+        self._tickets: Dict[Any, Ticket] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        text = "".join(str(m.content) for batch in messages for m in batch)
+        self._tickets[run_id] = self.limiter.acquire(estimate_tokens(text))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        ticket = self._tickets.pop(run_id, None)
+        if ticket is None:
+            return
+        used = None
+        try:
+            used = _usage_tokens(response.generations[0][0].message)
+        except (AttributeError, IndexError):
+            pass
+        self.limiter.release(ticket, used)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        ticket = self._tickets.pop(run_id, None)
+        if ticket is not None:
+            self.limiter.release(ticket, error=error)
+
+
+_limiter: Optional[AdaptiveLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> AdaptiveLimiter:
+    """프로세스 전체에서 공유하는 제한기 반환 (환경 변수로 설정)"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = AdaptiveLimiter(
+                rpm=float(os.getenv("GEMINI_RPM", "15")),
+                tpm=float(os.getenv("GEMINI_TPM", "250000")),
+                max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "4")),
+                latency_target=float(os.getenv("GEMINI_LATENCY_TARGET", "0")),
+            )
+        return _limiter
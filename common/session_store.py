@@ -0,0 +1,100 @@
+"""
+채팅 세션 영구 저장소 (SQLite, append-only)
+
+st.session_state에만 대화를 두면 새로고침/서버 재시작 때 대화가 사라지고,
+긴 대화는 세션마다 전부 메모리에 올라가 있게 됩니다.
+
+- 메시지는 (세션 ID, 순번) 단위로 추가만 함 (수정/삭제 없음)
+- 대화 초기화는 기존 기록을 지우지 않고 새 세션 ID를 발급
+- 이전 대화 요약(history_manager)도 추가 기록 → 재시작 후 요약 이후 메시지만 메모리에 올리면 됨
+- 오래된 메시지는 화면에서 볼 때만 구간 단위로 읽음
+
+환경 변수:
+    CHAT_SESSION_DB   저장소 파일 경로 (기본값: chat_sessions.sqlite3)
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+
+class ChatSessionStore:
+    """세션별 메시지 / 요약을 저장하는 SQLite 저장소"""
+
+    def __init__(self, db_path: str = "chat_sessions.sqlite3"):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._local = threading.local()  # sqlite 연결은 스레드마다 따로
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, created_at REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS messages ("
+                         "session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, text TEXT NOT NULL, "
+                         "created_at REAL NOT NULL, PRIMARY KEY (session_id, seq))")
+            conn.execute("CREATE TABLE IF NOT EXISTS summaries ("
+                         "session_id TEXT NOT NULL, upto_seq INTEGER NOT NULL, summary TEXT NOT NULL, "
+                         "created_at REAL NOT NULL, PRIMARY KEY (session_id, upto_seq))")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def new_session(self) -> str:
+        session_id = uuid.uuid4().hex
+        with self._conn() as conn:
+            conn.execute("INSERT INTO sessions VALUES (?, ?)", (session_id, time.time()))
+        return session_id
+
+    def exists(self, session_id: str) -> bool:
+        row = self._conn().execute("SELECT 1 FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return row is not None
+
+    def append(self, session_id: str, seq: int, role: str, text: str) -> None:
+        """메시지 하나 추가 (seq는 세션 안에서 0부터 1씩 증가)"""
+        with self._conn() as conn:
+            conn.execute("INSERT INTO messages VALUES (?, ?, ?, ?, ?)", (session_id, seq, role, text, time.time()))
+
+    def count(self, session_id: str) -> int:
+        row = self._conn().execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0]
+
+    def load(self, session_id: str, start: int, end: Optional[int] = None) -> List[Tuple[str, str]]:
+        """[start, end) 구간의 (role, text) 목록"""
+        rows = self._conn().execute(
+            "SELECT role, text FROM messages WHERE session_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+            (session_id, start, end if end is not None else 2 ** 62),
+        ).fetchall()
+        return [(role, text) for role, text in rows]
+
+    def append_summary(self, session_id: str, upto_seq: int, summary: str) -> None:
+        """upto_seq 앞까지의 메시지를 요약한 내용 기록"""
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?)",
+                         (session_id, upto_seq, summary, time.time()))
+
+    def latest_summary(self, session_id: str) -> Tuple[int, str]:
+        """(요약된 메시지 수, 요약) — 요약이 없으면 (0, "")"""
+        row = self._conn().execute(
+            "SELECT upto_seq, summary FROM summaries WHERE session_id = ? ORDER BY upto_seq DESC LIMIT 1",
+            (session_id,),
+        ).fetchone()
+        return (row[0], row[1]) if row else (0, "")
+
+
+_store: Optional[ChatSessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> ChatSessionStore:
+    """프로세스 전체에서 공유하는 세션 저장소"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ChatSessionStore(os.getenv("CHAT_SESSION_DB", "chat_sessions.sqlite3"))
+        return _store
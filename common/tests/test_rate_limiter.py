@@ -0,0 +1,58 @@
+"""AdaptiveLimiter.acquire_async 테스트 (스레드 없이 대기, 취소 시 슬롯 / 동시 실행 수 유지)"""
+
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from common.rate_limiter import AdaptiveLimiter
+
+
+def test_async_waiters_do_not_hold_threads():
+    limiter = AdaptiveLimiter(rpm=6000, max_concurrency=1)
+    held = limiter.acquire()
+
+    async def main():
+        threads_before = threading.active_count()
+        waiters = [asyncio.create_task(limiter.acquire_async()) for _ in range(50)]
+        await asyncio.sleep(0.05)
+        assert limiter.stats()["queued"] == 50
+        assert threading.active_count() == threads_before
+
+        # 다른 스레드에서 반환해도 asyncio 대기자가 깨어남
+        threading.Thread(target=limiter.release, args=(held,)).start()
+        for _ in range(50):
+            done, _ = await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED, timeout=2)
+            assert len(done) == 1
+            waiters = [w for w in waiters if w not in done]
+            limiter.release(done.pop().result())
+
+    asyncio.run(main())
+    assert limiter.stats()["inflight"] == 0
+    assert limiter.stats()["queued"] == 0
+
+
+def test_cancelled_wait_takes_no_slot_and_no_credit():
+    limiter = AdaptiveLimiter(rpm=6000, max_concurrency=2)
+    limiter.limit = 1.0
+    held = limiter.acquire()
+
+    async def main():
+        waiter = asyncio.create_task(limiter.acquire_async())
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(main())
+    assert limiter.stats()["inflight"] == 1
+    assert limiter.stats()["queued"] == 0
+
+    # 취소로 끝난 호출은 슬롯만 반환하고 동시 실행 수를 늘리지 않음
+    limiter.release(held, error=asyncio.CancelledError())
+    assert limiter.stats()["inflight"] == 0
+    assert limiter.limit == 1.0
+    assert limiter.stats()["completed"] == 0
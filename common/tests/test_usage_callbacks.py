@@ -0,0 +1,42 @@
+"""LangChain 콜백 순서 회귀 테스트 (예산 거절 시 제한기 슬롯이 남지 않는지)"""
+
+import sys
+from pathlib import Path
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from common.rate_limiter import AdaptiveLimiter, LimiterCallbackHandler
+from common.usage_ledger import SessionBudgetExceeded, UsageCallbackHandler, UsageLedger
+
+
+def make_model(ledger: UsageLedger, limiter: AdaptiveLimiter) -> FakeListChatModel:
+    # 02_history_step5_context.py와 같은 순서 (예산 검사 -> 제한기)
+    return FakeListChatModel(
+        responses=["답변"],
+        callbacks=[UsageCallbackHandler(ledger), LimiterCallbackHandler(limiter)],
+    )
+
+
+def test_refusal_does_not_hold_limiter_slot():
+    # 슬롯이 새면 거절 수만큼 inflight가 남음 (동시 실행 수보다 적게 거절해야 멈추지 않고 실패)
+    limiter = AdaptiveLimiter(rpm=600, max_concurrency=4)
+    ledger = UsageLedger(session_budget=10, policy="refuse")
+    model = make_model(ledger, limiter)
+
+    for _ in range(3):
+        with pytest.raises(SessionBudgetExceeded):
+            model.invoke("예산보다 긴 질문입니다. " * 20)
+
+    assert limiter.stats()["inflight"] == 0
+    assert ledger.session_stats("default")["refused"] == 3
+
+
+def test_allowed_call_releases_slot():
+    limiter = AdaptiveLimiter(rpm=600, max_concurrency=2)
+    model = make_model(UsageLedger(), limiter)
+
+    assert model.invoke("질문").content == "답변"
+    assert limiter.stats()["inflight"] == 0
+    assert limiter.stats()["completed"] == 1
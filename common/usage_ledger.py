@@ -0,0 +1,309 @@
+"""
+토큰 사용량 / 지연시간 기록 및 세션별 토큰 예산 (Usage Ledger)
+
+각 호출의 usage_metadata(입력 / 출력 / 캐시 토큰)와 지연시간을 세션별로 모으고,
+세션마다 정한 토큰 예산을 넘지 않도록 요청을 줄이거나(trim) 거절(refuse)합니다.
+google.genai 호출과 LangChain ChatGoogleGenerativeAI(콜백)가 같은 장부를 사용합니다.
+
+- 호출마다: 입력 / 출력 / 캐시 토큰, 대기열 대기, 첫 토큰까지(TTFT), 전체 지연
+- 세션별 합계와 최근 호출 목록 (세션 수 / 호출 기록 수는 상한까지만 보관)
+- 예산 검사 enforce(): 추정 입력 + 출력 여유분이 남은 예산을 넘으면
+    trim   - 오래된 턴부터 빼고 max_output_tokens를 남은 만큼으로 제한 (마지막 사용자 메시지는 유지)
+    refuse - SessionBudgetExceeded 발생
+  (LangChain 콜백은 보낼 메시지를 바꿀 수 없으므로 예산을 다 쓰면 항상 거절)
+
+환경 변수:
+    CHAT_SESSION_TOKEN_BUDGET    세션당 토큰 예산 (입력 + 출력, 기본값: 0 = 제한 없음)
+    CHAT_BUDGET_POLICY           예산 초과 시 동작 trim / refuse (기본값: trim)
+    CHAT_BUDGET_OUTPUT_RESERVE   예산 검사 때 출력용으로 남겨 둘 토큰 (기본값: 512)
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+from google.genai import types
+
+from common.rate_limiter import estimate_tokens
+
+try:
+    from langchain_core.callbacks import BaseCallbackHandler
+except ImportError:  # LangChain을 쓰지 않는 예제에서도 import 가능하도록
+    BaseCallbackHandler = object
+
+logger = logging.getLogger(__name__)
+
+MIN_OUTPUT_TOKENS = 64  # trim 후에도 이만큼 출력할 여유가 없으면 거절
+MAX_SESSIONS = 1000
+MAX_CALLS_PER_SESSION = 200
+
+
+class SessionBudgetExceeded(RuntimeError):
+    """세션 토큰 예산을 다 써서 요청을 보내지 않음"""
+
+
+def _content_text(content: types.Content) -> str:
+    return "".join(p.text or "" for p in content.parts or [])
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+
+class _Session:
+    def __init__(self):
+        self.calls: deque = deque(maxlen=MAX_CALLS_PER_SESSION)
+        self.count = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.cached_tokens = 0
+        self.trimmed = 0
+        self.refused = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.output_tokens
+
+
+class UsageLedger:
+    """세션별 토큰 / 지연시간 장부 + 예산 검사"""
+
+    def __init__(self, session_budget: int = 0, policy: str = "trim", output_reserve: int = 512):
+        if policy not in ("trim", "refuse"):
+            raise ValueError(f"지원하지 않는 예산 정책입니다: {policy}")
+        self.session_budget = session_budget
+        self.policy = policy
+        self.output_reserve = output_reserve
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+
+    def _session(self, session_id: str) -> _Session:
+        # lock 안에서 호출, 오래 쓰지 않은 세션부터 정리
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _Session()
+            while len(self._sessions) > MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        return session
+
+    # -------------------------------------------------------------
+    # 기록
+    # -------------------------------------------------------------
+    def record(
+        self,
+        session_id: str,
+        surface: str,
+        model: str,
+        prompt_tokens: int,
+        output_tokens: int,
+        cached_tokens: int = 0,
+        latency_s: float = 0.0,
+        ttft_s: Optional[float] = None,
+        queue_wait_s: float = 0.0,
+    ) -> None:
+        call = {
+            "at": time.strftime("%H:%M:%S"),
+            "surface": surface,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "output_tokens": output_tokens,
+            "cached_tokens": cached_tokens,
+            "queue_wait_s": round(queue_wait_s, 3),
+            "ttft_s": round(ttft_s, 3) if ttft_s is not None else None,
+            "latency_s": round(latency_s, 3),
+        }
+        with self._lock:
+            session = self._session(session_id)
+            session.calls.append(call)
+            session.count += 1
+            session.prompt_tokens += prompt_tokens
+            session.output_tokens += output_tokens
+            session.cached_tokens += cached_tokens
+
+    def record_response(self, session_id: str, surface: str, model: str, usage, latency_s: float,
+                        ttft_s: Optional[float] = None, queue_wait_s: float = 0.0) -> None:
+        """google.genai 응답의 usage_metadata 기록 (스트리밍이면 마지막 청크의 값)"""
+        self.record(
+            session_id, surface, model,
+            prompt_tokens=getattr(usage, "prompt_token_count", None) or 0,
+            output_tokens=getattr(usage, "candidates_token_count", None) or 0,
+            cached_tokens=getattr(usage, "cached_content_token_count", None) or 0,
+            latency_s=latency_s, ttft_s=ttft_s, queue_wait_s=queue_wait_s,
+        )
+
+    # -------------------------------------------------------------
+    # 예산
+    # -------------------------------------------------------------
+    def remaining(self, session_id: str) -> Optional[int]:
+        """남은 예산 (제한 없으면 None)"""
+        if not self.session_budget:
+            return None
+        with self._lock:
+            used = self._sessions[session_id].total_tokens if session_id in self._sessions else 0
+        return max(0, self.session_budget - used)
+
+    def _refuse(self, session_id: str, message: str) -> None:
+        with self._lock:
+            self._session(session_id).refused += 1
+        raise SessionBudgetExceeded(message)
+
+    def check(self, session_id: str, estimated_tokens: int) -> None:
+        """추정 토큰만큼 쓸 예산이 없으면 SessionBudgetExceeded (LangChain 콜백 등 줄일 수 없는 호출용)"""
+        remaining = self.remaining(session_id)
+        if remaining is not None and estimated_tokens + MIN_OUTPUT_TOKENS > remaining:
+            self._refuse(session_id, f"세션 토큰 예산 초과 (남은 예산 {remaining}, 필요 약 {estimated_tokens})")
+
+    def enforce(self, session_id: str, contents: List[types.Content],
+                config: types.GenerateContentConfig) -> List[types.Content]:
+        """남은 예산에 맞춰 보낼 contents를 줄이고 config.max_output_tokens를 제한 (못 맞추면 거절)"""
+        remaining = self.remaining(session_id)
+        if remaining is None:
+            return contents
+
+        instruction_tokens = estimate_tokens(config.system_instruction) if config.system_instruction else 0
+        tokens = [estimate_tokens(_content_text(c)) for c in contents]
+        reserve = min(config.max_output_tokens or self.output_reserve, self.output_reserve)
+        if instruction_tokens + sum(tokens) + reserve <= remaining:
+            return contents
+        if self.policy == "refuse":
+            self._refuse(session_id, f"세션 토큰 예산 초과 (남은 예산 {remaining})")
+
+        # 오래된 턴부터 (항상 user 메시지에서 시작하도록) 빼면서 예산 안에 들어오는 지점 찾기
+        starts = [i for i, c in enumerate(contents) if c.role == "user"] or [len(contents) - 1]
+        start = starts[-1]
+        for candidate in starts:
+            if instruction_tokens + sum(tokens[candidate:]) + reserve <= remaining:
+                start = candidate
+                break
+        prompt = instruction_tokens + sum(tokens[start:])
+        if remaining - prompt < MIN_OUTPUT_TOKENS:
+            self._refuse(session_id, f"세션 토큰 예산 초과 (남은 예산 {remaining}, 마지막 메시지만 약 {prompt})")
+
+        config.max_output_tokens = min(config.max_output_tokens or remaining - prompt, remaining - prompt)
+        with self._lock:
+            self._session(session_id).trimmed += 1
+        if start:
+            logger.info("세션 토큰 예산에 맞춰 이전 메시지 %d개를 빼고 보냅니다.", start)
+        return contents[start:]
+
+    # -------------------------------------------------------------
+    # 조회
+    # -------------------------------------------------------------
+    def session_stats(self, session_id: str) -> Dict[str, Any]:
+        with self._lock:
+            session = self._sessions.get(session_id) or _Session()
+            calls = list(session.calls)
+            summary = {
+                "calls": session.count,
+                "prompt_tokens": session.prompt_tokens,
+                "output_tokens": session.output_tokens,
+                "cached_tokens": session.cached_tokens,
+                "total_tokens": session.total_tokens,
+                "budget": self.session_budget or None,
+                "trimmed": session.trimmed,
+                "refused": session.refused,
+            }
+        latencies = [c["latency_s"] for c in calls]
+        ttfts = [c["ttft_s"] for c in calls if c["ttft_s"] is not None]
+        waits = [c["queue_wait_s"] for c in calls]
+        summary.update({
+            "latency_p50_s": _percentile(latencies, 0.5),
+            "latency_p95_s": _percentile(latencies, 0.95),
+            "ttft_p50_s": _percentile(ttfts, 0.5),
+            "queue_wait_p95_s": _percentile(waits, 0.95),
+        })
+        return summary
+
+    def recent_calls(self, session_id: str, count: int = 20) -> List[Dict[str, Any]]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return list(session.calls)[-count:] if session else []
+
+    def stats(self) -> Dict[str, Any]:
+        """전체 세션 합계"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            return {
+                "sessions": len(sessions),
+                "calls": sum(s.count for s in sessions),
+                "prompt_tokens": sum(s.prompt_tokens for s in sessions),
+                "output_tokens": sum(s.output_tokens for s in sessions),
+                "cached_tokens": sum(s.cached_tokens for s in sessions),
+                "trimmed": sum(s.trimmed for s in sessions),
+                "refused": sum(s.refused for s in sessions),
+            }
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """ChatGoogleGenerativeAI(callbacks=[...])에 연결하는 LangChain 콜백
+
+    세션 ID는 호출 config의 metadata["session_id"] (없으면 생성 시 지정한 session_id)
+    예: config={"configurable": {"session_id": "abc2"}, "metadata": {"session_id": "abc2"}}
+    (configurable 값은 콜백에 전달되지 않으므로 metadata에도 넣어야 함)
+    """
+
+    raise_error = True  # 예산 초과 예외로 호출을 중단
+
+    def __init__(self, ledger: UsageLedger, session_id: str = "default", surface: str = "langchain"):
+        self.ledger = ledger
+        self.session_id = session_id
+        self.surface = surface
+        self._runs: Dict[Any, Dict[str, Any]] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        session_id = (metadata or {}).get("session_id", self.session_id)
+        text = "".join(str(m.content) for batch in messages for m in batch)
+        self.ledger.check(session_id, estimate_tokens(text))
+        model = (kwargs.get("invocation_params") or {}).get("model") or (metadata or {}).get("ls_model_name", "")
+        self._runs[run_id] = {"session_id": session_id, "model": model, "started": time.perf_counter()}
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None and "ttft_s" not in run:
+            run["ttft_s"] = time.perf_counter() - run["started"]
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        usage = {}
+        try:
+            usage = response.generations[0][0].message.usage_metadata or {}
+        except (AttributeError, IndexError):
+            pass
+        self.ledger.record(
+            run["session_id"], self.surface, run["model"],
+            prompt_tokens=usage.get("input_tokens", 0),
+            output_tokens=usage.get("output_tokens", 0),
+            cached_tokens=(usage.get("input_token_details") or {}).get("cache_read", 0),
+            latency_s=time.perf_counter() - run["started"],
+            ttft_s=run.get("ttft_s"),
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._runs.pop(run_id, None)
+
+
+_ledger: Optional[UsageLedger] = None
+_ledger_lock = threading.Lock()
+
+
+def get_usage_ledger() -> UsageLedger:
+    """프로세스 전체에서 공유하는 사용량 장부 (환경 변수로 설정)"""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = UsageLedger(
+                session_budget=int(os.getenv("CHAT_SESSION_TOKEN_BUDGET", "0")),
+                policy=os.getenv("CHAT_BUDGET_POLICY", "trim"),
+                output_reserve=int(os.getenv("CHAT_BUDGET_OUTPUT_RESERVE", "512")),
+            )
+        return _ledger